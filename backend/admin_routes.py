@@ -1,12 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query
+from typing import List, Optional
 import asyncio
 import os
 from datetime import datetime, timedelta
-from models import Client, ClientCreate, ClientResponse, ClientStatus, ToggleClientRequest, UpdateEmailRequest
-from database import get_database
+from models import Client, ClientCreate, ClientResponse, ClientStatus, ToggleClientRequest, UpdateEmailRequest, ClientSettingsUpdate, CancelRunsRequest, ClientTool, ClientToolCreate, ToolType, IntentRule, IntentRuleCreate
+from database import get_database, get_analytics_database
 from email_service import email_service  
 from whatsapp_manager import service_manager
+from storage import storage
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -19,7 +20,7 @@ async def create_client(
     """Create new client and send invitation email"""
     try:
         # Get next available port
-        port = await service_manager.get_next_available_port(db)
+        port = await service_manager.get_next_available_port()
         
         # Create client object
         client = Client(
@@ -32,8 +33,7 @@ async def create_client(
         )
         
         # Store in database
-        clients_collection = db.clients
-        await clients_collection.insert_one(client.dict())
+        await storage.clients.insert(client.dict())
         
         # Generate landing URL
         base_url = os.environ.get('BASE_URL', 'https://mail-qr-debug.emergent.host')
@@ -67,47 +67,61 @@ async def create_client(
         print(f"❌ Error creating client: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/clients", response_model=List[ClientResponse])
-async def get_all_clients(db = Depends(get_database)):
-    """Get all clients"""
+@router.get("/clients")
+async def get_all_clients(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: Optional[ClientStatus] = None,
+    connected: Optional[bool] = None,
+    name_prefix: Optional[str] = None,
+    fields: Optional[str] = None,
+    include_message_counts: bool = False,
+    include_totals: bool = False
+):
+    """Get clients page by page (pass next_cursor back as cursor), API keys masked"""
     try:
-        clients_collection = db.clients
-        clients = await clients_collection.find().to_list(length=None)
+        from client_listing import parse_fields, InvalidCursor
+        
+        try:
+            page = await storage.clients.list_page(
+                limit,
+                cursor,
+                status.value if status else None,
+                connected,
+                name_prefix,
+                parse_fields(fields),
+                include_message_counts
+            )
+        except (ValueError, InvalidCursor) as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        result = []
-        for client_data in clients:
-            # Remove MongoDB _id field
-            if '_id' in client_data:
-                del client_data['_id']
-            
-            result.append(ClientResponse(**client_data))
+        if include_totals:
+            page["totals"] = await storage.clients.totals()
         
-        return result
+        return page
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/clients/{client_id}/disconnect")
-async def disconnect_client_whatsapp(client_id: str, db = Depends(get_database)):
+async def disconnect_client_whatsapp(client_id: str):
     """Disconnect WhatsApp for specific client"""
     try:
-        clients_collection = db.clients
-        client_data = await clients_collection.find_one({"id": client_id})
+        client_data = await storage.clients.get(client_id)
         
         if not client_data:
             raise HTTPException(status_code=404, detail="Client not found")
         
-        client = Client(**{k:v for k,v in client_data.items() if k != '_id'})
+        client = Client(**client_data)
         
         # Disconnect WhatsApp for this specific client
         disconnect_result = await service_manager.disconnect_client_whatsapp(client_id)
         
         if disconnect_result.get("success"):
             # Clear connected phone from database
-            await clients_collection.update_one(
-                {"id": client_id},
-                {"$unset": {"connected_phone": ""}}
-            )
+            await storage.clients.update(client_id, {"connected_phone": None})
             
             return {
                 "success": True,
@@ -127,13 +141,11 @@ async def disconnect_client_whatsapp(client_id: str, db = Depends(get_database))
 @router.put("/clients/{client_id}/toggle")
 async def toggle_client_service(
     client_id: str, 
-    toggle_request: ToggleClientRequest,
-    db = Depends(get_database)
+    toggle_request: ToggleClientRequest
 ):
     """Connect or disconnect client's WhatsApp service"""
     try:
-        clients_collection = db.clients
-        client_data = await clients_collection.find_one({"id": client_id})
+        client_data = await storage.clients.get(client_id)
         
         if not client_data:
             raise HTTPException(status_code=404, detail="Client not found")
@@ -146,13 +158,10 @@ async def toggle_client_service(
             
             if success:
                 # Update client status
-                await clients_collection.update_one(
-                    {"id": client_id},
-                    {"$set": {
-                        "status": ClientStatus.ACTIVE,
-                        "last_activity": datetime.utcnow()
-                    }}
-                )
+                await storage.clients.update(client_id, {
+                    "status": ClientStatus.ACTIVE,
+                    "last_activity": datetime.utcnow()
+                })
                 return {"message": f"Client {client.name} service started successfully", "status": "active"}
             else:
                 return {"message": f"Failed to start WhatsApp service for {client.name}", "status": "error"}
@@ -163,14 +172,11 @@ async def toggle_client_service(
             
             if success:
                 # Update client status
-                await clients_collection.update_one(
-                    {"id": client_id},
-                    {"$set": {
-                        "status": ClientStatus.INACTIVE,
-                        "connected_phone": None,
-                        "last_activity": datetime.utcnow()
-                    }}
-                )
+                await storage.clients.update(client_id, {
+                    "status": ClientStatus.INACTIVE,
+                    "connected_phone": None,
+                    "last_activity": datetime.utcnow()
+                })
                 return {"message": f"Client {client.name} service stopped successfully", "status": "inactive"}
             else:
                 return {"message": f"Failed to stop WhatsApp service for {client.name}", "status": "error"}
@@ -185,8 +191,7 @@ async def toggle_client_service(
 async def delete_client(client_id: str, db = Depends(get_database)):
     """Delete client and stop their service"""
     try:
-        clients_collection = db.clients
-        client_data = await clients_collection.find_one({"id": client_id})
+        client_data = await storage.clients.get(client_id)
         
         if not client_data:
             raise HTTPException(status_code=404, detail="Client not found")
@@ -195,11 +200,21 @@ async def delete_client(client_id: str, db = Depends(get_database)):
         await service_manager.stop_service_for_client(client_id)
         
         # Delete from database
-        await clients_collection.delete_one({"id": client_id})
+        await storage.clients.delete(client_id)
         
         # Delete client messages
-        client_messages_collection = db.client_messages
-        await client_messages_collection.delete_many({"client_id": client_id})
+        await storage.messages.delete_for_client(client_id)
+        
+        # Delete registered tools and intent rules
+        await storage.tools.delete_for_client(client_id)
+        await storage.intent_rules.delete_for_client(client_id)
+        
+        # Its port can be given to a new client; a port not returned is only lost, the client is gone
+        from port_allocator import port_allocator
+        try:
+            await port_allocator.release(client_data.get("whatsapp_port"))
+        except Exception as e:
+            print(f"⚠️ Could not release port {client_data.get('whatsapp_port')} of client {client_id}: {str(e)}")
         
         return {"message": f"Client deleted successfully"}
         
@@ -207,11 +222,10 @@ async def delete_client(client_id: str, db = Depends(get_database)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/clients/{client_id}/status")
-async def get_client_status(client_id: str, db = Depends(get_database)):
+async def get_client_status(client_id: str):
     """Get detailed status of client's service"""
     try:
-        clients_collection = db.clients
-        client_data = await clients_collection.find_one({"id": client_id})
+        client_data = await storage.clients.get(client_id)
         
         if not client_data:
             raise HTTPException(status_code=404, detail="Client not found")
@@ -220,19 +234,16 @@ async def get_client_status(client_id: str, db = Depends(get_database)):
         service_status = service_manager.get_service_status(client_id)
         
         # Get message statistics
-        client_messages_collection = db.client_messages
-        total_messages = await client_messages_collection.count_documents({"client_id": client_id})
+        scope = {"client_id": client_id}
+        total_messages = await storage.messages.count("client_messages", scope)
         
         today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        messages_today = await client_messages_collection.count_documents({
-            "client_id": client_id,
-            "created_at": {"$gte": today_start}
-        })
+        messages_today = await storage.messages.count("client_messages", scope, since=today_start)
         
-        unique_users = len(await client_messages_collection.distinct("phone_number", {"client_id": client_id}))
+        unique_users = await storage.messages.unique_phones("client_messages", scope)
         
         return {
-            "client": ClientResponse(**{k:v for k,v in client_data.items() if k != '_id'}),
+            "client": ClientResponse(**client_data),
             "service": service_status,
             "stats": {
                 "total_messages": total_messages,
@@ -245,34 +256,26 @@ async def get_client_status(client_id: str, db = Depends(get_database)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/clients/{client_id}/connected")
-async def client_connected(client_id: str, phone_data: dict, db = Depends(get_database)):
+async def client_connected(client_id: str, phone_data: dict):
     """Callback when client's WhatsApp gets connected"""
     try:
-        clients_collection = db.clients
-        await clients_collection.update_one(
-            {"id": client_id},
-            {"$set": {
-                "connected_phone": phone_data.get("phone"),
-                "last_activity": datetime.utcnow()
-            }}
-        )
+        await storage.clients.update(client_id, {
+            "connected_phone": phone_data.get("phone"),
+            "last_activity": datetime.utcnow()
+        })
         return {"message": "Client connection status updated"}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/clients/{client_id}/disconnected") 
-async def client_disconnected(client_id: str, db = Depends(get_database)):
+async def client_disconnected(client_id: str):
     """Callback when client's WhatsApp gets disconnected"""
     try:
-        clients_collection = db.clients
-        await clients_collection.update_one(
-            {"id": client_id},
-            {"$set": {
-                "connected_phone": None,
-                "last_activity": datetime.utcnow()
-            }}
-        )
+        await storage.clients.update(client_id, {
+            "connected_phone": None,
+            "last_activity": datetime.utcnow()
+        })
         return {"message": "Client disconnection status updated"}
         
     except Exception as e:
@@ -292,43 +295,471 @@ async def force_cleanup():
 @router.put("/clients/{client_id}/update-openai")
 async def update_client_openai(
     client_id: str,
-    openai_data: dict,
-    db = Depends(get_database)
+    openai_data: dict
 ):
     """Update client OpenAI configuration"""
     try:
-        clients_collection = db.clients
-        client_data = await clients_collection.find_one({"id": client_id})
+        client_data = await storage.clients.get(client_id)
         
         if not client_data:
             raise HTTPException(status_code=404, detail="Client not found")
         
+        # Cached answers belong to the previous assistant configuration
+        from response_cache import response_cache
+        response_cache.invalidate_assistant(client_data.get("openai_assistant_id"))
+        response_cache.invalidate_assistant(openai_data.get("assistant_id"))
+        
+        # New credentials get a fresh chance
+        from circuit_breaker import circuit_breakers
+        circuit_breakers.reset(client_id)
+        
         # Update OpenAI configuration
-        await clients_collection.update_one(
-            {"id": client_id},
-            {"$set": {
-                "openai_api_key": openai_data.get("api_key"),
-                "openai_assistant_id": openai_data.get("assistant_id"),
-                "last_activity": datetime.utcnow()
-            }}
-        )
+        await storage.clients.update(client_id, {
+            "openai_api_key": openai_data.get("api_key"),
+            "openai_assistant_id": openai_data.get("assistant_id"),
+            "last_activity": datetime.utcnow()
+        })
+        
+        # Release the pooled client and rate-limit state of a replaced key
+        old_key = client_data.get("openai_api_key")
+        if old_key and old_key != openai_data.get("api_key"):
+            from openai_clients import forget_openai_client
+            from openai_scheduler import openai_scheduler
+            await forget_openai_client(old_key)
+            openai_scheduler.forget_key(old_key)
         
         return {"message": "OpenAI configuration updated successfully", "success": True}
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/clients/{client_id}/settings")
+async def update_client_settings(
+    client_id: str,
+    settings: ClientSettingsUpdate
+):
+    """Update client message pipeline settings"""
+    try:
+        client_data = await storage.clients.get(client_id)
+        
+        if not client_data:
+            raise HTTPException(status_code=404, detail="Client not found")
+        
+        # Only touch the fields that were sent
+        updates = settings.dict(exclude_unset=True)
+        if not updates:
+            raise HTTPException(status_code=400, detail="No settings provided")
+        
+        updates["last_activity"] = datetime.utcnow()
+        await storage.clients.update(client_id, updates)
+        
+        return {"message": "Client settings updated successfully", "success": True}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/conversations/stats")
+async def get_conversation_pipeline_stats():
+    """Get per-conversation actor statistics"""
+    try:
+        from conversation_actor import conversation_actors
+        from interim_ack import interim_acks
+        from reply_streamer import reply_streamer
+        from message_store import message_store
+        return {
+            **conversation_actors.get_stats(),
+            "interim_acks_sent": interim_acks.acks_sent,
+            "streaming": reply_streamer.get_stats(),
+            "message_store": message_store.get_stats()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def mask_tool_headers(tool: dict) -> dict:
+    """Copy of a tool with its webhook header values (tokens, API keys) masked"""
+    from client_listing import mask_api_key
+    if not tool.get("headers"):
+        return tool
+    return {**tool, "headers": {name: mask_api_key(value) for name, value in tool["headers"].items()}}
+
+@router.get("/clients/{client_id}/tools")
+async def get_client_tools(client_id: str):
+    """Get tool handlers registered for a client's assistant"""
+    try:
+        tools = await storage.tools.list(client_id)
+        
+        from tool_executor import tool_executor
+        return {
+            "tools": [mask_tool_headers(tool) for tool in tools],
+            "count": len(tools),
+            "builtin_tools": sorted(tool_executor.builtin_handlers)
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/clients/{client_id}/tools")
+async def register_client_tool(client_id: str, tool_data: ClientToolCreate):
+    """Register (or replace) a tool handler for a client's assistant"""
+    try:
+        client_data = await storage.clients.get(client_id)
+        if not client_data:
+            raise HTTPException(status_code=404, detail="Client not found")
+        
+        from tool_executor import tool_executor
+        if tool_data.type == ToolType.WEBHOOK and not tool_data.url:
+            raise HTTPException(status_code=400, detail="Webhook tools require a url")
+        if tool_data.type == ToolType.BUILTIN and (tool_data.builtin or tool_data.name) not in tool_executor.builtin_handlers:
+            raise HTTPException(status_code=400, detail="Unknown built-in tool")
+        
+        tool = ClientTool(client_id=client_id, **tool_data.dict())
+        await storage.tools.upsert(tool.dict())
+        
+        return {"message": f"Tool {tool.name} registered", "success": True, "tool": mask_tool_headers(tool.dict())}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/clients/{client_id}/tools/{tool_name}")
+async def delete_client_tool(client_id: str, tool_name: str):
+    """Remove a tool handler from a client"""
+    try:
+        deleted = await storage.tools.delete(client_id, tool_name)
+        
+        if deleted == 0:
+            raise HTTPException(status_code=404, detail="Tool not found")
+        
+        return {"message": f"Tool {tool_name} removed", "success": True}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/clients/{client_id}/intent-rules")
+async def get_intent_rules(client_id: str):
+    """Get a client's local intent rules with their hit counts"""
+    try:
+        from intent_router import intent_router
+        rules = await storage.intent_rules.list(client_id)
+        
+        # Include hits that have not been flushed to the database yet
+        for rule in rules:
+            rule["hit_count"] = rule.get("hit_count", 0) + intent_router.pending_hits.get(rule["id"], 0)
+        
+        return {
+            "rules": rules,
+            "count": len(rules),
+            "avoided_openai_calls": sum(rule["hit_count"] for rule in rules)
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/clients/{client_id}/intent-rules")
+async def replace_intent_rules(client_id: str, rules_data: List[IntentRuleCreate]):
+    """Replace a client's local intent rules"""
+    try:
+        client_data = await storage.clients.get(client_id)
+        if not client_data:
+            raise HTTPException(status_code=404, detail="Client not found")
+        
+        from intent_router import intent_router
+        rules = [IntentRule(client_id=client_id, **rule_data.dict()) for rule_data in rules_data]
+        
+        for rule in rules:
+            try:
+                intent_router.validate_rule(rule.dict())
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid rule '{rule.name}': {str(e)}")
+        try:
+            intent_router.validate_rules([rule.dict() for rule in rules])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # Keep accumulated hit counts for rules that survive by name
+        await intent_router.flush_hit_counts()
+        existing = await storage.intent_rules.list(client_id)
+        previous_hits = {rule["name"]: rule.get("hit_count", 0) for rule in existing}
+        for rule in rules:
+            rule.hit_count = previous_hits.get(rule.name, 0)
+        
+        await storage.intent_rules.replace(client_id, [rule.dict() for rule in rules])
+        
+        intent_router.invalidate(client_id)
+        
+        return {"message": f"Saved {len(rules)} intent rules", "success": True}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/intent-rules/stats")
+async def get_intent_router_stats():
+    """Get OpenAI calls avoided by local intent rules"""
+    try:
+        from intent_router import intent_router
+        return intent_router.get_stats()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/response-cache/stats")
+async def get_response_cache_stats():
+    """Get response cache statistics per assistant"""
+    try:
+        from response_cache import response_cache
+        return response_cache.get_stats()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/clients/{client_id}/response-cache/clear")
+async def clear_client_response_cache(client_id: str):
+    """Clear cached answers of a client's assistant"""
+    try:
+        client_data = await storage.clients.get(client_id)
+        
+        if not client_data:
+            raise HTTPException(status_code=404, detail="Client not found")
+        
+        from response_cache import response_cache
+        response_cache.invalidate_assistant(client_data.get("openai_assistant_id"))
+        
+        return {"message": "Response cache cleared", "success": True}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/tools/stats")
+async def get_tool_stats():
+    """Get tool execution statistics"""
+    try:
+        from tool_executor import tool_executor
+        return tool_executor.get_stats()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/threads/stats")
+async def get_thread_stats():
+    """Get thread rotation statistics and the largest conversation threads"""
+    try:
+        from thread_lifecycle import thread_lifecycle
+        return await thread_lifecycle.get_stats()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/circuits")
+async def get_open_circuits():
+    """Get clients whose assistant circuit is open or probing"""
+    try:
+        from circuit_breaker import circuit_breakers
+        circuits = circuit_breakers.get_stats()
+        return {"circuits": circuits, "count": len(circuits)}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/clients/{client_id}/circuit/reset")
+async def reset_client_circuit(client_id: str):
+    """Close a client's assistant circuit"""
+    try:
+        from circuit_breaker import circuit_breakers
+        circuit_breakers.reset(client_id)
+        return {"message": "Circuit reset", "success": True}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/admission/stats")
+async def get_admission_stats():
+    """Get in-flight replies, queue depth and shed counts"""
+    try:
+        from admission_control import admission_control
+        return admission_control.get_stats()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/database/pool")
+async def get_database_pool_stats():
+    """Get MongoDB connection pool settings and checkout wait metrics"""
+    try:
+        from database import get_pool_stats
+        return get_pool_stats()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/database/queries")
+async def get_database_query_stats():
+    """Get database queries per request by route, with slow and N+1 request counts"""
+    try:
+        from query_metrics import query_metrics
+        return query_metrics.get_stats()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/ports/stats")
+async def get_port_allocator_stats():
+    """Get WhatsApp port allocation statistics"""
+    try:
+        from port_allocator import port_allocator
+        return await port_allocator.get_stats()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/commands/stats")
+async def get_command_lane_stats():
+    """Get pause command latency against its SLO"""
+    try:
+        from command_lane import command_lane
+        return command_lane.get_stats()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/openai/scheduler")
+async def get_openai_scheduler_stats():
+    """Get OpenAI request queue depth and wait times per client"""
+    try:
+        from openai_scheduler import openai_scheduler
+        return openai_scheduler.get_stats()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/runs")
+async def get_in_flight_runs(client_id: Optional[str] = None, min_age_seconds: float = 0, stuck_only: bool = False):
+    """List in-flight OpenAI assistant runs, oldest first"""
+    try:
+        from run_tracker import run_tracker
+        runs = run_tracker.list_runs(client_id, min_age_seconds, stuck_only)
+        return {"runs": runs, "count": len(runs)}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/runs/cancel")
+async def cancel_in_flight_runs(cancel_request: CancelRunsRequest):
+    """Cancel stuck assistant runs in bulk"""
+    try:
+        from run_tracker import run_tracker
+        cancelled = await run_tracker.cancel_runs(
+            client_id=cancel_request.client_id,
+            min_age_seconds=cancel_request.min_age_seconds,
+            stuck_only=cancel_request.stuck_only,
+            run_ids=cancel_request.run_ids
+        )
+        return {
+            "message": f"Cancelled {len(cancelled)} runs",
+            "success": True,
+            "cancelled_runs": cancelled
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/runs/metrics")
+async def get_run_metrics():
+    """Get in-flight run age metrics"""
+    try:
+        from run_tracker import run_tracker
+        return run_tracker.get_metrics()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/usage")
+async def get_usage_by_client(days: int = Query(7, ge=1, le=365), db = Depends(get_analytics_database)):
+    """Get token, cost and latency totals per client, most expensive first"""
+    try:
+        from usage_metering import usage_meter
+        usage = await usage_meter.usage_by_client(db, days)
+        
+        # Attach client names with one query
+        names = await storage.clients.names([row["client_id"] for row in usage])
+        for row in usage:
+            row["client_name"] = names.get(row["client_id"])
+        
+        return {
+            "days": days,
+            "clients": usage,
+            "total_cost_usd": round(sum(row["estimated_cost_usd"] for row in usage), 4),
+            "meter": usage_meter.get_stats()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/clients/{client_id}/usage")
+async def get_client_usage(client_id: str, days: int = Query(30, ge=1, le=365), db = Depends(get_analytics_database)):
+    """Get a client's daily token, cost and latency totals"""
+    try:
+        from usage_metering import usage_meter
+        daily = await usage_meter.usage_by_day(db, client_id, days)
+        return {
+            "client_id": client_id,
+            "days": days,
+            "daily": daily,
+            "total_cost_usd": round(sum(row["estimated_cost_usd"] for row in daily), 4)
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/clients/{client_id}/messages/{phone_number}")
+async def get_client_conversation(
+    client_id: str,
+    phone_number: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """Get a conversation page by page (pass next_cursor back as cursor), or stream it as NDJSON"""
+    try:
+        from fastapi.responses import StreamingResponse
+        from message_history import parse_fields, InvalidCursor
+        
+        try:
+            selected = parse_fields(fields)
+            scope = {"client_id": client_id, "phone_number": phone_number}
+            
+            if format == "ndjson":
+                # Whole conversation (or `limit` messages) without building it in memory
+                lines = await storage.messages.stream_history("client_messages", scope, limit, cursor, order == "desc", selected)
+                return StreamingResponse(lines, media_type="application/x-ndjson")
+            
+            return await storage.messages.history_page("client_messages", scope, limit or 50, cursor, order == "desc", selected)
+        except (ValueError, InvalidCursor) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/clients/{client_id}/paused-conversations")
-async def get_paused_conversations(client_id: str, db = Depends(get_database)):
+async def get_paused_conversations(client_id: str):
     """Get list of paused conversations for a client"""
     try:
-        paused_conversations = db.paused_conversations
-        paused = await paused_conversations.find({"client_id": client_id}).to_list(length=None)
-        
-        # Clean up data
-        for conversation in paused:
-            if '_id' in conversation:
-                del conversation['_id']
+        paused = await storage.pauses.list(client_id)
         
         return {"paused_conversations": paused, "count": len(paused)}
         
@@ -336,16 +767,15 @@ async def get_paused_conversations(client_id: str, db = Depends(get_database)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/clients/{client_id}/clear-paused")
-async def clear_all_paused_conversations(client_id: str, db = Depends(get_database)):
+async def clear_all_paused_conversations(client_id: str):
     """Clear all paused conversations for a client"""
     try:
-        paused_conversations = db.paused_conversations
-        result = await paused_conversations.delete_many({"client_id": client_id})
+        cleared_count = await storage.pauses.remove_all(client_id)
         
         return {
-            "message": f"Cleared {result.deleted_count} paused conversations",
+            "message": f"Cleared {cleared_count} paused conversations",
             "success": True,
-            "cleared_count": result.deleted_count
+            "cleared_count": cleared_count
         }
         
     except Exception as e:
@@ -354,25 +784,20 @@ async def clear_all_paused_conversations(client_id: str, db = Depends(get_databa
 @router.put("/clients/{client_id}/update-email")
 async def update_client_email(
     client_id: str,
-    email_request: UpdateEmailRequest,
-    db = Depends(get_database)
+    email_request: UpdateEmailRequest
 ):
     """Update client email address"""
     try:
-        clients_collection = db.clients
-        client_data = await clients_collection.find_one({"id": client_id})
+        client_data = await storage.clients.get(client_id)
         
         if not client_data:
             raise HTTPException(status_code=404, detail="Client not found")
         
         # Update email
-        await clients_collection.update_one(
-            {"id": client_id},
-            {"$set": {
-                "email": email_request.new_email,
-                "last_activity": datetime.utcnow()
-            }}
-        )
+        await storage.clients.update(client_id, {
+            "email": email_request.new_email,
+            "last_activity": datetime.utcnow()
+        })
         
         return {"message": f"Email updated to {email_request.new_email}", "success": True}
         
@@ -401,13 +826,11 @@ async def regenerate_all_services(db = Depends(get_database)):
 @router.post("/clients/{client_id}/resend-email")
 async def resend_client_email(
     client_id: str,
-    background_tasks: BackgroundTasks,
-    db = Depends(get_database)
+    background_tasks: BackgroundTasks
 ):
     """Resend invitation email to client"""
     try:
-        clients_collection = db.clients
-        client_data = await clients_collection.find_one({"id": client_id})
+        client_data = await storage.clients.get(client_id)
         
         if not client_data:
             raise HTTPException(status_code=404, detail="Client not found")
@@ -427,10 +850,7 @@ async def resend_client_email(
         )
         
         # Update last activity
-        await clients_collection.update_one(
-            {"id": client_id},
-            {"$set": {"last_activity": datetime.utcnow()}}
-        )
+        await storage.clients.update(client_id, {"last_activity": datetime.utcnow()})
         
         return {"message": f"Email reenviado a {client.email}", "success": True}
         
@@ -0,0 +1,149 @@
+"""
+Admission control for assistant replies
+Bounds how many replies are generated at once, globally and per client. Work
+over the limit waits briefly in a bounded FIFO queue and is shed with a busy
+reply when no slot frees up in time, so spikes degrade instead of piling up
+"""
+import asyncio
+import os
+import time
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUSY_REPLY = "Estamos recibiendo muchos mensajes en este momento. Por favor intenta nuevamente en unos minutos."
+
+
+class AdmissionController:
+    def __init__(self):
+        self.max_in_flight = int(os.environ.get('MAX_IN_FLIGHT_REPLIES', '200'))
+        self.max_per_client = int(os.environ.get('MAX_IN_FLIGHT_REPLIES_PER_CLIENT', '20'))
+        self.max_queued = int(os.environ.get('ADMISSION_MAX_QUEUED', '500'))
+        self.queue_timeout = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_SECONDS', '3'))
+
+        self.in_flight = 0
+        self.in_flight_by_client: Dict[str, int] = {}
+        self.waiters: Deque[tuple] = deque()  # (client_id, client_limit, future)
+
+        self.admitted = 0
+        self.queued = 0
+        self.total_wait_ms = 0.0
+        self.shed: Dict[str, int] = {"queue_full": 0, "queue_timeout": 0}
+        self.shed_by_client: Dict[str, int] = {}
+
+    def _has_capacity(self, client_id: str, client_limit: int) -> bool:
+        return self.in_flight < self.max_in_flight and self.in_flight_by_client.get(client_id, 0) < client_limit
+
+    def _admit(self, client_id: str):
+        self.in_flight += 1
+        self.in_flight_by_client[client_id] = self.in_flight_by_client.get(client_id, 0) + 1
+        self.admitted += 1
+
+    def _shed(self, client_id: str, reason: str):
+        self.shed[reason] += 1
+        self.shed_by_client[client_id] = self.shed_by_client.get(client_id, 0) + 1
+        logger.warning(f"Shedding reply for client {client_id} ({reason}), {self.in_flight} in flight, {len(self.waiters)} queued")
+
+    async def acquire(self, client_id: str, client_limit: Optional[int] = None) -> bool:
+        """Wait for a reply slot; False means the work was shed"""
+        limit = client_limit or self.max_per_client
+
+        # Waiters are only left behind by their own client limit, so free capacity can be taken directly
+        if self._has_capacity(client_id, limit):
+            self._admit(client_id)
+            return True
+
+        if len(self.waiters) >= self.max_queued:
+            self._shed(client_id, "queue_full")
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (client_id, limit, future)
+        self.waiters.append(entry)
+        self.queued += 1
+        enqueued_at = time.monotonic()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Caller went away; give back a slot handed over at the last moment
+            if self._leave_queue(entry):
+                self.release(client_id)
+            raise
+        finally:
+            self.total_wait_ms += (time.monotonic() - enqueued_at) * 1000
+
+        if self._leave_queue(entry):
+            return True
+
+        self._shed(client_id, "queue_timeout")
+        return False
+
+    def _leave_queue(self, entry: tuple) -> bool:
+        """Stop waiting; True if a slot was granted meanwhile"""
+        future = entry[2]
+        if future.done() and not future.cancelled():
+            return True
+        # Cancel so a later release does not hand us a slot
+        future.cancel()
+        try:
+            self.waiters.remove(entry)
+        except ValueError:
+            pass
+        return False
+
+    def release(self, client_id: str):
+        """Free a reply slot and hand it to the next waiter that fits"""
+        self.in_flight = max(self.in_flight - 1, 0)
+        remaining = self.in_flight_by_client.get(client_id, 1) - 1
+        if remaining > 0:
+            self.in_flight_by_client[client_id] = remaining
+        else:
+            self.in_flight_by_client.pop(client_id, None)
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        # FIFO, but a client at its own limit does not block the others
+        for entry in list(self.waiters):
+            if self.in_flight >= self.max_in_flight:
+                break
+            waiter_client_id, limit, future = entry
+            if future.done():
+                self.waiters.remove(entry)
+                continue
+            if self.in_flight_by_client.get(waiter_client_id, 0) < limit:
+                self.waiters.remove(entry)
+                self._admit(waiter_client_id)
+                future.set_result(True)
+
+    def get_stats(self) -> dict:
+        """Get in-flight, queue depth and shed metrics"""
+        queued_by_client: Dict[str, int] = {}
+        for client_id, _, future in self.waiters:
+            if not future.done():
+                queued_by_client[client_id] = queued_by_client.get(client_id, 0) + 1
+
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "max_in_flight_per_client": self.max_per_client,
+            "queue_depth": sum(queued_by_client.values()),
+            "max_queued": self.max_queued,
+            "queue_timeout_seconds": self.queue_timeout,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "average_queue_wait_ms": round(self.total_wait_ms / self.queued, 1) if self.queued else 0,
+            "shed_total": sum(self.shed.values()),
+            "shed_by_reason": dict(self.shed),
+            "shed_by_client": dict(self.shed_by_client),
+            "in_flight_by_client": dict(self.in_flight_by_client),
+            "queued_by_client": queued_by_client
+        }
+
+
+# Global admission controller instance
+admission_control = AdmissionController()
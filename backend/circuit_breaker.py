@@ -0,0 +1,174 @@
+"""
+Per-client circuit breaker around the assistant engine
+Stops sending traffic to tenants whose OpenAI credentials or assistant keep
+failing, answers with a fallback reply while open, and probes for recovery
+"""
+import asyncio
+import os
+import time
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+import openai
+from storage import storage
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+DEFAULT_FALLBACK_REPLY = "Gracias por tu mensaje. En este momento no podemos responder automáticamente, te contactaremos a la brevedad."
+
+# Errors that will not go away by retrying: revoked key, deleted assistant, missing permissions
+FATAL_ERRORS = (openai.AuthenticationError, openai.PermissionDeniedError, openai.NotFoundError)
+
+
+class ClientCircuit:
+    def __init__(self):
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.fatal_failures = 0
+        self.open_seconds = 0.0
+        self.open_until = 0.0
+        self.opened_at: Optional[datetime] = None
+        self.probe_started = 0.0
+        self.last_error: Optional[str] = None
+        self.short_circuited = 0
+
+
+class CircuitBreakerRegistry:
+    def __init__(self):
+        self.failure_threshold = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+        self.fatal_threshold = int(os.environ.get('CIRCUIT_FATAL_THRESHOLD', '2'))
+        self.base_open_seconds = float(os.environ.get('CIRCUIT_OPEN_SECONDS', '60'))
+        self.max_open_seconds = float(os.environ.get('CIRCUIT_MAX_OPEN_SECONDS', '900'))
+        self.circuits: Dict[str, ClientCircuit] = {}
+
+    def _circuit(self, client_id: str) -> ClientCircuit:
+        circuit = self.circuits.get(client_id)
+        if circuit is None:
+            circuit = ClientCircuit()
+            self.circuits[client_id] = circuit
+        return circuit
+
+    def allow_request(self, client_id: str) -> bool:
+        """Check if a message may use the assistant engine; lets one probe through after the open period"""
+        circuit = self._circuit(client_id)
+
+        if circuit.state == CIRCUIT_CLOSED:
+            return True
+
+        now = time.monotonic()
+        if circuit.state == CIRCUIT_OPEN and now >= circuit.open_until:
+            circuit.state = CIRCUIT_HALF_OPEN
+            circuit.probe_started = now
+            logger.info(f"Circuit for client {client_id} half-open, probing")
+            self._persist(client_id, circuit)
+            return True
+
+        # A probe that never reported back (timeout, cache hit) must not block forever
+        if circuit.state == CIRCUIT_HALF_OPEN and now - circuit.probe_started >= max(circuit.open_seconds, self.base_open_seconds):
+            circuit.probe_started = now
+            return True
+
+        circuit.short_circuited += 1
+        return False
+
+    def record_success(self, client_id: str):
+        """Close the circuit after a successful reply"""
+        circuit = self._circuit(client_id)
+        previous_state = circuit.state
+
+        circuit.failures = 0
+        circuit.fatal_failures = 0
+        circuit.open_seconds = 0.0
+
+        if previous_state != CIRCUIT_CLOSED:
+            circuit.state = CIRCUIT_CLOSED
+            circuit.opened_at = None
+            logger.info(f"✅ Circuit for client {client_id} closed")
+            self._persist(client_id, circuit)
+
+    def record_failure(self, client_id: str, error: Exception):
+        """Count a failure and open the circuit when the client looks broken"""
+        circuit = self._circuit(client_id)
+        circuit.last_error = f"{type(error).__name__}: {str(error)[:200]}"
+        circuit.failures += 1
+        if isinstance(error, FATAL_ERRORS):
+            circuit.fatal_failures += 1
+
+        should_open = (
+            circuit.state == CIRCUIT_HALF_OPEN
+            or circuit.failures >= self.failure_threshold
+            or circuit.fatal_failures >= self.fatal_threshold
+        )
+        if should_open:
+            self._open(client_id, circuit)
+
+    def _open(self, client_id: str, circuit: ClientCircuit):
+        # Each failed probe doubles the open period
+        circuit.open_seconds = min(
+            circuit.open_seconds * 2 if circuit.open_seconds else self.base_open_seconds,
+            self.max_open_seconds
+        )
+        circuit.state = CIRCUIT_OPEN
+        circuit.open_until = time.monotonic() + circuit.open_seconds
+        circuit.opened_at = circuit.opened_at or datetime.utcnow()
+
+        logger.warning(f"⛔ Circuit for client {client_id} open for {circuit.open_seconds:.0f}s: {circuit.last_error}")
+        self._persist(client_id, circuit)
+
+    def reset(self, client_id: str):
+        """Close a client's circuit (credentials were fixed)"""
+        if client_id in self.circuits:
+            self.circuits[client_id] = ClientCircuit()
+        self._persist(client_id, self._circuit(client_id))
+
+    def _persist(self, client_id: str, circuit: ClientCircuit):
+        """Mirror the state on the client document so the admin panel can flag it"""
+        async def write():
+            try:
+                await storage.clients.update(client_id, {
+                    "circuit_state": circuit.state,
+                    "circuit_opened_at": circuit.opened_at,
+                    "circuit_last_error": circuit.last_error if circuit.state != CIRCUIT_CLOSED else None
+                })
+            except Exception as e:
+                logger.error(f"Error persisting circuit state for client {client_id}: {str(e)}")
+
+        try:
+            asyncio.get_running_loop().create_task(write())
+        except RuntimeError:
+            pass  # No event loop (e.g. scripts), the in-memory state is still valid
+
+    async def clear_persisted_states(self):
+        """Circuits start closed on boot, so clear flags left by a previous process"""
+        try:
+            await storage.clients.update_where(
+                "circuit_state",
+                [CIRCUIT_OPEN, CIRCUIT_HALF_OPEN],
+                {"circuit_state": CIRCUIT_CLOSED, "circuit_opened_at": None, "circuit_last_error": None}
+            )
+        except Exception as e:
+            logger.error(f"Error clearing persisted circuit states: {str(e)}")
+
+    def get_stats(self) -> dict:
+        """Get circuits that are not closed"""
+        now = time.monotonic()
+        return {
+            client_id: {
+                "state": circuit.state,
+                "failures": circuit.failures,
+                "last_error": circuit.last_error,
+                "opened_at": circuit.opened_at,
+                "retry_in_seconds": round(max(circuit.open_until - now, 0), 1),
+                "short_circuited_messages": circuit.short_circuited
+            }
+            for client_id, circuit in self.circuits.items()
+            if circuit.state != CIRCUIT_CLOSED
+        }
+
+
+# Global circuit breaker registry instance
+circuit_breakers = CircuitBreakerRegistry()
@@ -1,6 +1,7 @@
 import asyncio
 from datetime import datetime, timedelta
-from database import get_database_direct
+from storage import storage
+from message_collections import is_timeseries
 import logging
 
 logger = logging.getLogger(__name__)
@@ -36,21 +37,21 @@ class DataCleanupService:
         try:
             logger.info("🧹 Starting automated data cleanup...")
             
-            # Get database connection
-            db = await get_database_direct()
-            
             # Calculate cutoff time (24 hours ago)
             cutoff_time = datetime.utcnow() - timedelta(hours=24)
             logger.info(f"Cleaning messages older than: {cutoff_time}")
             
+            # Time-series message collections expire on their own
+            timeseries = storage.name == "mongo" and is_timeseries()
+            
             # Clean client messages
-            client_messages_deleted = await self._cleanup_client_messages(db, cutoff_time)
+            client_messages_deleted = 0 if timeseries else await self._cleanup_client_messages(cutoff_time)
             
             # Clean client threads (optional - for performance)
-            threads_deleted = await self._cleanup_old_threads(db, cutoff_time)
+            threads_deleted = await self._cleanup_old_threads(cutoff_time)
             
             # Clean old WhatsApp messages (legacy)
-            whatsapp_messages_deleted = await self._cleanup_whatsapp_messages(db, cutoff_time)
+            whatsapp_messages_deleted = 0 if timeseries else await self._cleanup_whatsapp_messages(cutoff_time)
             
             logger.info(f"✅ Cleanup completed successfully:")
             logger.info(f"   - Client messages deleted: {client_messages_deleted}")
@@ -60,17 +61,11 @@ class DataCleanupService:
         except Exception as e:
             logger.error(f"❌ Error during cleanup: {str(e)}")
     
-    async def _cleanup_client_messages(self, db, cutoff_time: datetime) -> int:
+    async def _cleanup_client_messages(self, cutoff_time: datetime) -> int:
         """Clean old client messages"""
         try:
-            client_messages_collection = db.client_messages
-            
             # Delete messages older than 24 hours
-            result = await client_messages_collection.delete_many({
-                "created_at": {"$lt": cutoff_time}
-            })
-            
-            deleted_count = result.deleted_count
+            deleted_count = await storage.messages.delete_before("client_messages", cutoff_time)
             logger.info(f"Deleted {deleted_count} old client messages")
             return deleted_count
             
@@ -78,17 +73,11 @@ class DataCleanupService:
             logger.error(f"Error cleaning client messages: {str(e)}")
             return 0
     
-    async def _cleanup_old_threads(self, db, cutoff_time: datetime) -> int:
+    async def _cleanup_old_threads(self, cutoff_time: datetime) -> int:
         """Clean old conversation threads"""
         try:
-            # Clean client threads
-            client_threads_collection = db.client_threads
-            
-            result = await client_threads_collection.delete_many({
-                "last_used": {"$lt": cutoff_time}
-            })
-            
-            deleted_count = result.deleted_count
+            # Clean client threads (threads created before last_used was tracked fall back to created_at)
+            deleted_count = await storage.threads.delete_unused_before(cutoff_time)
             logger.info(f"Deleted {deleted_count} old client threads")
             return deleted_count
             
@@ -96,16 +85,10 @@ class DataCleanupService:
             logger.error(f"Error cleaning threads: {str(e)}")
             return 0
     
-    async def _cleanup_whatsapp_messages(self, db, cutoff_time: datetime) -> int:
+    async def _cleanup_whatsapp_messages(self, cutoff_time: datetime) -> int:
         """Clean legacy WhatsApp messages"""
         try:
-            whatsapp_messages_collection = db.whatsapp_messages
-            
-            result = await whatsapp_messages_collection.delete_many({
-                "created_at": {"$lt": cutoff_time}
-            })
-            
-            deleted_count = result.deleted_count
+            deleted_count = await storage.messages.delete_before("whatsapp_messages", cutoff_time)
             if deleted_count > 0:
                 logger.info(f"Deleted {deleted_count} legacy WhatsApp messages")
             return deleted_count
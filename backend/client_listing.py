@@ -0,0 +1,141 @@
+"""
+Paginated tenant listing for the admin panel
+Clients are listed in (name, id) order from a keyset cursor, filtered and
+projected by MongoDB, and message counts are joined in the same aggregation,
+so each page costs the same however many tenants exist. API keys are masked
+"""
+import base64
+import json
+import re
+from typing import Optional, Tuple
+from message_collections import meta_field
+
+CLIENT_LIST_FIELDS = (
+    "id", "name", "email", "openai_api_key", "openai_assistant_id", "status", "connected_phone",
+    "whatsapp_port", "unique_url", "created_at", "last_activity", "message_debounce_seconds",
+    "response_cache_enabled", "engine", "chat_model", "context_token_budget", "reply_mode",
+    "circuit_state", "circuit_last_error"
+)
+SORT_KEYS = (("name", 1), ("id", 1))
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def mask_api_key(api_key: Optional[str]) -> Optional[str]:
+    """sk-...abcd - enough to tell keys apart without exposing them"""
+    if not api_key:
+        return api_key
+    return f"{api_key[:3]}...{api_key[-4:]}" if len(api_key) > 12 else "..."
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Comma separated field list from the query string; id and name are always returned"""
+    if not fields:
+        return CLIENT_LIST_FIELDS
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in CLIENT_LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(CLIENT_LIST_FIELDS)}")
+    return tuple(dict.fromkeys(["id", "name"] + requested))
+
+
+def encode_cursor(client: dict) -> str:
+    key = json.dumps([client["name"], client["id"]])
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        name, client_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(name), str(client_id)
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+
+def client_filter(status: Optional[str] = None, connected: Optional[bool] = None, name_prefix: Optional[str] = None) -> dict:
+    """Server-side filters of the listing"""
+    query = {}
+    if status:
+        query["status"] = status
+    if connected is not None:
+        query["connected_phone"] = {"$nin": [None, ""]} if connected else {"$in": [None, ""]}
+    if name_prefix:
+        # Anchored and escaped, so the name index bounds the scan
+        query["name"] = {"$regex": "^" + re.escape(name_prefix)}
+    return query
+
+
+async def list_clients(
+    db,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    filters: Optional[dict] = None,
+    fields: Tuple[str, ...] = CLIENT_LIST_FIELDS,
+    include_message_counts: bool = False
+) -> dict:
+    """One page of clients and the cursor of the next page (None at the end)"""
+    match = dict(filters or {})
+    if cursor:
+        name, client_id = decode_cursor(cursor)
+        keyset = {"$or": [{"name": {"$gt": name}}, {"name": name, "id": {"$gt": client_id}}]}
+        match = {"$and": [match, keyset]} if match else keyset
+
+    pipeline = [
+        {"$match": match},
+        {"$sort": dict(SORT_KEYS)},
+        # One extra document tells whether another page exists
+        {"$limit": limit + 1},
+        {"$project": {"_id": 0, **{field: 1 for field in fields}}}
+    ]
+    if include_message_counts:
+        # Counted per client on the history index, only for the clients of this page
+        pipeline += [
+            {"$lookup": {
+                "from": "client_messages",
+                "localField": "id",
+                "foreignField": meta_field("client_id"),
+                "pipeline": [{"$count": "count"}],
+                "as": "message_counts"
+            }},
+            {"$set": {"message_count": {"$ifNull": [{"$first": "$message_counts.count"}, 0]}}},
+            {"$unset": "message_counts"}
+        ]
+
+    clients = await db.clients.aggregate(pipeline).to_list(length=limit + 1)
+    has_more = len(clients) > limit
+    clients = clients[:limit]
+
+    for client in clients:
+        if "openai_api_key" in client:
+            client["openai_api_key"] = mask_api_key(client["openai_api_key"])
+
+    return {
+        "clients": clients,
+        "next_cursor": encode_cursor(clients[-1]) if has_more else None
+    }
+
+
+async def client_totals(db) -> dict:
+    """Tenant counts per status and connected tenants, in one grouped pass"""
+    rows = await db.clients.aggregate([
+        {"$group": {
+            "_id": "$status",
+            "count": {"$sum": 1},
+            "connected": {"$sum": {"$cond": [{"$gt": [{"$ifNull": ["$connected_phone", ""]}, ""]}, 1, 0]}}
+        }}
+    ]).to_list(length=None)
+
+    return {
+        "total": sum(row["count"] for row in rows),
+        "by_status": {row["_id"]: row["count"] for row in rows},
+        "connected": sum(row["connected"] for row in rows)
+    }
+
+
+async def ensure_client_indexes(db):
+    """Indexes backing the listing order and its filters"""
+    await db.clients.create_index(list(SORT_KEYS))
+    await db.clients.create_index([("status", 1)] + list(SORT_KEYS))
+    await db.clients.create_index([("id", 1)])
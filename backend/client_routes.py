@@ -2,25 +2,49 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import Optional
 import httpx
 import asyncio
+import os
+import time
 from datetime import datetime
 import openai
 from database import get_database
-from models import Client, ClientMessage
+from models import Client, AssistantEngine, ReplyMode
 from whatsapp_manager import service_manager
+from conversation_actor import conversation_actors
+from llm_backend import get_llm_backend, AssistantsBackend
+from run_tracker import run_tracker
+from tool_executor import tool_executor
+from response_cache import response_cache
+from intent_router import intent_router
+from context_window import build_chat_messages
+from thread_lifecycle import thread_lifecycle
+from openai_scheduler import PRIORITY_OWNER, PRIORITY_NORMAL
+from circuit_breaker import circuit_breakers, DEFAULT_FALLBACK_REPLY
+from interim_ack import interim_acks
+from usage_metering import usage_meter
+from command_lane import command_lane
+from admission_control import admission_control, DEFAULT_BUSY_REPLY
+from message_store import message_store
+from storage import storage
+from reply_streamer import reply_streamer, ReplyStream, StreamedReply
 
 router = APIRouter(prefix="/api/client", tags=["client"])
 
+# Direct mode defaults
+DIRECT_MODE_MODEL = os.environ.get('DIRECT_MODE_MODEL', 'gpt-4o-mini')
+DIRECT_MODE_CONTEXT_TOKENS = int(os.environ.get('DIRECT_MODE_CONTEXT_TOKENS', '3000'))
+DIRECT_MODE_MAX_REPLY_TOKENS = int(os.environ.get('DIRECT_MODE_MAX_REPLY_TOKENS', '600'))
+DIRECT_MODE_HISTORY_LIMIT = 40
+
 @router.get("/{unique_url}/status")
-async def get_client_landing_status(unique_url: str, db = Depends(get_database)):
+async def get_client_landing_status(unique_url: str):
     """Get client status for landing page using individual services"""
     try:
-        clients_collection = db.clients
-        client_data = await clients_collection.find_one({"unique_url": unique_url})
+        client_data = await storage.clients.get_by_url(unique_url)
         
         if not client_data:
             raise HTTPException(status_code=404, detail="Client not found")
         
-        client = Client(**{k:v for k,v in client_data.items() if k != '_id'})
+        client = Client(**client_data)
         
         # Get WhatsApp status from individual service
         whatsapp_status = await service_manager.get_whatsapp_status_for_client(client.id)
@@ -38,16 +62,15 @@ async def get_client_landing_status(unique_url: str, db = Depends(get_database))
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{unique_url}/qr")
-async def get_client_qr(unique_url: str, db = Depends(get_database)):
+async def get_client_qr(unique_url: str):
     """Get QR code for client's individual WhatsApp service"""
     try:
-        clients_collection = db.clients
-        client_data = await clients_collection.find_one({"unique_url": unique_url})
+        client_data = await storage.clients.get_by_url(unique_url)
         
         if not client_data:
             raise HTTPException(status_code=404, detail="Client not found")
         
-        client = Client(**{k:v for k,v in client_data.items() if k != '_id'})
+        client = Client(**client_data)
         
         # Get QR from client's individual service
         qr_data = await service_manager.get_qr_code_for_client(client.id)
@@ -79,53 +102,28 @@ async def process_client_message(
     try:
         phone_number = message_data.get("phone_number")
         message_text = message_data.get("message")
-        normalized_message = message_text.lower().strip()
         
         print(f"Processing message for client {client_id} from {phone_number}: {message_text}")
         
+        # 🔥 PAUSE COMMANDS - PRIORITY LANE, BEFORE ANY QUEUEING
+        command = command_lane.recognize(message_text)
+        if command:
+            # Only for existing clients, so no pause rows are created for unknown ids
+            if not await storage.clients.get(client_id):
+                return {"success": False, "error": "Client not found"}
+            print(f"🎯 PROCESSING PAUSE COMMAND: {command} for client {client_id}")
+            reply = await command_lane.execute(command, client_id, phone_number)
+            return {"success": True, "reply": reply}
+        
+        started_at = time.monotonic()
+        
         # Get client data
-        clients_collection = db.clients
-        client_data = await clients_collection.find_one({"id": client_id})
+        client_data = await storage.clients.get(client_id)
         
         if not client_data:
             return {"success": False, "error": "Client not found"}
         
-        client = Client(**{k:v for k,v in client_data.items() if k != '_id'})
-        
-        # 🔥 PAUSE COMMANDS PROCESSING - HANDLE IMMEDIATELY
-        pause_commands = ['pausar', 'reactivar', 'pausar todo', 'activar todo', 'estado']
-        
-        if normalized_message in pause_commands:
-            print(f"🎯 PROCESSING PAUSE COMMAND: {normalized_message} for client {client.name}")
-            
-            # Import pause service
-            from pause_service import pause_service
-            
-            try:
-                if normalized_message == 'pausar':
-                    await pause_service.pause_conversation(client_id, phone_number)
-                    return {"success": True, "reply": "⏸️ Conversación pausada. Para reactivar, escribe 'reactivar'."}
-                
-                elif normalized_message == 'reactivar':
-                    await pause_service.reactivate_conversation(client_id, phone_number)
-                    return {"success": True, "reply": "✅ Conversación reactivada. El asistente responderá automáticamente."}
-                
-                elif normalized_message == 'pausar todo':
-                    await pause_service.pause_all_conversations(client_id)
-                    return {"success": True, "reply": "⏸️ Todas las conversaciones pausadas. Para reactivar todo, escribe 'activar todo'."}
-                
-                elif normalized_message == 'activar todo':
-                    await pause_service.reactivate_all_conversations(client_id)
-                    return {"success": True, "reply": "✅ Todas las conversaciones reactivadas."}
-                
-                elif normalized_message == 'estado':
-                    is_paused = await pause_service.is_conversation_paused(client_id, phone_number)
-                    status_text = "⏸️ Pausada" if is_paused else "✅ Activa"
-                    return {"success": True, "reply": f"Estado de la conversación: {status_text}"}
-                    
-            except Exception as pause_error:
-                print(f"❌ Error processing pause command: {pause_error}")
-                return {"success": True, "reply": "❌ Error procesando comando. Intenta nuevamente."}
+        client = Client(**client_data)
         
         # 🔍 CHECK IF CONVERSATION IS PAUSED BEFORE PROCESSING WITH AI
         from pause_service import pause_service
@@ -135,11 +133,81 @@ async def process_client_message(
             print(f"🔇 Conversation with {phone_number} is PAUSED for client {client.name} - not responding")
             return {"success": True, "reply": None}  # Silent - no response
         
+        # Persisted write-behind - never delays the reply
+        message_store.store_client_message(
+            client_id, phone_number, message_text, message_data.get("timestamp") or int(datetime.now().timestamp())
+        )
+        
+        # ⚡ LOCAL FAST PATH - GREETINGS AND CANNED REPLIES NEVER REACH OPENAI
+        rule = await intent_router.route(client_id, message_text)
+        if rule:
+            print(f"⚡ Intent rule '{rule['name']}' answered locally for client {client.name}")
+            reply = rule.get('reply') if rule.get('action') == 'reply' else None
+            if reply:
+                message_store.store_client_message(client_id, phone_number, reply, int(datetime.now().timestamp()), is_from_ai=True)
+            return {"success": True, "reply": reply, "handled_locally": True}
+        
         # 🤖 CONTINUE WITH NORMAL AI PROCESSING IF NOT PAUSED
         print(f"🤖 Processing with OpenAI for client {client.name}")
         
-        # Generate response with client's specific OpenAI credentials
-        ai_response = await generate_ai_response_for_client(message_text, phone_number, client, db)
+        async def generate_burst_reply(combined_message: str) -> str:
+            # Broken credentials or assistant - answer immediately without touching OpenAI
+            if not circuit_breakers.allow_request(client.id):
+                print(f"⛔ Circuit open for client {client.name} - sending fallback reply")
+                return client.fallback_reply or DEFAULT_FALLBACK_REPLY
+            
+            # Long replies can go out sentence by sentence while they are generated
+            reply_stream = reply_streamer.open(client, phone_number) if client.reply_mode == ReplyMode.STREAM else None
+            
+            # Generate response with client's specific OpenAI credentials and engine
+            if client.engine == AssistantEngine.DIRECT:
+                reply = await generate_direct_response_for_client(combined_message, phone_number, client, db, reply_stream)
+            else:
+                reply = await generate_ai_response_for_client(combined_message, phone_number, client, db, reply_stream)
+            
+            if reply_stream is not None:
+                return await reply_stream.finish(reply)
+            return reply
+        
+        # Serialize per conversation and merge bursts into a single run
+        async def handle_burst(combined_message: str) -> str:
+            reply = await generate_burst_reply(combined_message)
+            if reply:
+                # Stored before the actor moves on, so the next burst has it in its history
+                message_store.store_client_message(client_id, phone_number, str(reply), int(datetime.now().timestamp()), is_from_ai=True)
+            return reply
+        
+        # Bounded in-flight replies, globally and per client - shed with a busy reply before queueing on the conversation
+        if not await admission_control.acquire(client.id, client.max_concurrent_replies):
+            print(f"🚦 Overloaded - busy reply for client {client.name}")
+            busy_reply = client.busy_reply or DEFAULT_BUSY_REPLY
+            message_store.store_client_message(client_id, phone_number, busy_reply, int(datetime.now().timestamp()), is_from_ai=True)
+            return {"success": True, "reply": busy_reply}
+        
+        try:
+            # Acknowledge the user if the reply takes longer than the client's latency budget
+            ai_response = await interim_acks.await_reply(client, phone_number, conversation_actors.submit(
+                client_id,
+                phone_number,
+                message_text,
+                handle_burst,
+                debounce_seconds=client.message_debounce_seconds
+            ))
+        finally:
+            admission_control.release(client.id)
+        
+        if command_lane.paused_since(client_id, phone_number, started_at):
+            # Paused while the reply was being generated - the owner takes over
+            print(f"🔇 Conversation with {phone_number} paused during generation for client {client.name} - reply dropped")
+            return {"success": True, "reply": None}
+        
+        if ai_response is None:
+            # Answered together with a later message of the same burst
+            return {"success": True, "reply": None, "coalesced": True}
+        
+        if isinstance(ai_response, StreamedReply):
+            # Already delivered chunk by chunk through the client's service
+            return {"success": True, "reply": None, "streamed": True}
         
         return {"success": True, "reply": ai_response}
         
@@ -147,102 +215,308 @@ async def process_client_message(
         print(f"❌ Error processing message for client {client_id}: {str(e)}")
         return {"success": False, "reply": "Lo siento, hubo un error procesando tu mensaje. Por favor intenta nuevamente."}
 
-async def generate_ai_response_for_client(message: str, phone_number: str, client: Client, db) -> str:
-    """Generate AI response using client's specific OpenAI configuration"""
+async def generate_ai_response_for_client(
+    message: str,
+    phone_number: str,
+    client: Client,
+    db,
+    reply_stream: Optional[ReplyStream] = None
+) -> str:
+    """Generate AI response using client's specific OpenAI configuration, streaming it when a reply stream is given"""
     try:
+        # Answer repeated questions from the client's response cache
+        if client.response_cache_enabled:
+            cached_response = response_cache.lookup(client.openai_assistant_id, message)
+            if cached_response is not None:
+                print(f"⚡ Cached response for {client.name}")
+                # Keep the thread complete for context without delaying the reply
+                append_task = asyncio.create_task(
+                    append_cached_exchange(client, phone_number, message, cached_response)
+                )
+                response_cache.track_append(client.id, phone_number, append_task)
+                return cached_response
+            
+            # A previous cached exchange must land before a new run starts on the thread
+            await response_cache.wait_for_pending_append(client.id, phone_number)
+        
         # Get or create thread for this client-phone combination
-        thread_id = await get_or_create_client_thread(db, client.id, phone_number, client.openai_api_key)
+        thread_id = await get_or_create_client_thread(client.id, phone_number, client.openai_api_key)
         
-        # Use client's OpenAI API key and Assistant ID
-        openai_client = openai.OpenAI(api_key=client.openai_api_key)
+        # Use client's OpenAI API key; every call is paced by the key's rate limits and the business owner goes first
+        priority = PRIORITY_OWNER if phone_number == client.connected_phone else PRIORITY_NORMAL
+        backend = get_llm_backend(client.openai_api_key, client.id, priority)
         
-        # Add message to thread
-        openai_client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=message
-        )
+        # Make sure no earlier run still holds the thread
+        await run_tracker.release_thread(thread_id)
+        started_at = time.monotonic()
         
-        # Run the client's assistant
-        run = openai_client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=client.openai_assistant_id
-        )
+        # Add message to thread
+        await backend.add_message(thread_id, message)
         
-        # Wait for completion with faster polling
-        max_attempts = 60  # 30 seconds max (0.5s intervals)
-        attempts = 0
+        # Kept here as well: the tracker forgets a run once it is cancelled elsewhere (reaper, admin)
+        deadline = time.monotonic() + run_tracker.deadline_seconds
         
-        while run.status in ['queued', 'in_progress'] and attempts < max_attempts:
-            await asyncio.sleep(0.5)  # Faster polling
-            run = openai_client.beta.threads.runs.retrieve(
-                thread_id=thread_id,
-                run_id=run.id
+        streamed_text = ""
+        used_tools = False
+        if reply_stream is not None:
+            # Run the client's assistant with streamed events, text deltas go out as they arrive
+            run, streamed_text, used_tools = await stream_assistant_run(
+                backend, client, thread_id, db, phone_number, reply_stream, deadline
             )
-            attempts += 1
+        else:
+            # Run the client's assistant
+            run = await backend.create_run(thread_id, client.openai_assistant_id)
+            run_tracker.register(client.id, thread_id, run.id, client.openai_api_key, status=run.status)
+        
+        # Poll until the run finishes or its deadline passes
+        while reply_stream is None and run.status in ['queued', 'in_progress', 'requires_action'] and time.monotonic() < deadline:
+            if run.status == 'requires_action':
+                used_tools = True
+                # Execute every requested tool concurrently and submit the outputs in one batch
+                tool_outputs = await tool_executor.execute_tool_calls(
+                    client,
+                    run.required_action.submit_tool_outputs.tool_calls,
+                    db,
+                    phone_number,
+                    time_budget=max(deadline - time.monotonic(), 0)
+                )
+                run = await backend.submit_tool_outputs(thread_id, run.id, tool_outputs)
+                run_tracker.update_status(run.id, run.status)
+                continue
+            
+            await asyncio.sleep(0.5)
+            run = await backend.retrieve_run(thread_id, run.id)
+            run_tracker.update_status(run.id, run.status)
+        
+        # Tokens and latency per tenant; runs cut at the deadline count as failed
+        usage_meter.record(
+            client.id,
+            run.model,
+            run.usage.prompt_tokens if run.usage else 0,
+            run.usage.completion_tokens if run.usage else 0,
+            latency_seconds=time.monotonic() - started_at,
+            failed=run.status != 'completed'
+        )
         
         if run.status == 'completed':
-            # Get the assistant's response
-            messages = openai_client.beta.threads.messages.list(
-                thread_id=thread_id,
-                order="desc",
-                limit=1
-            )
+            run_tracker.finish(run.id, run.status)
+            circuit_breakers.record_success(client.id)
+            
+            if streamed_text.strip():
+                ai_response = streamed_text
+            else:
+                # Get the assistant's response
+                messages = await backend.list_messages(thread_id, limit=1)
+                has_reply = messages.data and messages.data[0].role == 'assistant'
+                ai_response = messages.data[0].content[0].text.value if has_reply else None
             
-            if messages.data and messages.data[0].role == 'assistant':
-                ai_response = messages.data[0].content[0].text.value
+            if ai_response:
                 print(f"Assistant Response for {client.name}: {ai_response}")
+                
+                if client.response_cache_enabled:
+                    # Tool results belong to this conversation (bookings, lookups), so they are not replayed to others
+                    response_cache.store(client.openai_assistant_id, message, ai_response, used_tools=used_tools)
+                
+                # Track thread size and rotate it in the background when it grows too large
+                asyncio.create_task(thread_lifecycle.record_usage(
+                    client, phone_number, thread_id, message, ai_response,
+                    prompt_tokens=run.usage.prompt_tokens if run.usage else None
+                ))
+                
                 return ai_response
             else:
                 return "Lo siento, no pude procesar tu mensaje correctamente. ¿Puedes intentar de nuevo?"
         
-        elif run.status == 'failed':
-            print(f"Assistant run failed for {client.name}: {run.last_error}")
+        elif run.status in ['failed', 'cancelled', 'expired', 'incomplete']:
+            run_tracker.finish(run.id, run.status)
+            print(f"Assistant run {run.status} for {client.name}: {run.last_error}")
+            circuit_breakers.record_failure(client.id, RuntimeError(f"Run {run.status}: {run.last_error}"))
             return "Lo siento, hubo un error procesando tu mensaje. Por favor intenta nuevamente."
         
         else:
+            # Deadline reached - cancel so the next message can use the thread
+            print(f"Assistant run {run.id} for {client.name} exceeded its deadline, cancelling")
+            await run_tracker.cancel_run(run.id, reason="deadline")
             return "Lo siento, la respuesta está tomando más tiempo del esperado. ¿Puedes intentar de nuevo?"
         
     except Exception as e:
         print(f"❌ ERROR OpenAI para {client.name}: {str(e)}")
+        if isinstance(e, openai.NotFoundError) and "thread" in str(e).lower():
+            # Stale thread mapping, not a broken client - start a fresh thread next time
+            await storage.threads.delete(client.id, phone_number)
+        else:
+            circuit_breakers.record_failure(client.id, e)
         print(f"API Key: {client.openai_api_key[:20]}...")
         print(f"Assistant ID: {client.openai_assistant_id}")
         import traceback
         traceback.print_exc()
         return "Lo siento, hubo un error temporal. Por favor intenta nuevamente."
 
-async def get_or_create_client_thread(db, client_id: str, phone_number: str, api_key: str) -> str:
-    """Get or create OpenAI thread for client-phone combination"""
+async def generate_direct_response_for_client(
+    message: str,
+    phone_number: str,
+    client: Client,
+    db,
+    reply_stream: Optional[ReplyStream] = None
+) -> str:
+    """Generate AI response with one streaming chat completion over the stored conversation history"""
+    try:
+        # Most recent history first (on the history index), then back to chronological order
+        history = await storage.messages.recent(client.id, phone_number, DIRECT_MODE_HISTORY_LIMIT)
+        
+        # Add messages still in the write-behind buffer
+        stored_ids = {doc.get("id") for doc in history}
+        history += [doc for doc in message_store.pending_client_messages(client.id, phone_number) if doc["id"] not in stored_ids]
+        history.sort(key=lambda doc: doc["created_at"])
+        history = history[-DIRECT_MODE_HISTORY_LIMIT:]
+        
+        # The current burst is already stored, it is sent as the new message
+        burst_lines = set(message.split("\n"))
+        while history and not history[-1].get("is_from_ai") and history[-1].get("message") in burst_lines:
+            history.pop()
+        
+        chat_messages = build_chat_messages(
+            client.system_prompt,
+            history,
+            message,
+            client.context_token_budget or DIRECT_MODE_CONTEXT_TOKENS
+        )
+        
+        started_at = time.monotonic()
+        priority = PRIORITY_OWNER if phone_number == client.connected_phone else PRIORITY_NORMAL
+        backend = get_llm_backend(client.openai_api_key, client.id, priority)
+        stream = await backend.chat_completion(
+            client.chat_model or DIRECT_MODE_MODEL,
+            chat_messages,
+            DIRECT_MODE_MAX_REPLY_TOKENS,
+            stream=True
+        )
+        
+        parts = []
+        usage = None
+        async for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                if reply_stream is not None:
+                    reply_stream.feed(chunk.choices[0].delta.content)
+        
+        ai_response = "".join(parts).strip()
+        usage_meter.record(
+            client.id,
+            client.chat_model or DIRECT_MODE_MODEL,
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0,
+            latency_seconds=time.monotonic() - started_at,
+            failed=not ai_response
+        )
+        if not ai_response:
+            return "Lo siento, no pude procesar tu mensaje correctamente. ¿Puedes intentar de nuevo?"
+        
+        print(f"Direct Response for {client.name}: {ai_response}")
+        circuit_breakers.record_success(client.id)
+        
+        return ai_response
+        
+    except Exception as e:
+        print(f"❌ ERROR OpenAI direct mode para {client.name}: {str(e)}")
+        circuit_breakers.record_failure(client.id, e)
+        return "Lo siento, hubo un error temporal. Por favor intenta nuevamente."
+
+async def stream_assistant_run(backend: AssistantsBackend, client: Client, thread_id: str, db, phone_number: str, reply_stream: ReplyStream, deadline: float):
+    """Run the assistant as an event stream, feeding text deltas to the reply stream; returns the last run state, the streamed text and whether tools were called"""
+    stream = await backend.create_run(thread_id, client.openai_assistant_id, stream=True)
+    run = None
+    text_parts = []
+    used_tools = False
+    
+    while stream is not None:
+        next_stream = None
+        events = stream.__aiter__()
+        
+        while True:
+            try:
+                # A stalled stream must not outlive the run's deadline
+                event = await asyncio.wait_for(events.__anext__(), timeout=max(deadline - time.monotonic(), 0))
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                await stream.close()
+                if run is None:
+                    raise RuntimeError("Assistant run stream stalled before the run was created")
+                return run, "".join(text_parts), used_tools
+            
+            if event.event == 'thread.run.created':
+                run = event.data
+                run_tracker.register(client.id, thread_id, run.id, client.openai_api_key, status=run.status)
+            
+            elif event.event == 'thread.message.delta':
+                for part in event.data.delta.content or []:
+                    if part.type == 'text' and part.text and part.text.value:
+                        text_parts.append(part.text.value)
+                        reply_stream.feed(part.text.value)
+            
+            elif event.event == 'thread.run.requires_action':
+                run = event.data
+                used_tools = True
+                run_tracker.update_status(run.id, run.status)
+                tool_outputs = await tool_executor.execute_tool_calls(
+                    client,
+                    run.required_action.submit_tool_outputs.tool_calls,
+                    db,
+                    phone_number,
+                    time_budget=max(deadline - time.monotonic(), 0)
+                )
+                # The run continues on a new event stream
+                await stream.close()
+                next_stream = await backend.submit_tool_outputs(thread_id, run.id, tool_outputs, stream=True)
+                break
+            
+            elif event.event.startswith('thread.run.') and not event.event.startswith('thread.run.step'):
+                run = event.data
+                run_tracker.update_status(run.id, run.status)
+        
+        stream = next_stream
+    
+    if run is None:
+        raise RuntimeError("Assistant run stream ended without a run")
+    return run, "".join(text_parts), used_tools
+
+async def append_cached_exchange(client: Client, phone_number: str, message: str, response: str):
+    """Append a cache-served question and answer to the conversation thread"""
     try:
-        threads_collection = db.openai_threads
+        thread_id = await get_or_create_client_thread(client.id, phone_number, client.openai_api_key)
+        backend = get_llm_backend(client.openai_api_key, client.id)
+        
+        for role, content in (("user", message), ("assistant", response)):
+            await backend.add_message(thread_id, content, role=role)
         
+        await thread_lifecycle.record_usage(client, phone_number, thread_id, message, response)
+        
+    except Exception as e:
+        print(f"Error appending cached exchange for {client.name}: {str(e)}")
+
+async def get_or_create_client_thread(client_id: str, phone_number: str, api_key: str) -> str:
+    """Get or create OpenAI thread for client-phone combination"""
+    try:
         # Look for existing thread
-        thread_doc = await threads_collection.find_one({
-            "client_id": client_id,
-            "phone_number": phone_number
-        })
+        thread_doc = await storage.threads.get(client_id, phone_number)
         
         if thread_doc:
             return thread_doc["thread_id"]
         
         # Create new thread with client's API key
-        openai_client = openai.OpenAI(api_key=api_key)
-        thread = openai_client.beta.threads.create()
+        thread = await get_llm_backend(api_key, client_id).create_thread()
         thread_id = thread.id
         
         # Store in database
-        await threads_collection.insert_one({
-            "client_id": client_id,
-            "phone_number": phone_number,
-            "thread_id": thread_id,
-            "created_at": datetime.utcnow()
-        })
+        await storage.threads.create(client_id, phone_number, thread_id)
         
         return thread_id
         
     except Exception as e:
         print(f"Error getting/creating thread: {str(e)}")
         # Create a simple thread without DB storage as fallback
-        openai_client = openai.OpenAI(api_key=api_key)
-        thread = openai_client.beta.threads.create()
+        thread = await get_llm_backend(api_key, client_id).create_thread()
         return thread.id
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+Priority lane for pause control commands
+Commands are recognized before the tenant lookup and the conversation queues,
+run on their own worker capacity and are measured against a latency SLO, so
+pausing the bot stays instant while AI traffic is backed up
+"""
+import asyncio
+import os
+import time
+import logging
+from collections import deque
+from typing import Dict, Optional, Tuple
+from pause_service import pause_service
+
+logger = logging.getLogger(__name__)
+
+COMMAND_LANE_CONCURRENCY = int(os.environ.get('COMMAND_LANE_CONCURRENCY', '8'))
+COMMAND_SLO_MS = float(os.environ.get('COMMAND_SLO_MS', '300'))
+COMMAND_TIMEOUT_SECONDS = float(os.environ.get('COMMAND_TIMEOUT_SECONDS', '5'))
+
+PAUSE_COMMANDS = ('pausar', 'pausar todo')
+ERROR_REPLY = "❌ Error procesando comando. Intenta nuevamente."
+
+
+class CommandLane:
+    def __init__(self):
+        self.workers = asyncio.Semaphore(COMMAND_LANE_CONCURRENCY)
+        self.in_flight = 0
+        self.latencies_ms = deque(maxlen=1000)
+        self.commands = 0
+        self.slo_violations = 0
+        self.failures = 0
+        # When a conversation (or "ALL" for a whole client) was paused, to drop replies already in progress
+        self.paused_at: Dict[Tuple[str, str], float] = {}
+
+    def recognize(self, message: Optional[str]) -> Optional[str]:
+        """Normalized command, or None for regular messages"""
+        if not message:
+            return None
+        normalized = message.lower().strip()
+        return normalized if pause_service.is_pause_command(normalized) else None
+
+    async def execute(self, command: str, client_id: str, phone_number: str) -> str:
+        """Run a pause command on the lane's own capacity and return the reply"""
+        started = time.monotonic()
+        self.commands += 1
+        self.in_flight += 1
+
+        try:
+            async with self.workers:
+                reply = await asyncio.wait_for(
+                    pause_service.commands[command](client_id, phone_number),
+                    timeout=COMMAND_TIMEOUT_SECONDS
+                )
+
+            if command in PAUSE_COMMANDS:
+                now = time.monotonic()
+                # Replies started before a pause finish within minutes, older marks are useless
+                self.paused_at = {key: at for key, at in self.paused_at.items() if now - at < 600}
+                self.paused_at[(client_id, "ALL" if command == 'pausar todo' else phone_number)] = now
+            elif command == 'activar todo':
+                self._forget_client(client_id)
+            elif command == 'reactivar':
+                self.paused_at.pop((client_id, phone_number), None)
+            return reply
+
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Error processing command '{command}' for client {client_id}: {str(e)}")
+            return ERROR_REPLY
+
+        finally:
+            self.in_flight -= 1
+            elapsed_ms = (time.monotonic() - started) * 1000
+            self.latencies_ms.append(elapsed_ms)
+            if elapsed_ms > COMMAND_SLO_MS:
+                self.slo_violations += 1
+                logger.warning(f"Command '{command}' for client {client_id} took {elapsed_ms:.0f}ms (SLO {COMMAND_SLO_MS:.0f}ms)")
+
+    def paused_since(self, client_id: str, phone_number: str, started_at: float) -> bool:
+        """True if the conversation was paused after `started_at` (monotonic), so its reply must be dropped"""
+        for key in ((client_id, phone_number), (client_id, "ALL")):
+            paused_at = self.paused_at.get(key)
+            if paused_at is not None and paused_at >= started_at:
+                return True
+        return False
+
+    def _forget_client(self, client_id: str):
+        self.paused_at = {key: at for key, at in self.paused_at.items() if key[0] != client_id}
+
+    def get_stats(self) -> dict:
+        """Get command latency against the SLO"""
+        samples = sorted(self.latencies_ms)
+
+        def percentile(fraction: float) -> Optional[float]:
+            return round(samples[min(int(len(samples) * fraction), len(samples) - 1)], 1) if samples else None
+
+        return {
+            "commands": self.commands,
+            "in_flight": self.in_flight,
+            "failures": self.failures,
+            "workers": COMMAND_LANE_CONCURRENCY,
+            "slo_ms": COMMAND_SLO_MS,
+            "slo_violations": self.slo_violations,
+            "slo_attainment": round(1 - self.slo_violations / self.commands, 4) if self.commands else None,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+            "latency_p99_ms": percentile(0.99)
+        }
+
+
+# Global command lane instance
+command_lane = CommandLane()
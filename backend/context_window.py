@@ -0,0 +1,45 @@
+"""
+Locally managed context window for Chat Completions "direct mode"
+Builds the prompt from stored conversation history within a token budget
+"""
+from typing import List, Optional
+
+# Rough per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Approximate token count (~4 characters per token for Spanish/English text)"""
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+def build_chat_messages(
+    system_prompt: Optional[str],
+    history: List[dict],
+    new_message: str,
+    token_budget: int
+) -> List[dict]:
+    """
+    Build chat messages from system prompt, stored history (oldest first) and the
+    new user message, dropping the oldest history that does not fit the budget
+    """
+    head = [{"role": "system", "content": system_prompt}] if system_prompt else []
+    tail = [{"role": "user", "content": new_message}]
+
+    used = sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in head + tail)
+
+    kept: List[dict] = []
+    for stored in reversed(history):
+        content = stored.get("message")
+        if not content:
+            continue
+        cost = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        if used + cost > token_budget:
+            break
+        kept.append({"role": "assistant" if stored.get("is_from_ai") else "user", "content": content})
+        used += cost
+
+    kept.reverse()
+    return head + kept + tail
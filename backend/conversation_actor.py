@@ -0,0 +1,144 @@
+"""
+Per-conversation actors for the multi-tenant message pipeline
+Serializes assistant work per (client, phone) and coalesces bursts of short
+WhatsApp messages into a single user message and a single run
+"""
+import asyncio
+import contextvars
+import os
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Quiet period that closes a burst, and hard cap so a chatty user still gets an answer
+DEFAULT_DEBOUNCE_SECONDS = float(os.environ.get('MESSAGE_DEBOUNCE_SECONDS', '1.5'))
+MAX_BURST_SECONDS = float(os.environ.get('MESSAGE_DEBOUNCE_MAX_SECONDS', '6'))
+
+MessageHandler = Callable[[str], Awaitable[Optional[str]]]
+
+
+class ConversationActor:
+    """Mailbox with a single worker for one client-phone conversation"""
+
+    def __init__(self, key: Tuple[str, str], debounce_seconds: float, on_idle: Callable):
+        self.key = key
+        self.debounce_seconds = debounce_seconds
+        self.mailbox: asyncio.Queue = asyncio.Queue()
+        self.worker: Optional[asyncio.Task] = None
+        self._on_idle = on_idle
+
+    def post(self, message: str, handler: MessageHandler) -> asyncio.Future:
+        """Queue a message and make sure the worker is running"""
+        future = asyncio.get_running_loop().create_future()
+        # The sender's context (e.g. its request's query metrics) travels with the message
+        self.mailbox.put_nowait((message, handler, future, contextvars.copy_context()))
+
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run())
+
+        return future
+
+    async def _run(self):
+        """Process bursts one at a time until the mailbox is empty"""
+        try:
+            while not self.mailbox.empty():
+                burst = await self._collect_burst()
+                await self._process_burst(burst)
+        finally:
+            self._on_idle(self)
+
+    async def _collect_burst(self) -> List[tuple]:
+        """Take the next message plus anything that arrives within the debounce window"""
+        burst = [self.mailbox.get_nowait()]
+        if self.debounce_seconds <= 0:
+            return burst
+
+        loop = asyncio.get_running_loop()
+        burst_deadline = loop.time() + MAX_BURST_SECONDS
+
+        while True:
+            timeout = min(self.debounce_seconds, burst_deadline - loop.time())
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.mailbox.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                break
+            burst.append(item)
+
+        return burst
+
+    async def _process_burst(self, burst: List[tuple]):
+        """Run the handler once for the whole burst and answer the latest message"""
+        combined_message = "\n".join(message for message, _, _, _ in burst)
+        # The latest handler carries the freshest client configuration
+        _, handler, last_future, context = burst[-1]
+
+        if len(burst) > 1:
+            logger.info(f"Coalesced {len(burst)} messages for conversation {self.key}")
+
+        # Earlier messages of the burst are answered by the reply to the last one
+        for _, _, future, _ in burst[:-1]:
+            if not future.done():
+                future.set_result(None)
+
+        try:
+            # Run in the latest sender's context, not the one of the request that started the worker
+            reply = await context.run(asyncio.ensure_future, handler(combined_message))
+            if not last_future.done():
+                last_future.set_result(reply)
+        except Exception as e:
+            logger.error(f"Error processing conversation {self.key}: {str(e)}")
+            if not last_future.done():
+                last_future.set_exception(e)
+
+
+class ConversationActorManager:
+    def __init__(self):
+        self.actors: Dict[Tuple[str, str], ConversationActor] = {}
+        self.coalesced_messages = 0
+
+    async def submit(
+        self,
+        client_id: str,
+        phone_number: str,
+        message: str,
+        handler: MessageHandler,
+        debounce_seconds: Optional[float] = None
+    ) -> Optional[str]:
+        """
+        Hand a message to the conversation's actor and wait for the reply.
+        Returns None when the message was merged into a later message of the same burst.
+        """
+        key = (client_id, phone_number)
+        actor = self.actors.get(key)
+
+        if actor is None:
+            if debounce_seconds is None:
+                debounce_seconds = DEFAULT_DEBOUNCE_SECONDS
+            actor = ConversationActor(key, debounce_seconds, self._remove_actor)
+            self.actors[key] = actor
+
+        reply = await actor.post(message, handler)
+        if reply is None:
+            self.coalesced_messages += 1
+        return reply
+
+    def _remove_actor(self, actor: ConversationActor):
+        """Drop idle actors so memory stays bounded by active conversations"""
+        if self.actors.get(actor.key) is actor:
+            del self.actors[actor.key]
+
+    def get_stats(self) -> dict:
+        """Get actor statistics"""
+        return {
+            "active_conversations": len(self.actors),
+            "queued_messages": sum(actor.mailbox.qsize() for actor in self.actors.values()),
+            "coalesced_messages": self.coalesced_messages,
+            "default_debounce_seconds": DEFAULT_DEBOUNCE_SECONDS
+        }
+
+
+# Global conversation actor manager instance
+conversation_actors = ConversationActorManager()
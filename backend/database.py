@@ -1,6 +1,25 @@
+"""
+MongoDB connection management
+One AsyncIOMotorClient per process, opened and closed with the FastAPI lifespan
+and shared by routes, background services and scripts. Pool size, timeouts,
+compression and read/write concerns come from the environment, connection
+checkouts are measured and every operation is counted per request. Analytics
+and listing reads can be routed to secondaries with bounded staleness through
+get_analytics_database(), while the reply path keeps reading the primary
+"""
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+from pymongo.write_concern import WriteConcern
 import os
+import time
+import threading
+from collections import deque
 from dotenv import load_dotenv
+from message_collections import ensure_message_collections
+from client_listing import ensure_client_indexes
+from query_metrics import InstrumentedDatabase
 
 load_dotenv()
 
@@ -8,17 +27,201 @@ load_dotenv()
 mongo_url = os.environ['MONGO_URL']
 db_name = os.environ['DB_NAME']
 
-client = AsyncIOMotorClient(mongo_url)
-database = client[db_name]
+client = None
+database = None
+analytics_database = None
+
+READ_PREFERENCES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest
+}
+
+
+def client_options() -> dict:
+    """Connection pool, timeout and compression settings"""
+    options = {
+        "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', '50')),
+        "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', '0')),
+        "maxIdleTimeMS": int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000')),
+        "maxConnecting": int(os.environ.get('MONGO_MAX_CONNECTING', '2')),
+        # Fail fast instead of queueing requests behind an exhausted pool
+        "waitQueueTimeoutMS": int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000')),
+        "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '10000')),
+        "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '10000')),
+        "appname": os.environ.get('MONGO_APP_NAME', 'whatsapp-assistant-backend'),
+        "event_listeners": [pool_metrics]
+    }
+    socket_timeout = os.environ.get('MONGO_SOCKET_TIMEOUT_MS')
+    if socket_timeout:
+        options["socketTimeoutMS"] = int(socket_timeout)
+    compressors = os.environ.get('MONGO_COMPRESSORS')  # e.g. "zstd,snappy,zlib"
+    if compressors:
+        options["compressors"] = compressors
+    return options
+
+
+def concern_options() -> dict:
+    """Read and write concerns of the database handle, server defaults when unset"""
+    options = {}
+    write_concern = os.environ.get('MONGO_WRITE_CONCERN')  # "majority" or a number of nodes
+    if write_concern:
+        options["write_concern"] = WriteConcern(
+            w=int(write_concern) if write_concern.isdigit() else write_concern,
+            wtimeout=int(os.environ.get('MONGO_WRITE_CONCERN_TIMEOUT_MS', '5000'))
+        )
+    read_concern = os.environ.get('MONGO_READ_CONCERN')  # "local", "majority"...
+    if read_concern:
+        options["read_concern"] = ReadConcern(read_concern)
+    return options
+
+
+def analytics_read_preference():
+    """Read preference of stats, reports and listings; primary unless MONGO_ANALYTICS_READ_PREFERENCE is set"""
+    mode = os.environ.get('MONGO_ANALYTICS_READ_PREFERENCE', 'primary')
+    if mode == "primary":
+        return Primary()
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Unknown MONGO_ANALYTICS_READ_PREFERENCE {mode}, use primary or one of {', '.join(READ_PREFERENCES)}")
+    # Secondaries lagging more than this are not read (90 seconds is the server minimum)
+    max_staleness = int(os.environ.get('MONGO_ANALYTICS_MAX_STALENESS_SECONDS', '90'))
+    return READ_PREFERENCES[mode](max_staleness=max_staleness)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool events: checkout waits, failures and open connections"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # A checkout starts and ends on the same driver thread
+        self.local = threading.local()
+        self.wait_ms = deque(maxlen=2000)
+        self.checkouts = 0
+        self.checked_out = 0
+        self.checkout_failures = {}
+        self.connections_open = 0
+        self.connections_created = 0
+        self.pool_clears = 0
+
+    def connection_check_out_started(self, event):
+        self.local.started = time.monotonic()
+
+    def connection_checked_out(self, event):
+        waited = (time.monotonic() - getattr(self.local, "started", time.monotonic())) * 1000
+        with self.lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.wait_ms.append(waited)
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def connection_created(self, event):
+        with self.lock:
+            self.connections_open += 1
+            self.connections_created += 1
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.connections_open = max(self.connections_open - 1, 0)
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self.pool_clears += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            samples = sorted(self.wait_ms)
+            failures = dict(self.checkout_failures)
+
+        def percentile(fraction: float):
+            return round(samples[min(int(len(samples) * fraction), len(samples) - 1)], 2) if samples else None
+
+        return {
+            "checkouts": self.checkouts,
+            "checked_out": self.checked_out,
+            "connections_open": self.connections_open,
+            "connections_created": self.connections_created,
+            "checkout_failures": failures,
+            "pool_clears": self.pool_clears,
+            "checkout_wait_p50_ms": percentile(0.5),
+            "checkout_wait_p95_ms": percentile(0.95),
+            "checkout_wait_p99_ms": percentile(0.99),
+            "checkout_wait_max_ms": round(samples[-1], 2) if samples else None
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+def connect_database():
+    """Open the shared client once and return the database"""
+    global client, database, analytics_database
+    if client is None:
+        client = AsyncIOMotorClient(mongo_url, **client_options())
+        database = InstrumentedDatabase(client.get_database(db_name, **concern_options()))
+        # Same client and pool, only the read preference differs
+        analytics_database = InstrumentedDatabase(client.get_database(
+            db_name, read_preference=analytics_read_preference(), **concern_options()
+        ))
+    return database
 
 async def get_database():
     """Dependency to get database instance"""
-    return database
+    return connect_database()
 
 async def get_database_direct():
     """Direct database access for services"""
-    return database
+    return connect_database()
+
+async def get_analytics_database():
+    """Database for stats, reports and listings, which may read slightly stale data"""
+    connect_database()
+    return analytics_database
+
+async def ensure_indexes(db=None):
+    """Create the indexes used by background services and reports"""
+    db = db if db is not None else connect_database()
+    await db.usage_buckets.create_index([("client_id", 1), ("hour", 1)], unique=True)
+    await db.usage_buckets.create_index([("hour", 1)])
+    await ensure_message_collections(db)
+    await ensure_client_indexes(db)
+    from port_allocator import ensure_port_indexes  # port_allocator imports storage, which imports this module
+    await ensure_port_indexes(db)
+
+def get_pool_stats() -> dict:
+    """Pool settings and checkout metrics of the shared client"""
+    options = client_options()
+    return {
+        "max_pool_size": options["maxPoolSize"],
+        "min_pool_size": options["minPoolSize"],
+        "wait_queue_timeout_ms": options["waitQueueTimeoutMS"],
+        "compressors": options.get("compressors"),
+        "analytics_read_preference": analytics_read_preference().document,
+        **pool_metrics.get_stats()
+    }
 
 async def close_database():
     """Close database connection"""
-    client.close()
\ No newline at end of file
+    global client, database, analytics_database
+    if client is not None:
+        client.close()
+        client = database = analytics_database = None
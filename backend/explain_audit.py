@@ -0,0 +1,305 @@
+"""
+Explain-plan audit of the query shapes recorded by the backend
+Start the backend with QUERY_SHAPE_LOG=<file>, run the test suites against it,
+then replay every recorded shape with explain() on a scratch database seeded
+with synthetic documents and the backend's indexes. Reports collection scans,
+in-memory sorts and indexes no shape used; exits with 1 if any shape is not
+indexed or could not be explained, so it can gate CI.
+
+    QUERY_SHAPE_LOG=query_shapes.jsonl uvicorn server:app --port 8001
+    python ../backend_test.py
+    python explain_audit.py query_shapes.jsonl [--documents 2000] [--ignore port_allocator] [--json report.json]
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+from database import mongo_url, db_name, ensure_indexes
+from message_collections import MESSAGE_COLLECTIONS, TIME_FIELD
+from query_shapes import LOGICAL_OPERATORS
+
+# Distinct values per string field in the synthetic data, so equality filters are selective
+STRING_CARDINALITY = 50
+# Position of the synthetic document the replayed values point at
+SAMPLE_POSITION = 7
+NOW = datetime.utcnow()
+
+
+def synthetic_value(kind: str, field: str, position: int):
+    """Value of a placeholder type for a field; seeding and replay use the same values"""
+    if kind in ("str", "regex", "regex^"):
+        return f"{field.split('.')[-1]}-{position % STRING_CARDINALITY}"
+    if kind in ("int", "float"):
+        return position
+    if kind == "date":
+        return NOW - timedelta(minutes=position)
+    if kind == "bool":
+        return position % 2 == 0
+    if kind == "null":
+        return None
+    if kind == "ObjectId":
+        return ObjectId()
+    return f"{field}-{position}"
+
+
+def placeholder_kind(value) -> Optional[str]:
+    """First placeholder type in an operator expression"""
+    if isinstance(value, str) and value.startswith("?"):
+        return value[1:]
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        for item in value:
+            kind = placeholder_kind(item)
+            if kind:
+                return kind
+    return None
+
+
+def filter_fields(query: dict, fields: dict):
+    """Collect field -> placeholder type from a normalized filter"""
+    for key, value in query.items():
+        if key in LOGICAL_OPERATORS:
+            for clause in value:
+                filter_fields(clause, fields)
+        elif not key.startswith("$"):
+            kind = placeholder_kind(value)
+            if kind and kind != "null":
+                fields.setdefault(key, kind)
+            else:
+                fields.setdefault(key, "int")
+
+
+def shape_fields(shape: dict) -> dict:
+    fields = {}
+    filter_fields(shape.get("filter") or {}, fields)
+    for stage in shape.get("pipeline") or []:
+        if "$match" in stage:
+            filter_fields(stage["$match"], fields)
+        if "$sort" in stage:
+            for field in stage["$sort"]:
+                fields.setdefault(field, "int")
+    for field, _ in shape.get("sort") or []:
+        fields.setdefault(field, "int")
+    if shape.get("key"):
+        fields.setdefault(shape["key"], "str")
+    fields.pop("_id", None)
+    return fields
+
+
+def materialize(value, field: Optional[str] = None):
+    """A normalized filter with placeholders replaced by values present in the synthetic data"""
+    if isinstance(value, dict):
+        return {
+            key: materialize(item, field if key.startswith("$") else key)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [materialize(item, field) for item in value]
+    if isinstance(value, str) and value.startswith("?"):
+        kind = value[1:]
+        sample = synthetic_value(kind, field or "value", SAMPLE_POSITION)
+        if kind == "regex^":
+            return "^" + sample[:-1]
+        return sample
+    return value
+
+
+def set_path(document: dict, path: str, value):
+    *parents, leaf = path.split(".")
+    for parent in parents:
+        document = document.setdefault(parent, {})
+    document[leaf] = value
+
+
+async def seed(db, collection: str, fields: dict, documents: int):
+    batch = []
+    for position in range(documents):
+        document = {}
+        for field, kind in fields.items():
+            set_path(document, field, synthetic_value(kind, field, position))
+        if collection in MESSAGE_COLLECTIONS:
+            # Mandatory time field of the time-series layout
+            document.setdefault(TIME_FIELD, synthetic_value("date", TIME_FIELD, position))
+        batch.append(document)
+    try:
+        await db[collection].insert_many(batch, ordered=False)
+    except BulkWriteError:
+        pass  # Duplicates under unique indexes, the rest is inserted
+
+
+def explain_command(shape: dict) -> dict:
+    collection, operation = shape["collection"], shape["operation"]
+    query = materialize(shape.get("filter") or {})
+    sort = {field: order for field, order in shape.get("sort") or []}
+
+    if operation in ("find", "find_one"):
+        command = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = sort
+        if shape.get("projection"):
+            command["projection"] = shape["projection"]
+        if operation == "find_one" or shape.get("limit"):
+            command["limit"] = 1 if operation == "find_one" else shape["limit"]
+        return command
+    if operation == "count_documents":
+        return {"count": collection, "query": query}
+    if operation == "distinct":
+        return {"distinct": collection, "key": shape["key"], "query": query}
+    if operation in ("update_one", "update_many", "replace_one"):
+        return {"update": collection, "updates": [{"q": query, "u": {"$set": {"_explain": 1}}, "multi": operation == "update_many"}]}
+    if operation in ("delete_one", "delete_many"):
+        return {"delete": collection, "deletes": [{"q": query, "limit": 1 if operation == "delete_one" else 0}]}
+    if operation.startswith("find_one_and_"):
+        command = {"findAndModify": collection, "query": query}
+        if sort:
+            command["sort"] = sort
+        if operation == "find_one_and_delete":
+            command["remove"] = True
+        else:
+            command["update"] = {"$set": {"_explain": 1}}
+        return command
+    if operation == "aggregate":
+        return {"aggregate": collection, "pipeline": materialize(shape["pipeline"]), "cursor": {}}
+    raise ValueError(f"Unsupported operation {operation}")
+
+
+def winning_plans(explain) -> Iterator[dict]:
+    """Every winning plan in an explain result (aggregations nest them under $cursor)"""
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan" and isinstance(value, dict):
+                yield value.get("queryPlan", value)
+            else:
+                yield from winning_plans(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from winning_plans(item)
+
+
+def plan_stages(plan: dict) -> Iterator[dict]:
+    yield plan
+    for key in ("inputStage", "outerStage", "innerStage"):
+        if isinstance(plan.get(key), dict):
+            yield from plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+def analyze(explain: dict) -> dict:
+    stages = [stage for plan in winning_plans(explain) for stage in plan_stages(plan)]
+    names = [stage.get("stage") for stage in stages]
+    # A $sort left in the pipeline after the cursor stage sorts in memory too
+    pipeline_sort = any("$sort" in stage for stage in explain.get("stages", []))
+    return {
+        "collscan": "COLLSCAN" in names,
+        "in_memory_sort": "SORT" in names or pipeline_sort,
+        "indexes": sorted({stage["indexName"] for stage in stages if stage.get("indexName")})
+    }
+
+
+def describe(shape: dict) -> str:
+    keys = sorted(shape_fields({"filter": shape.get("filter")}).keys())
+    sort = ",".join(f"{field}:{order}" for field, order in shape.get("sort") or [])
+    detail = f"filter[{','.join(keys)}]" if shape.get("filter") is not None else f"pipeline[{len(shape.get('pipeline', []))} stages]"
+    return f"{shape['collection']}.{shape['operation']} {detail}" + (f" sort[{sort}]" if sort else "")
+
+
+def load_shapes(path: str, ignore: List[str]) -> List[dict]:
+    with open(path) as shapes_file:
+        shapes = [json.loads(line) for line in shapes_file if line.strip()]
+    return [shape for shape in shapes if shape["collection"] not in ignore]
+
+
+async def audit(shapes: List[dict], database_name: str, documents: int, keep: bool) -> dict:
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[database_name]
+    try:
+        await client.drop_database(database_name)
+        await ensure_indexes(db)
+
+        collections = {}
+        for shape in shapes:
+            collections.setdefault(shape["collection"], {}).update(shape_fields(shape))
+        for collection, fields in collections.items():
+            await seed(db, collection, fields, documents)
+
+        results = []
+        used_indexes = {collection: set() for collection in collections}
+        for shape in shapes:
+            try:
+                explain = await db.command({"explain": explain_command(shape), "verbosity": "queryPlanner"})
+                result = analyze(explain)
+            except Exception as e:
+                result = {"error": str(e)}
+            used_indexes[shape["collection"]].update(result.get("indexes", []))
+            results.append({"shape": describe(shape), **result})
+
+        unused = {}
+        for collection, used in used_indexes.items():
+            indexes = [index["name"] async for index in db[collection].list_indexes()]
+            names = [name for name in indexes if name != "_id_" and name not in used]
+            if names:
+                unused[collection] = names
+
+        return {"shapes": results, "unused_indexes": unused}
+    finally:
+        if not keep:
+            await client.drop_database(database_name)
+        client.close()
+
+
+def print_report(report: dict):
+    for result in report["shapes"]:
+        if result.get("error"):
+            status = "ERROR"
+        elif result["collscan"]:
+            status = "COLLSCAN"
+        elif result["in_memory_sort"]:
+            status = "SORT"
+        else:
+            status = "OK"
+        detail = result.get("error") or ", ".join(result["indexes"]) or "-"
+        print(f"{status:9} {result['shape']}  ({detail})")
+
+    print()
+    for collection, names in report["unused_indexes"].items():
+        print(f"Unused indexes on {collection}: {', '.join(names)}")
+
+    collscans = sum(1 for result in report["shapes"] if result.get("collscan"))
+    sorts = sum(1 for result in report["shapes"] if result.get("in_memory_sort"))
+    errors = sum(1 for result in report["shapes"] if result.get("error"))
+    print(f"{len(report['shapes'])} shapes: {collscans} collection scans, {sorts} in-memory sorts, {errors} errors")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Explain every recorded query shape and report unindexed ones")
+    parser.add_argument("shapes", help="file written by the backend with QUERY_SHAPE_LOG")
+    parser.add_argument("--database", default=f"{db_name}_explain_audit", help="scratch database, dropped before and after")
+    parser.add_argument("--documents", type=int, default=2000, help="synthetic documents per collection")
+    parser.add_argument("--ignore", action="append", default=[], help="collection to skip (repeatable)")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    args = parser.parse_args()
+
+    if args.database == db_name:
+        sys.exit("The scratch database must not be the backend database")
+
+    report = await audit(load_shapes(args.shapes, args.ignore), args.database, args.documents, args.keep)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+    # A shape that could not be explained is not known to be indexed
+    if any(result.get("error") or result.get("collscan") or result.get("in_memory_sort") for result in report["shapes"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,177 @@
+"""
+Local fast-path intent router
+Per-client keyword/regex rules, loaded from storage and compiled into lookup
+tables, that answer or acknowledge trivial messages before any OpenAI work
+"""
+import asyncio
+import os
+import re
+import time
+import logging
+from typing import Dict, List, Optional
+from response_cache import normalize_message
+from storage import storage
+
+logger = logging.getLogger(__name__)
+
+# Inline flags apply to the whole combined regex, not to the rule that has them ("(?i)")
+_GLOBAL_FLAGS = re.compile(r'\(\?[aiLmsux]+\)')
+# Group references break once every rule's groups are numbered in one regex ("\1", "(?(1)...)")
+_GROUP_REFERENCE = re.compile(r'(?<!\\)(?:\\\\)*\\[1-9]|\(\?\(|\(\?P=')
+
+
+class CompiledRuleTable:
+    """Keyword hash table plus one combined regex for a client's enabled rules"""
+
+    def __init__(self, rules: List[dict]):
+        self.rules: Dict[str, dict] = {}
+        self.keywords: Dict[str, str] = {}  # normalized keyword -> rule id
+        self.regex_rule_ids: Dict[str, str] = {}  # group name -> rule id
+        self.regex: Optional[re.Pattern] = None
+        self.loaded_at = time.monotonic()
+
+        alternatives = []
+        for rule in rules:
+            if not rule.get('enabled', True):
+                continue
+            self.rules[rule['id']] = rule
+
+            for pattern in rule.get('patterns', []):
+                if rule.get('match') == 'regex':
+                    group = f"r{len(alternatives)}"
+                    alternatives.append(f"(?P<{group}>{pattern})")
+                    self.regex_rule_ids[group] = rule['id']
+                else:
+                    # First rule wins when two rules share a keyword
+                    self.keywords.setdefault(normalize_message(pattern), rule['id'])
+
+        if alternatives:
+            self.regex = re.compile('|'.join(alternatives))
+
+    def match(self, message: str) -> Optional[dict]:
+        """Find the rule answering a message"""
+        normalized = normalize_message(message)
+
+        rule_id = self.keywords.get(normalized)
+        if rule_id is None and self.regex is not None:
+            found = self.regex.fullmatch(normalized)
+            if found:
+                rule_id = self.regex_rule_ids[found.lastgroup]
+
+        return self.rules.get(rule_id) if rule_id else None
+
+
+class IntentRouter:
+    def __init__(self):
+        self.cache_seconds = float(os.environ.get('INTENT_RULES_CACHE_SECONDS', '60'))
+        self.flush_interval = float(os.environ.get('INTENT_HITS_FLUSH_INTERVAL', '30'))
+        self.tables: Dict[str, CompiledRuleTable] = {}  # client_id -> compiled rules
+        self.pending_hits: Dict[str, int] = {}  # rule_id -> hits not yet persisted
+        self.hits_by_client: Dict[str, int] = {}
+        self.running = False
+
+    @staticmethod
+    def validate_rule(rule: dict):
+        """Raise ValueError if a rule cannot be compiled on its own or into a client's table"""
+        if rule.get('action', 'reply') == 'reply' and not (rule.get('reply') or '').strip():
+            raise ValueError("Reply rules need a reply")
+        if rule.get('match') == 'regex':
+            for pattern in rule.get('patterns', []):
+                if _GLOBAL_FLAGS.search(pattern):
+                    raise ValueError(f"Inline global flags are not allowed in pattern '{pattern}', use a scoped group like (?i:...)")
+                if _GROUP_REFERENCE.search(pattern):
+                    raise ValueError(f"Backreferences are not allowed in pattern '{pattern}'")
+                try:
+                    compiled = re.compile(pattern)
+                except re.error as e:
+                    raise ValueError(f"Invalid pattern '{pattern}': {str(e)}")
+                if compiled.groupindex:
+                    raise ValueError(f"Named groups are not allowed in pattern '{pattern}'")
+
+    @classmethod
+    def validate_rules(cls, rules: List[dict]):
+        """Raise ValueError if a client's rules cannot be compiled together into one table"""
+        for rule in rules:
+            cls.validate_rule(rule)
+        try:
+            CompiledRuleTable(rules)
+        except re.error as e:
+            raise ValueError(f"Rules cannot be combined: {str(e)}")
+
+    async def _get_table(self, client_id: str) -> CompiledRuleTable:
+        table = self.tables.get(client_id)
+        if table and time.monotonic() - table.loaded_at < self.cache_seconds:
+            return table
+
+        rules = await storage.intent_rules.list(client_id)
+        try:
+            table = CompiledRuleTable(rules)
+        except re.error as e:
+            logger.error(f"Invalid intent rules for client {client_id}: {str(e)}")
+            table = CompiledRuleTable([])
+
+        self.tables[client_id] = table
+        return table
+
+    async def route(self, client_id: str, message: str) -> Optional[dict]:
+        """Return the matching rule for a message, or None to continue with the assistant"""
+        try:
+            table = await self._get_table(client_id)
+        except Exception as e:
+            # The fast path is optional - the assistant still answers
+            logger.error(f"Error loading intent rules for client {client_id}: {str(e)}")
+            return None
+        if not table.rules:
+            return None
+
+        rule = table.match(message)
+        if rule:
+            self.pending_hits[rule['id']] = self.pending_hits.get(rule['id'], 0) + 1
+            self.hits_by_client[client_id] = self.hits_by_client.get(client_id, 0) + 1
+        return rule
+
+    def invalidate(self, client_id: str):
+        """Reload a client's rules on next use"""
+        self.tables.pop(client_id, None)
+
+    async def flush_hit_counts(self):
+        """Persist accumulated hit counts with a single bulk write"""
+        if not self.pending_hits:
+            return
+
+        pending, self.pending_hits = self.pending_hits, {}
+        try:
+            await storage.intent_rules.add_hits(pending)
+        except Exception as e:
+            logger.error(f"Error flushing intent hit counts: {str(e)}")
+            for rule_id, hits in pending.items():
+                self.pending_hits[rule_id] = self.pending_hits.get(rule_id, 0) + hits
+
+    async def start_hit_flusher(self):
+        """Periodically persist hit counts"""
+        self.running = True
+        while self.running:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush_hit_counts()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in intent hit flusher: {str(e)}")
+
+    async def stop_hit_flusher(self):
+        """Stop the flusher and persist what is left"""
+        self.running = False
+        await self.flush_hit_counts()
+
+    def get_stats(self) -> dict:
+        """Get local answer statistics (OpenAI calls avoided) per client"""
+        return {
+            "avoided_openai_calls_by_client": dict(self.hits_by_client),
+            "cached_rule_tables": len(self.tables),
+            "unflushed_hits": sum(self.pending_hits.values())
+        }
+
+
+# Global intent router instance
+intent_router = IntentRouter()
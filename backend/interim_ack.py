@@ -0,0 +1,74 @@
+"""
+Interim acknowledgements for slow replies
+When a reply is not ready within the client's latency budget, show the typing
+indicator and/or send a short "processing" message, then let the final answer
+follow when it lands
+"""
+import asyncio
+import os
+import time
+import logging
+from typing import Awaitable, Dict, Optional, Tuple
+from models import Client
+from whatsapp_manager import service_manager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_BUDGET_SECONDS = float(os.environ.get('REPLY_LATENCY_BUDGET_SECONDS', '8'))
+DEFAULT_INTERIM_MESSAGE = "Estoy revisando tu consulta, te respondo en un momento ⏳"
+
+# One acknowledgement per conversation within this window, even across coalesced requests
+ACK_DEDUP_SECONDS = 60
+
+
+class InterimAckService:
+    def __init__(self):
+        self.last_ack: Dict[Tuple[str, str], float] = {}
+        self.acks_sent = 0
+
+    def latency_budget(self, client: Client) -> float:
+        """Client budget in seconds, 0 disables interim acknowledgements"""
+        if client.latency_budget_seconds is not None:
+            return client.latency_budget_seconds
+        return DEFAULT_LATENCY_BUDGET_SECONDS
+
+    async def await_reply(self, client: Client, phone_number: str, reply: Awaitable[Optional[str]]) -> Optional[str]:
+        """Wait for a reply, acknowledging the user once the latency budget runs out"""
+        task = asyncio.ensure_future(reply)
+        budget = self.latency_budget(client)
+        if budget <= 0:
+            return await task
+
+        done, _ = await asyncio.wait({task}, timeout=budget)
+        if not done:
+            asyncio.create_task(self._acknowledge(client, phone_number))
+
+        return await task
+
+    def mark_answered(self, client_id: str, phone_number: str):
+        """Skip the acknowledgement when part of the reply already reached the user"""
+        self.last_ack[(client_id, phone_number)] = time.monotonic()
+
+    async def _acknowledge(self, client: Client, phone_number: str):
+        key = (client.id, phone_number)
+        now = time.monotonic()
+        if now - self.last_ack.get(key, 0) < ACK_DEDUP_SECONDS:
+            return
+        self.last_ack[key] = now
+
+        # Drop stale dedup entries so the map stays small
+        if len(self.last_ack) > 10000:
+            self.last_ack = {k: t for k, t in self.last_ack.items() if now - t < ACK_DEDUP_SECONDS}
+
+        await service_manager.send_typing_state(client, phone_number)
+
+        # An empty interim message means "typing indicator only"
+        interim_message = client.interim_message if client.interim_message is not None else DEFAULT_INTERIM_MESSAGE
+        if interim_message:
+            if await service_manager.send_message_to_chat(client, phone_number, interim_message):
+                self.acks_sent += 1
+                logger.info(f"Interim acknowledgement sent for client {client.id} to {phone_number}")
+
+
+# Global interim acknowledgement service instance
+interim_acks = InterimAckService()
@@ -0,0 +1,103 @@
+"""
+LLM backend used by the message pipeline
+Wraps the thread, run, message and chat completion operations of one tenant key
+behind a single interface, paced by the OpenAI scheduler. The transport is
+chosen in openai_clients (LLM_BACKEND / LLM_BASE_URL), so the same code runs
+against OpenAI or the mock server
+"""
+from typing import List, Optional
+from openai_clients import get_openai_client
+from openai_scheduler import openai_scheduler, PRIORITY_NORMAL
+
+
+class AssistantsBackend:
+    """Assistants API operations for one tenant key at one scheduling priority"""
+
+    def __init__(self, api_key: str, client_id: str, priority: int = PRIORITY_NORMAL):
+        self.api_key = api_key
+        self.client_id = client_id
+        self.priority = priority
+        self.openai_client = get_openai_client(api_key)
+
+    def _call(self, request):
+        return openai_scheduler.call(self.api_key, self.client_id, request, self.priority)
+
+    # Threads
+
+    async def create_thread(self, messages: Optional[List[dict]] = None):
+        if messages:
+            return await self._call(lambda: self.openai_client.beta.threads.with_raw_response.create(messages=messages))
+        return await self._call(self.openai_client.beta.threads.with_raw_response.create)
+
+    async def delete_thread(self, thread_id: str):
+        return await self._call(lambda: self.openai_client.beta.threads.with_raw_response.delete(thread_id))
+
+    # Messages
+
+    async def add_message(self, thread_id: str, content: str, role: str = "user"):
+        return await self._call(lambda: self.openai_client.beta.threads.messages.with_raw_response.create(
+            thread_id=thread_id,
+            role=role,
+            content=content
+        ))
+
+    async def list_messages(self, thread_id: str, limit: int = 1, order: str = "desc"):
+        return await self._call(lambda: self.openai_client.beta.threads.messages.with_raw_response.list(
+            thread_id=thread_id,
+            order=order,
+            limit=limit
+        ))
+
+    # Runs
+
+    async def create_run(self, thread_id: str, assistant_id: str, stream: bool = False):
+        """Start a run; with stream=True returns the run's event stream"""
+        return await self._call(lambda: self.openai_client.beta.threads.runs.with_raw_response.create(
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            stream=stream
+        ))
+
+    async def retrieve_run(self, thread_id: str, run_id: str):
+        return await self._call(lambda: self.openai_client.beta.threads.runs.with_raw_response.retrieve(
+            thread_id=thread_id,
+            run_id=run_id
+        ))
+
+    async def cancel_run(self, thread_id: str, run_id: str):
+        return await self._call(lambda: self.openai_client.beta.threads.runs.with_raw_response.cancel(
+            thread_id=thread_id,
+            run_id=run_id
+        ))
+
+    async def submit_tool_outputs(self, thread_id: str, run_id: str, tool_outputs: List[dict], stream: bool = False):
+        """Send tool results; with stream=True returns the continued run's event stream"""
+        return await self._call(lambda: self.openai_client.beta.threads.runs.with_raw_response.submit_tool_outputs(
+            thread_id=thread_id,
+            run_id=run_id,
+            tool_outputs=tool_outputs,
+            stream=stream
+        ))
+
+    # Chat completions (direct mode, summaries)
+
+    async def chat_completion(self, model: str, messages: List[dict], max_tokens: int, stream: bool = False):
+        """Create a chat completion; with stream=True returns the chunk stream, ending with a usage chunk"""
+        if stream:
+            return await self._call(lambda: self.openai_client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True}
+            ))
+        return await self._call(lambda: self.openai_client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens
+        ))
+
+
+def get_llm_backend(api_key: str, client_id: str, priority: int = PRIORITY_NORMAL) -> AssistantsBackend:
+    """Get the LLM backend for a tenant key"""
+    return AssistantsBackend(api_key, client_id, priority)
@@ -0,0 +1,105 @@
+"""
+Storage layout of the conversation message collections
+With MESSAGE_STORAGE_LAYOUT=timeseries, client_messages and whatsapp_messages
+are MongoDB time-series collections: created_at is the time field, client_id
+and phone_number live in the `meta` field, and documents expire on their own
+after MESSAGE_RETENTION_HOURS. The helpers below keep queries the same for
+both layouts; migrate_messages_timeseries.py moves existing data
+"""
+import os
+import logging
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LAYOUT_DOCUMENTS = "documents"
+LAYOUT_TIMESERIES = "timeseries"
+
+MESSAGE_STORAGE_LAYOUT = os.environ.get('MESSAGE_STORAGE_LAYOUT', LAYOUT_DOCUMENTS).lower()
+MESSAGE_RETENTION_HOURS = float(os.environ.get('MESSAGE_RETENTION_HOURS', '24'))
+# Conversations are sparse, hourly buckets keep several messages per bucket
+MESSAGE_TIMESERIES_GRANULARITY = os.environ.get('MESSAGE_TIMESERIES_GRANULARITY', 'hours')
+
+MESSAGE_COLLECTIONS = ("client_messages", "whatsapp_messages")
+TIME_FIELD = "created_at"
+META_FIELD = "meta"
+META_KEYS = ("client_id", "phone_number")
+
+
+def is_timeseries() -> bool:
+    return MESSAGE_STORAGE_LAYOUT == LAYOUT_TIMESERIES
+
+
+def timeseries_options() -> dict:
+    """create_collection options for a time-series message collection"""
+    return {
+        "timeseries": {
+            "timeField": TIME_FIELD,
+            "metaField": META_FIELD,
+            "granularity": MESSAGE_TIMESERIES_GRANULARITY
+        },
+        "expireAfterSeconds": int(MESSAGE_RETENTION_HOURS * 3600)
+    }
+
+
+def meta_field(name: str) -> str:
+    """Stored name of a field, `meta.<name>` for metadata in the time-series layout"""
+    return f"{META_FIELD}.{name}" if is_timeseries() and name in META_KEYS else name
+
+
+def message_filter(**fields) -> dict:
+    """Query on message fields, e.g. message_filter(client_id=..., phone_number=...)"""
+    return {meta_field(name): value for name, value in fields.items()}
+
+
+def history_index_keys(collection: str) -> List[Tuple[str, int]]:
+    """Index backing keyset-paginated history of a message collection"""
+    scope = ["client_id", "phone_number"] if collection == "client_messages" else ["phone_number"]
+    return [(meta_field(name), 1) for name in scope] + [("timestamp", 1), ("_id", 1)]
+
+
+def to_storage(document: dict, timeseries: Optional[bool] = None) -> dict:
+    """Document as written to the collection"""
+    if not (is_timeseries() if timeseries is None else timeseries):
+        return document
+    stored = {key: value for key, value in document.items() if key not in META_KEYS}
+    stored[META_FIELD] = {key: document[key] for key in META_KEYS if key in document}
+    return stored
+
+
+def from_storage(document: dict) -> dict:
+    """Flat message document, whatever the layout"""
+    meta = document.get(META_FIELD)
+    if not isinstance(meta, dict):
+        return document
+    flat = {key: value for key, value in document.items() if key != META_FIELD}
+    flat.update(meta)
+    return flat
+
+
+async def ensure_message_collections(db):
+    """Create the time-series collections if that layout is enabled, and the history indexes"""
+    if not is_timeseries():
+        for name in MESSAGE_COLLECTIONS:
+            await db[name].create_index(history_index_keys(name))
+        return
+
+    # Motor's list_collections is a coroutine resolving to the cursor
+    cursor = await db.list_collections(filter={"name": {"$in": list(MESSAGE_COLLECTIONS)}})
+    existing = await cursor.to_list(length=None)
+    kinds = {info["name"]: info.get("type", "collection") for info in existing}
+
+    for name in MESSAGE_COLLECTIONS:
+        if name not in kinds:
+            await db.create_collection(name, **timeseries_options())
+            logger.info(f"Created time-series collection {name}")
+        elif kinds[name] != "timeseries":
+            logger.error(f"{name} is a regular collection, run migrate_messages_timeseries.py to use the time-series layout")
+            continue
+        else:
+            # Keep expiry in line with MESSAGE_RETENTION_HOURS
+            await db.command({
+                "collMod": name,
+                "expireAfterSeconds": timeseries_options()["expireAfterSeconds"]
+            })
+        await db[name].create_index(history_index_keys(name))
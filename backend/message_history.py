@@ -0,0 +1,123 @@
+"""
+Keyset-paginated conversation history
+Pages walk the (client_id, phone_number, timestamp, _id) index from an opaque
+cursor instead of skipping, so reading deep into a long conversation costs the
+same as the first page. Callers choose the returned fields, and NDJSON streams
+whole histories without buffering them
+"""
+import base64
+import json
+from typing import AsyncIterator, Iterable, Optional, Tuple
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from message_collections import meta_field, message_filter, from_storage
+
+HISTORY_FIELDS = ("_id", "id", "client_id", "phone_number", "message", "timestamp", "is_from_ai", "created_at")
+DEFAULT_HISTORY_FIELDS = ("id", "phone_number", "message", "timestamp", "is_from_ai", "created_at")
+KEY_FIELDS = ("timestamp", "_id")
+STREAM_BATCH_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Comma separated field list from the query string"""
+    if not fields:
+        return DEFAULT_HISTORY_FIELDS
+    requested = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in HISTORY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(HISTORY_FIELDS)}")
+    return requested
+
+
+def encode_cursor(document: dict) -> str:
+    key = json.dumps([document.get("timestamp"), str(document["_id"])])
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, ObjectId]:
+    try:
+        timestamp, object_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return timestamp, ObjectId(object_id)
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+
+def _query(scope: dict, cursor: Optional[str], descending: bool) -> dict:
+    query = message_filter(**scope)
+    if cursor:
+        timestamp, object_id = decode_cursor(cursor)
+        op = "$lt" if descending else "$gt"
+        # Strictly past the last document of the previous page, ties broken by _id
+        query["$or"] = [
+            {"timestamp": {op: timestamp}},
+            {"timestamp": timestamp, "_id": {op: object_id}}
+        ]
+    return query
+
+
+def _projection(fields: Iterable[str]) -> dict:
+    projection = {meta_field(field): 1 for field in fields}
+    for field in KEY_FIELDS:
+        projection[field] = 1
+    return projection
+
+
+def _output(document: dict, fields: Tuple[str, ...]) -> dict:
+    document = from_storage(document)
+    output = {field: document[field] for field in fields if field in document}
+    if "_id" in output:
+        output["_id"] = str(output["_id"])
+    return output
+
+
+def _find(collection, scope: dict, cursor: Optional[str], descending: bool, fields: Tuple[str, ...]):
+    direction = -1 if descending else 1
+    return collection.find(
+        _query(scope, cursor, descending),
+        _projection(fields)
+    ).sort([("timestamp", direction), ("_id", direction)])
+
+
+async def history_page(
+    collection,
+    scope: dict,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    descending: bool = True,
+    fields: Tuple[str, ...] = DEFAULT_HISTORY_FIELDS
+) -> dict:
+    """One page of messages in scan order and the cursor of the next page (None at the end)"""
+    # One extra document tells whether another page exists
+    documents = await _find(collection, scope, cursor, descending, fields).limit(limit + 1).to_list(length=limit + 1)
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+
+    return {
+        "messages": [_output(document, fields) for document in documents],
+        "next_cursor": encode_cursor(documents[-1]) if has_more else None
+    }
+
+
+def stream_history(
+    collection,
+    scope: dict,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    descending: bool = True,
+    fields: Tuple[str, ...] = DEFAULT_HISTORY_FIELDS
+) -> AsyncIterator[str]:
+    """NDJSON lines, one message each, read from the database in batches"""
+    # Built here so a bad cursor fails before the response starts
+    find = _find(collection, scope, cursor, descending, fields).batch_size(STREAM_BATCH_SIZE)
+    if limit:
+        find = find.limit(limit)
+
+    async def lines():
+        async for document in find:
+            yield json.dumps(jsonable_encoder(_output(document, fields)), ensure_ascii=False) + "\n"
+
+    return lines()
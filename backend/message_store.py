@@ -0,0 +1,155 @@
+"""
+Write-behind message persistence
+Buffers conversation messages in memory and writes them with insert_many when
+a batch fills up or the flush interval passes, so storing messages adds no
+latency to replies. Unflushed messages stay readable for conversation history,
+and the buffer is drained at shutdown
+"""
+import asyncio
+import os
+import uuid
+import logging
+from typing import Dict, List, Optional, Set
+from pymongo.errors import BulkWriteError
+from models import ClientMessage
+from storage import storage
+
+logger = logging.getLogger(__name__)
+
+
+class MessageStore:
+    def __init__(self):
+        self.batch_size = int(os.environ.get('MESSAGE_FLUSH_BATCH_SIZE', '100'))
+        self.flush_interval = float(os.environ.get('MESSAGE_FLUSH_INTERVAL', '1'))
+        self.max_buffered = int(os.environ.get('MESSAGE_BUFFER_MAX', '20000'))
+        self.buffers: Dict[str, List[dict]] = {}  # collection -> documents waiting to be written
+        self.writing: Dict[str, List[dict]] = {}  # collection -> batch being written
+        self.unconfirmed: Dict[str, Set[str]] = {}  # collection -> ids of failed writes that may have landed
+        self.flush_lock = asyncio.Lock()
+        self.flush_task: Optional[asyncio.Task] = None
+        self.running = False
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    def enqueue(self, collection: str, document: dict):
+        """Buffer a document for the next batch"""
+        # A stable id lets a retried batch skip the messages an earlier attempt stored
+        document.setdefault("id", str(uuid.uuid4()))
+        buffer = self.buffers.setdefault(collection, [])
+        buffer.append(document)
+        self._trim(collection)
+
+        if len(buffer) >= self.batch_size and (self.flush_task is None or self.flush_task.done()):
+            try:
+                self.flush_task = asyncio.get_running_loop().create_task(self.flush())
+            except RuntimeError:
+                pass  # No event loop, the periodic flusher or shutdown drain picks it up
+
+    def store_client_message(self, client_id: str, phone_number: str, message: str, timestamp: int, is_from_ai: bool = False):
+        """Buffer a message of a client's conversation"""
+        self.enqueue("client_messages", ClientMessage(
+            client_id=client_id,
+            phone_number=phone_number,
+            message=message,
+            timestamp=timestamp,
+            is_from_ai=is_from_ai
+        ).dict())
+
+    def pending_client_messages(self, client_id: str, phone_number: str) -> List[dict]:
+        """Messages of a conversation not yet visible in the database, oldest first"""
+        # Linear in the buffered messages, which MESSAGE_BUFFER_MAX bounds
+        return [
+            document
+            for documents in (self.writing.get("client_messages", []), self.buffers.get("client_messages", []))
+            for document in documents
+            if document["client_id"] == client_id and document["phone_number"] == phone_number
+        ]
+
+    async def flush(self):
+        """Write every buffered document, one insert_many per collection"""
+        async with self.flush_lock:
+            for collection in list(self.buffers):
+                batch = self.buffers.get(collection)
+                if not batch:
+                    continue
+                self.buffers[collection] = []
+                self.writing[collection] = batch
+
+                unconfirmed = self.unconfirmed.setdefault(collection, set())
+                retried = any(document["id"] in unconfirmed for document in batch)
+                try:
+                    await storage.messages.insert_many(collection, batch, skip_existing=retried)
+                    self.written += len(batch)
+                    self.batches += 1
+                except BulkWriteError as e:
+                    # Unordered insert: everything but the reported errors landed; duplicates already exist
+                    failed = {error["index"] for error in e.details.get("writeErrors", []) if error.get("code") != 11000}
+                    self.written += e.details.get("nInserted", 0)
+                    self._requeue(collection, [doc for index, doc in enumerate(batch) if index in failed], e)
+                except Exception as e:
+                    # Part of the batch may have landed (e.g. a timeout after the write), the retry skips it
+                    unconfirmed.update(document["id"] for document in batch)
+                    self._requeue(collection, batch, e)
+                    continue
+                finally:
+                    self.writing.pop(collection, None)
+                unconfirmed.difference_update(document["id"] for document in batch)
+
+    def _requeue(self, collection: str, documents: List[dict], error: Exception):
+        self.failed_flushes += 1
+        logger.error(f"Error writing messages to {collection}, retrying {len(documents)}: {str(error)}")
+        if documents:
+            self.buffers[collection] = documents + self.buffers.get(collection, [])
+            self._trim(collection)
+
+    def _trim(self, collection: str):
+        """Drop the oldest messages over MESSAGE_BUFFER_MAX (database unreachable for too long)"""
+        buffer = self.buffers[collection]
+        overflow = len(buffer) - self.max_buffered
+        if overflow <= 0:
+            return
+        dropped = buffer[:overflow]
+        del buffer[:overflow]
+        self.dropped += overflow
+        self.unconfirmed.get(collection, set()).difference_update(document["id"] for document in dropped)
+        logger.error(f"Message buffer for {collection} full, dropped {overflow} oldest messages ({self.dropped} in total)")
+
+    async def start_flusher(self):
+        """Periodically write buffered messages"""
+        self.running = True
+        while self.running:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in message flusher: {str(e)}")
+
+    async def stop_flusher(self, attempts: int = 3):
+        """Stop the flusher and drain the buffers"""
+        self.running = False
+        for _ in range(attempts):
+            await self.flush()
+            if not any(self.buffers.values()):
+                return
+            await asyncio.sleep(1)
+        left = sum(len(buffer) for buffer in self.buffers.values())
+        logger.error(f"Shutdown with {left} unwritten messages")
+
+    def get_stats(self) -> dict:
+        """Get write-behind buffer statistics"""
+        return {
+            "buffered": {collection: len(buffer) for collection, buffer in self.buffers.items() if buffer},
+            "written": self.written,
+            "batches": self.batches,
+            "average_batch_size": round(self.written / self.batches, 1) if self.batches else 0,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped
+        }
+
+
+# Global message store instance
+message_store = MessageStore()
@@ -0,0 +1,90 @@
+"""
+Move client_messages and whatsapp_messages to the time-series layout
+Each regular collection is renamed to <name>_legacy, a time-series collection
+is created under the original name and the messages are copied in batches.
+Stop the backend first, then start it with MESSAGE_STORAGE_LAYOUT=timeseries.
+
+    python migrate_messages_timeseries.py [--batch-size 1000] [--drop-legacy]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from database import connect_database, close_database
+from message_collections import MESSAGE_COLLECTIONS, TIME_FIELD, META_FIELD, timeseries_options, to_storage
+
+
+async def collection_types(database) -> dict:
+    cursor = await database.list_collections()
+    infos = await cursor.to_list(length=None)
+    return {info["name"]: info.get("type", "collection") for info in infos}
+
+
+async def migrate_collection(name: str, batch_size: int, drop_legacy: bool):
+    database = connect_database()
+    legacy_name = f"{name}_legacy"
+    types = await collection_types(database)
+
+    if types.get(name) == "timeseries":
+        print(f"{name}: already a time-series collection")
+        if legacy_name not in types:
+            return
+        # A previous run stopped halfway - copy again from the legacy collection
+        await database[name].drop()
+    elif name in types:
+        if legacy_name in types:
+            raise RuntimeError(f"{legacy_name} already exists, drop it or finish the previous migration first")
+        await database[name].rename(legacy_name)
+    else:
+        print(f"{name}: nothing to migrate")
+        return
+
+    await database.create_collection(name, **timeseries_options())
+    scope = ["client_id", "phone_number"] if name == "client_messages" else ["phone_number"]
+    await database[name].create_index([(f"{META_FIELD}.{key}", 1) for key in scope] + [("timestamp", 1), ("_id", 1)])
+
+    copied = skipped = 0
+    batch = []
+    async for document in database[legacy_name].find({}).sort("_id", 1):
+        created_at = document.get(TIME_FIELD)
+        if not isinstance(created_at, datetime):
+            # The time field is mandatory, fall back to the WhatsApp timestamp
+            if not isinstance(document.get("timestamp"), (int, float)):
+                skipped += 1
+                continue
+            document[TIME_FIELD] = datetime.utcfromtimestamp(document["timestamp"])
+
+        batch.append(to_storage(document, timeseries=True))
+        if len(batch) >= batch_size:
+            await database[name].insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+            print(f"{name}: {copied} messages copied")
+
+    if batch:
+        await database[name].insert_many(batch, ordered=False)
+        copied += len(batch)
+
+    print(f"{name}: {copied} messages copied, {skipped} without a date skipped")
+
+    if drop_legacy:
+        await database[legacy_name].drop()
+        print(f"{name}: dropped {legacy_name}")
+    else:
+        print(f"{name}: previous data kept in {legacy_name}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Move conversation messages to time-series collections")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--drop-legacy", action="store_true", help="drop the regular collections once copied")
+    args = parser.parse_args()
+
+    try:
+        for name in MESSAGE_COLLECTIONS:
+            await migrate_collection(name, args.batch_size, args.drop_legacy)
+    finally:
+        await close_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,549 @@
+"""
+Local stand-in for the OpenAI Assistants API
+Emulates threads, messages, runs (polling and streaming) and chat completions
+with configurable latency distributions, run failures, server errors and 429s,
+including x-ratelimit-* headers. Used through LLM_BACKEND=mock (served from a
+background thread on a loopback port, so streamed events keep their spacing)
+or standalone for load tests:
+
+    python mock_llm_server.py 8900
+    LLM_BASE_URL=http://localhost:8900/v1 uvicorn server:app --port 8001
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+MOCK_PORT = int(os.environ.get('MOCK_LLM_PORT', '0'))  # 0 = any free port
+
+FILLER_SENTENCES = [
+    "Esta es una respuesta generada por el servidor de pruebas.",
+    "El contenido no proviene de un modelo real y sirve solo para medir el flujo de mensajes.",
+    "Si necesitas más detalles, puedes hacer otra consulta en cualquier momento.",
+    "Los plazos y montos indicados aquí son ficticios.",
+    "Recuerda que esta conversación es una simulación."
+]
+
+ACTIVE_RUN_STATUSES = ("queued", "in_progress", "requires_action", "cancelling")
+
+
+class MockLLMConfig(BaseModel):
+    latency_distribution: str = Field(os.environ.get('MOCK_LLM_LATENCY_DISTRIBUTION', 'lognormal'), description="fixed, uniform or lognormal")
+    latency_median_ms: float = Field(float(os.environ.get('MOCK_LLM_LATENCY_MEDIAN_MS', '1500')), ge=0)
+    latency_p95_ms: float = Field(float(os.environ.get('MOCK_LLM_LATENCY_P95_MS', '6000')), ge=0)
+    run_failure_rate: float = Field(float(os.environ.get('MOCK_LLM_RUN_FAILURE_RATE', '0')), ge=0, le=1)
+    server_error_rate: float = Field(float(os.environ.get('MOCK_LLM_SERVER_ERROR_RATE', '0')), ge=0, le=1)
+    rate_limit_rate: float = Field(float(os.environ.get('MOCK_LLM_RATE_LIMIT_RATE', '0')), ge=0, le=1, description="Random 429s on top of the per-key limit")
+    requests_per_minute: int = Field(int(os.environ.get('MOCK_LLM_REQUESTS_PER_MINUTE', '0')), ge=0, description="Per-key limit, 0 = unlimited")
+    tool_call_rate: float = Field(float(os.environ.get('MOCK_LLM_TOOL_CALL_RATE', '0')), ge=0, le=1)
+    reply_sentences: int = Field(int(os.environ.get('MOCK_LLM_REPLY_SENTENCES', '2')), ge=0, le=50)
+    seed: Optional[int] = None
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def _error(status_code: int, message: str, error_type: str, code: Optional[str] = None, headers: Optional[dict] = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": message, "type": error_type, "param": None, "code": code}},
+        headers=headers
+    )
+
+
+class MockKeyLimiter:
+    """Per-key request bucket that reports itself the way OpenAI does"""
+
+    def __init__(self, requests_per_minute: int):
+        self.limit = requests_per_minute
+        self.tokens = float(requests_per_minute)
+        self.updated_at = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.limit, self.tokens + (now - self.updated_at) * self.limit / 60.0)
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def headers(self) -> dict:
+        reset_seconds = max(1 - self.tokens, 0) * 60.0 / self.limit
+        return {
+            "x-ratelimit-limit-requests": str(self.limit),
+            "x-ratelimit-remaining-requests": str(int(self.tokens)),
+            "x-ratelimit-reset-requests": f"{reset_seconds:.3f}s",
+            "retry-after": f"{reset_seconds:.3f}"
+        }
+
+
+class MockAssistantsState:
+    """In-memory threads, messages and runs"""
+
+    def __init__(self):
+        self.config = MockLLMConfig()
+        self.random = random.Random(self.config.seed)
+        self.threads: Dict[str, dict] = {}
+        self.messages: Dict[str, List[dict]] = {}
+        self.runs: Dict[str, dict] = {}
+        self.limiters: Dict[str, MockKeyLimiter] = {}
+        self.stats = {"requests": 0, "rate_limited": 0, "server_errors": 0, "runs": 0, "failed_runs": 0, "chat_completions": 0}
+
+    def reset(self):
+        config = self.config
+        self.__init__()
+        self.configure(config.dict())
+
+    def configure(self, updates: dict):
+        self.config = MockLLMConfig(**{**self.config.dict(), **updates})
+        self.limiters.clear()
+        if "seed" in updates:
+            self.random = random.Random(self.config.seed)
+
+    def sample_latency(self) -> float:
+        """Seconds for one generation, drawn from the configured distribution"""
+        config = self.config
+        median = config.latency_median_ms / 1000
+        p95 = max(config.latency_p95_ms / 1000, median)
+
+        if config.latency_distribution == "fixed" or median == 0:
+            return median
+        if config.latency_distribution == "uniform":
+            return self.random.uniform(median / 2, p95)
+
+        # Lognormal with the requested median and 95th percentile
+        sigma = (math.log(p95) - math.log(median)) / 1.645 if p95 > median else 0
+        return self.random.lognormvariate(math.log(median), sigma)
+
+    def limiter(self, api_key: str) -> Optional[MockKeyLimiter]:
+        if not self.config.requests_per_minute:
+            return None
+        limiter = self.limiters.get(api_key)
+        if limiter is None:
+            limiter = MockKeyLimiter(self.config.requests_per_minute)
+            self.limiters[api_key] = limiter
+        return limiter
+
+    def add_message(self, thread_id: str, role: str, content: str, run_id: Optional[str] = None, assistant_id: Optional[str] = None) -> dict:
+        message = {
+            "id": _new_id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "status": "completed",
+            "content": [{"type": "text", "text": {"value": content, "annotations": []}}],
+            "assistant_id": assistant_id,
+            "run_id": run_id,
+            "attachments": [],
+            "metadata": {}
+        }
+        self.messages[thread_id].append(message)
+        return message
+
+    def build_reply(self, question: str) -> str:
+        sentences = [f"Respuesta simulada a: «{question[:80]}»."]
+        sentences += [self.random.choice(FILLER_SENTENCES) for _ in range(self.config.reply_sentences)]
+        return " ".join(sentences)
+
+    def new_run(self, thread_id: str, assistant_id: str) -> dict:
+        latency = self.sample_latency()
+        now = time.monotonic()
+        run = {
+            "id": _new_id("run"),
+            "object": "thread.run",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "assistant_id": assistant_id,
+            "status": "queued",
+            "required_action": None,
+            "last_error": None,
+            "usage": None,
+            "model": "mock-assistant",
+            "instructions": "",
+            "tools": [],
+            "metadata": {},
+            "_started": now,
+            "_complete_at": now + latency,
+            "_needs_tool": self.random.random() < self.config.tool_call_rate,
+            "_fails": self.random.random() < self.config.run_failure_rate
+        }
+        self.runs[run["id"]] = run
+        self.stats["runs"] += 1
+        return run
+
+    def advance_run(self, run: dict) -> dict:
+        """Move a polled run along its timeline"""
+        if run["status"] not in ("queued", "in_progress"):
+            return run
+
+        now = time.monotonic()
+        if now < run["_complete_at"]:
+            in_progress_at = run["_started"] + (run["_complete_at"] - run["_started"]) * 0.1
+            run["status"] = "in_progress" if now >= in_progress_at else "queued"
+            return run
+
+        return self.finish_run(run)
+
+    def finish_run(self, run: dict) -> dict:
+        if run["_needs_tool"]:
+            run["_needs_tool"] = False
+            run["status"] = "requires_action"
+            run["required_action"] = {
+                "type": "submit_tool_outputs",
+                "submit_tool_outputs": {"tool_calls": [{
+                    "id": _new_id("call"),
+                    "type": "function",
+                    "function": {"name": "get_current_datetime", "arguments": "{}"}
+                }]}
+            }
+            return run
+
+        if run["_fails"]:
+            run["status"] = "failed"
+            run["last_error"] = {"code": "server_error", "message": "Simulated run failure"}
+            self.stats["failed_runs"] += 1
+            return run
+
+        last_user = next((m for m in reversed(self.messages[run["thread_id"]]) if m["role"] == "user"), None)
+        reply = self.build_reply(last_user["content"][0]["text"]["value"] if last_user else "")
+        self.add_message(run["thread_id"], "assistant", reply, run_id=run["id"], assistant_id=run["assistant_id"])
+        prompt_tokens = sum(len(m["content"][0]["text"]["value"]) // 4 + 1 for m in self.messages[run["thread_id"]])
+        completion_tokens = len(reply) // 4 + 1
+        run["status"] = "completed"
+        run["usage"] = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        return run
+
+    def active_run(self, thread_id: str) -> Optional[dict]:
+        for run in self.runs.values():
+            if run["thread_id"] == thread_id:
+                self.advance_run(run)
+                if run["status"] in ACTIVE_RUN_STATUSES:
+                    return run
+        return None
+
+
+def public(run: dict) -> dict:
+    return {k: v for k, v in run.items() if not k.startswith("_")}
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+state = MockAssistantsState()
+app = FastAPI(title="Mock OpenAI Assistants API")
+
+
+@app.middleware("http")
+async def emulate_api_limits(request: Request, call_next):
+    """Authentication, per-key rate limits and injected failures for /v1 routes"""
+    if not request.url.path.startswith("/v1"):
+        return await call_next(request)
+
+    state.stats["requests"] += 1
+    api_key = request.headers.get("authorization", "").replace("Bearer ", "")
+    if not api_key or api_key.startswith("sk-invalid"):
+        return _error(401, "Incorrect API key provided", "invalid_request_error", "invalid_api_key")
+
+    limiter = state.limiter(api_key)
+    limit_headers = {}
+    if limiter:
+        allowed = limiter.take()
+        limit_headers = limiter.headers()
+        if not allowed:
+            state.stats["rate_limited"] += 1
+            return _error(429, "Rate limit reached for requests", "requests", "rate_limit_exceeded", limit_headers)
+
+    if state.random.random() < state.config.rate_limit_rate:
+        state.stats["rate_limited"] += 1
+        return _error(429, "Rate limit reached for requests", "requests", "rate_limit_exceeded", {**limit_headers, "retry-after": "1"})
+
+    if state.random.random() < state.config.server_error_rate:
+        state.stats["server_errors"] += 1
+        return _error(500, "The server had an error while processing your request", "server_error")
+
+    response = await call_next(request)
+    for header, value in limit_headers.items():
+        if header != "retry-after":
+            response.headers[header] = value
+    return response
+
+
+# Threads
+
+@app.post("/v1/threads")
+async def create_thread(request: Request):
+    body = await request.json() if await request.body() else {}
+    thread = {"id": _new_id("thread"), "object": "thread", "created_at": int(time.time()), "metadata": {}, "tool_resources": None}
+    state.threads[thread["id"]] = thread
+    state.messages[thread["id"]] = []
+    for message in body.get("messages") or []:
+        state.add_message(thread["id"], message.get("role", "user"), message.get("content", ""))
+    return thread
+
+
+@app.delete("/v1/threads/{thread_id}")
+async def delete_thread(thread_id: str):
+    deleted = state.threads.pop(thread_id, None) is not None
+    state.messages.pop(thread_id, None)
+    return {"id": thread_id, "object": "thread.deleted", "deleted": deleted}
+
+
+# Messages
+
+@app.post("/v1/threads/{thread_id}/messages")
+async def create_message(thread_id: str, request: Request):
+    if thread_id not in state.threads:
+        return _error(404, f"No thread found with id '{thread_id}'.", "invalid_request_error")
+    if state.active_run(thread_id):
+        return _error(400, f"Can't add messages to {thread_id} while a run is active.", "invalid_request_error")
+    body = await request.json()
+    return state.add_message(thread_id, body.get("role", "user"), body.get("content", ""))
+
+
+@app.get("/v1/threads/{thread_id}/messages")
+async def list_messages(thread_id: str, limit: int = 20, order: str = "desc"):
+    if thread_id not in state.threads:
+        return _error(404, f"No thread found with id '{thread_id}'.", "invalid_request_error")
+    messages = state.messages[thread_id]
+    ordered = list(reversed(messages)) if order == "desc" else list(messages)
+    page = ordered[:limit]
+    return {
+        "object": "list",
+        "data": page,
+        "first_id": page[0]["id"] if page else None,
+        "last_id": page[-1]["id"] if page else None,
+        "has_more": len(ordered) > limit
+    }
+
+
+# Runs
+
+@app.post("/v1/threads/{thread_id}/runs")
+async def create_run(thread_id: str, request: Request):
+    if thread_id not in state.threads:
+        return _error(404, f"No thread found with id '{thread_id}'.", "invalid_request_error")
+    body = await request.json()
+    assistant_id = body.get("assistant_id", "")
+    if assistant_id.startswith("asst_missing"):
+        return _error(404, f"No assistant found with id '{assistant_id}'.", "invalid_request_error")
+    active = state.active_run(thread_id)
+    if active:
+        return _error(400, f"Thread {thread_id} already has an active run {active['id']}.", "invalid_request_error")
+
+    run = state.new_run(thread_id, assistant_id)
+    if body.get("stream"):
+        return StreamingResponse(stream_run(run, created=True), media_type="text/event-stream")
+    return public(run)
+
+
+@app.get("/v1/threads/{thread_id}/runs/{run_id}")
+async def retrieve_run(thread_id: str, run_id: str):
+    run = state.runs.get(run_id)
+    if not run or run["thread_id"] != thread_id:
+        return _error(404, f"No run found with id '{run_id}'.", "invalid_request_error")
+    return public(state.advance_run(run))
+
+
+@app.post("/v1/threads/{thread_id}/runs/{run_id}/cancel")
+async def cancel_run(thread_id: str, run_id: str):
+    run = state.runs.get(run_id)
+    if not run or run["thread_id"] != thread_id:
+        return _error(404, f"No run found with id '{run_id}'.", "invalid_request_error")
+    state.advance_run(run)
+    if run["status"] not in ACTIVE_RUN_STATUSES:
+        return _error(400, f"Cannot cancel run with status '{run['status']}'.", "invalid_request_error")
+    run["status"] = "cancelled"
+    return public(run)
+
+
+@app.post("/v1/threads/{thread_id}/runs/{run_id}/submit_tool_outputs")
+async def submit_tool_outputs(thread_id: str, run_id: str, request: Request):
+    run = state.runs.get(run_id)
+    if not run or run["thread_id"] != thread_id:
+        return _error(404, f"No run found with id '{run_id}'.", "invalid_request_error")
+    if run["status"] != "requires_action":
+        return _error(400, f"Runs in status '{run['status']}' do not accept tool outputs.", "invalid_request_error")
+
+    body = await request.json()
+    now = time.monotonic()
+    run.update({"status": "in_progress", "required_action": None, "_started": now, "_complete_at": now + state.sample_latency()})
+    if body.get("stream"):
+        return StreamingResponse(stream_run(run, created=False), media_type="text/event-stream")
+    return public(run)
+
+
+async def stream_run(run: dict, created: bool):
+    """Server-sent events for a run, with text deltas spread over the sampled latency"""
+    if created:
+        yield sse("thread.run.created", public(run))
+        yield sse("thread.run.queued", public(run))
+
+    duration = max(run["_complete_at"] - time.monotonic(), 0)
+    # Time to first token is a fifth of the generation time
+    await asyncio.sleep(duration * 0.2)
+    if run["status"] == "queued":
+        run["status"] = "in_progress"
+        yield sse("thread.run.in_progress", public(run))
+
+    # Finish now unless the run was cancelled or polled to completion meanwhile
+    run["_complete_at"] = time.monotonic()
+    state.advance_run(run)
+    if run["status"] != "completed":
+        yield sse(f"thread.run.{run['status']}", public(run))
+        yield "event: done\ndata: [DONE]\n\n"
+        return
+
+    message = state.messages[run["thread_id"]][-1]
+    text = message["content"][0]["text"]["value"]
+    yield sse("thread.message.created", {**message, "status": "in_progress", "content": []})
+
+    words = text.split(" ")
+    delay = duration * 0.8 / max(len(words), 1)
+    for index, word in enumerate(words):
+        await asyncio.sleep(delay)
+        value = word if index == 0 else f" {word}"
+        yield sse("thread.message.delta", {
+            "id": message["id"],
+            "object": "thread.message.delta",
+            "delta": {"content": [{"index": 0, "type": "text", "text": {"value": value, "annotations": []}}]}
+        })
+
+    yield sse("thread.message.completed", message)
+    yield sse("thread.run.completed", public(run))
+    yield "event: done\ndata: [DONE]\n\n"
+
+
+# Chat completions
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    state.stats["chat_completions"] += 1
+    messages = body.get("messages") or []
+    question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    text = state.build_reply(str(question))
+    latency = state.sample_latency()
+
+    completion_id = _new_id("chatcmpl")
+    model = body.get("model", "mock-chat")
+    prompt_tokens = sum(len(str(m.get("content", ""))) // 4 + 1 for m in messages)
+
+    if body.get("stream"):
+        async def chunks():
+            await asyncio.sleep(latency * 0.2)
+            words = text.split(" ")
+            for index, word in enumerate(words):
+                await asyncio.sleep(latency * 0.8 / len(words))
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word if index == 0 else f" {word}"}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            final = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                usage = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [], "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4 + 1, "total_tokens": prompt_tokens + len(text) // 4 + 1}
+                }
+                yield f"data: {json.dumps(usage)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    await asyncio.sleep(latency)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4 + 1, "total_tokens": prompt_tokens + len(text) // 4 + 1}
+    }
+
+
+# Control endpoints for test suites and load tests
+
+@app.get("/mock/config")
+async def get_config():
+    return state.config.dict()
+
+
+@app.put("/mock/config")
+async def update_config(updates: dict):
+    try:
+        state.configure(updates)
+    except Exception as e:
+        return JSONResponse(status_code=422, content={"detail": str(e)})
+    return state.config.dict()
+
+
+@app.get("/mock/stats")
+async def get_stats():
+    return {
+        **state.stats,
+        "threads": len(state.threads),
+        "active_runs": sum(1 for run in state.runs.values() if run["status"] in ACTIVE_RUN_STATUSES)
+    }
+
+
+@app.post("/mock/reset")
+async def reset_state():
+    state.reset()
+    return {"success": True}
+
+
+def start_mock_server_in_thread(port: int = 8900, host: str = "127.0.0.1"):
+    """Run the mock server in a background thread (load tests); returns the uvicorn server"""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+
+    while not server.started and thread.is_alive():
+        time.sleep(0.05)
+    return server
+
+
+_local_server = None
+_local_server_lock = threading.Lock()
+
+
+def local_server_url() -> str:
+    """
+    Base URL of the mock server run by this process for LLM_BACKEND=mock, started
+    on first use. Real sockets rather than an in-process ASGI transport, which
+    buffers whole responses and would deliver streamed events all at once.
+    """
+    global _local_server
+    with _local_server_lock:
+        if _local_server is None:
+            server = start_mock_server_in_thread(MOCK_PORT)
+            if not server.started:
+                raise RuntimeError(f"Mock LLM server could not start on port {MOCK_PORT}")
+            _local_server = server
+        port = _local_server.servers[0].sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}/v1"
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(sys.argv[1]) if len(sys.argv) > 1 else 8900)
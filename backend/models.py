@@ -1,6 +1,6 @@
 # Multi-tenant Client Models
 from pydantic import BaseModel, Field, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 import uuid
@@ -10,6 +10,14 @@ class ClientStatus(str, Enum):
     INACTIVE = "inactive"
     PENDING = "pending"
 
+class AssistantEngine(str, Enum):
+    ASSISTANTS = "assistants"  # OpenAI Assistants threads and runs
+    DIRECT = "direct"          # One streaming chat completion over stored history
+
+class ReplyMode(str, Enum):
+    SINGLE = "single"  # One WhatsApp message once the reply is complete
+    STREAM = "stream"  # Sentence-sized messages sent while the reply is generated
+
 class ClientCreate(BaseModel):
     name: str = Field(..., description="Client name or company")
     email: EmailStr = Field(..., description="Client email")
@@ -28,6 +36,19 @@ class Client(BaseModel):
     connected_phone: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_activity: Optional[datetime] = None
+    message_debounce_seconds: Optional[float] = None  # None = platform default
+    response_cache_enabled: bool = False
+    engine: AssistantEngine = AssistantEngine.ASSISTANTS
+    system_prompt: Optional[str] = None  # Direct mode instructions
+    chat_model: Optional[str] = None  # Direct mode model, None = platform default
+    context_token_budget: Optional[int] = None  # Direct mode prompt size, None = platform default
+    fallback_reply: Optional[str] = None  # Sent while the client's circuit is open
+    latency_budget_seconds: Optional[float] = None  # Interim acknowledgement after this delay, 0 disables
+    interim_message: Optional[str] = None  # None = platform default, "" = typing indicator only
+    reply_mode: ReplyMode = ReplyMode.SINGLE
+    max_concurrent_replies: Optional[int] = None  # Replies generated at once, None = platform default
+    busy_reply: Optional[str] = None  # Sent when a reply is shed under overload
+    circuit_state: Optional[str] = None  # "closed", "open" or "half_open"
 
 class ClientResponse(BaseModel):
     id: str
@@ -41,6 +62,73 @@ class ClientResponse(BaseModel):
     unique_url: str
     created_at: datetime
     last_activity: Optional[datetime]
+    message_debounce_seconds: Optional[float] = None
+    response_cache_enabled: bool = False
+    engine: AssistantEngine = AssistantEngine.ASSISTANTS
+    chat_model: Optional[str] = None
+    context_token_budget: Optional[int] = None
+    reply_mode: ReplyMode = ReplyMode.SINGLE
+    circuit_state: Optional[str] = None
+    circuit_last_error: Optional[str] = None
+
+class ClientSettingsUpdate(BaseModel):
+    message_debounce_seconds: Optional[float] = Field(None, ge=0, le=10, description="Burst merge window in seconds, 0 disables merging")
+    response_cache_enabled: Optional[bool] = Field(None, description="Answer repeated questions from the response cache")
+    engine: Optional[AssistantEngine] = None
+    system_prompt: Optional[str] = None
+    chat_model: Optional[str] = None
+    context_token_budget: Optional[int] = Field(None, ge=500, le=100000)
+    fallback_reply: Optional[str] = Field(None, description="Reply sent while the assistant is unavailable")
+    latency_budget_seconds: Optional[float] = Field(None, ge=0, le=60, description="Send an interim acknowledgement after this many seconds, 0 disables")
+    interim_message: Optional[str] = Field(None, description="Interim acknowledgement text, empty for typing indicator only")
+    reply_mode: Optional[ReplyMode] = Field(None, description="Send the reply as one message or stream it sentence by sentence")
+    max_concurrent_replies: Optional[int] = Field(None, ge=1, le=500, description="Replies generated at once for this client")
+    busy_reply: Optional[str] = Field(None, description="Reply sent when the platform is overloaded")
+
+class ToolType(str, Enum):
+    WEBHOOK = "webhook"
+    BUILTIN = "builtin"
+
+class ClientToolCreate(BaseModel):
+    name: str = Field(..., description="Function name as declared on the assistant")
+    type: ToolType = ToolType.WEBHOOK
+    url: Optional[str] = Field(None, description="Webhook URL (webhook tools)")
+    headers: Optional[Dict[str, str]] = None
+    builtin: Optional[str] = Field(None, description="Built-in handler name (builtin tools)")
+    timeout_seconds: Optional[float] = Field(None, gt=0, le=60)
+
+class ClientTool(ClientToolCreate):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    client_id: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class IntentMatchType(str, Enum):
+    KEYWORD = "keyword"  # Whole message equals one of the patterns
+    REGEX = "regex"      # Whole message matches one of the patterns
+
+class IntentAction(str, Enum):
+    REPLY = "reply"    # Answer with the canned reply
+    IGNORE = "ignore"  # Acknowledge silently, no reply
+
+class IntentRuleCreate(BaseModel):
+    name: str
+    match: IntentMatchType = IntentMatchType.KEYWORD
+    patterns: List[str] = Field(..., min_items=1, description="Matched against the lowercased message without accents or punctuation")
+    action: IntentAction = IntentAction.REPLY
+    reply: Optional[str] = None
+    enabled: bool = True
+
+class IntentRule(IntentRuleCreate):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    client_id: str
+    hit_count: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class CancelRunsRequest(BaseModel):
+    client_id: Optional[str] = None
+    run_ids: Optional[List[str]] = None
+    min_age_seconds: float = 0
+    stuck_only: bool = True  # Only runs past their deadline
 
 class ClientMessage(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
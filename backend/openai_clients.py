@@ -0,0 +1,40 @@
+"""
+Shared OpenAI clients for tenant API keys
+Reuses one async client (and its connection pool) per key instead of building one per call.
+LLM_BACKEND=mock serves every key from a mock server on a loopback port of this process,
+LLM_BASE_URL points the clients at another Assistants-compatible server
+"""
+import os
+from typing import Dict
+import openai
+
+_clients: Dict[str, openai.AsyncOpenAI] = {}
+
+
+def llm_backend_name() -> str:
+    """Configured backend: "openai" (default) or "mock" """
+    return os.environ.get('LLM_BACKEND', 'openai').lower()
+
+
+def _build_client(api_key: str) -> openai.AsyncOpenAI:
+    # openai_scheduler.call is the only retry point; SDK retries would bypass its rate limits
+    if llm_backend_name() == 'mock':
+        from mock_llm_server import local_server_url
+        return openai.AsyncOpenAI(api_key=api_key, base_url=local_server_url(), max_retries=0)
+    return openai.AsyncOpenAI(api_key=api_key, base_url=os.environ.get('LLM_BASE_URL') or None, max_retries=0)
+
+
+def get_openai_client(api_key: str) -> openai.AsyncOpenAI:
+    """Get the async OpenAI client for an API key"""
+    client = _clients.get(api_key)
+    if client is None:
+        client = _build_client(api_key)
+        _clients[api_key] = client
+    return client
+
+
+async def forget_openai_client(api_key: str):
+    """Drop and close the cached client for a key that was replaced or revoked"""
+    client = _clients.pop(api_key, None)
+    if client is not None:
+        await client.close()
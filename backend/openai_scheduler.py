@@ -0,0 +1,233 @@
+"""
+Rate-limit-aware scheduler for tenant OpenAI API keys
+Keeps a token bucket per key synced from the x-ratelimit-* response headers,
+queues requests by priority instead of failing them, and retries 429s after
+the advertised reset
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import re
+import time
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+import openai
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_OWNER = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_SECONDS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset durations such as '1s', '20ms' or '6m0s' into seconds"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def is_quota_exhausted(error: openai.RateLimitError) -> bool:
+    """429 for an account out of credit: waiting does not help, unlike a rate limit"""
+    if getattr(error, 'code', None) == 'insufficient_quota':
+        return True
+    body = error.body if isinstance(error.body, dict) else {}
+    details = body.get('error') if isinstance(body.get('error'), dict) else body
+    return details.get('code') == 'insufficient_quota' or details.get('type') == 'insufficient_quota'
+
+
+class KeyRateState:
+    """Request token bucket, priority wait queue and backoff for one API key"""
+
+    def __init__(self, requests_per_minute: int):
+        self.capacity = float(requests_per_minute)
+        self.tokens = float(requests_per_minute)
+        self.refill_per_second = requests_per_minute / 60.0
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiters: List[tuple] = []  # heap of (priority, seq, future, client_id, enqueued_at)
+        self.dispatcher: Optional[asyncio.Task] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def seconds_until_available(self) -> float:
+        """Seconds until a request may be sent with this key"""
+        self._refill()
+        blocked = max(self.blocked_until - time.monotonic(), 0)
+        if self.tokens >= 1:
+            return blocked
+        return max(blocked, (1 - self.tokens) / self.refill_per_second)
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    def block_for(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def sync_from_headers(self, headers):
+        """Align the bucket with what the API reports for this key"""
+        limit = headers.get('x-ratelimit-limit-requests')
+        remaining = headers.get('x-ratelimit-remaining-requests')
+
+        try:
+            if limit:
+                self.capacity = float(limit)
+                self.refill_per_second = self.capacity / 60.0
+            if remaining is not None:
+                self._refill()
+                self.tokens = min(float(remaining), self.capacity)
+        except ValueError:
+            pass
+
+        # Token-per-minute exhaustion has no local bucket, just wait for its reset
+        if headers.get('x-ratelimit-remaining-tokens') == '0':
+            reset = parse_reset_duration(headers.get('x-ratelimit-reset-tokens'))
+            if reset:
+                self.block_for(reset)
+
+
+class OpenAIScheduler:
+    def __init__(self):
+        self.default_rpm = int(os.environ.get('OPENAI_DEFAULT_RPM', '500'))
+        self.max_retries = int(os.environ.get('OPENAI_SCHEDULER_MAX_RETRIES', '4'))
+        self.keys: Dict[str, KeyRateState] = {}
+        self.sequence = itertools.count()
+        self.client_stats: Dict[str, dict] = {}  # client_id -> wait metrics
+
+    def _state(self, api_key: str) -> KeyRateState:
+        state = self.keys.get(api_key)
+        if state is None:
+            state = KeyRateState(self.default_rpm)
+            self.keys[api_key] = state
+        return state
+
+    def forget_key(self, api_key: str):
+        """Stop tracking a key that was replaced or revoked; calls already queued on it still finish"""
+        self.keys.pop(api_key, None)
+
+    def _client_stats(self, client_id: str) -> dict:
+        return self.client_stats.setdefault(client_id, {
+            "requests": 0, "waited_requests": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0, "rate_limited": 0
+        })
+
+    async def acquire(self, api_key: str, client_id: str, priority: int = PRIORITY_NORMAL):
+        """Wait for a request slot on an API key"""
+        state = self._state(api_key)
+        stats = self._client_stats(client_id)
+        stats["requests"] += 1
+
+        if not state.waiters and state.seconds_until_available() == 0:
+            state.take()
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        enqueued_at = time.monotonic()
+        heapq.heappush(state.waiters, (priority, next(self.sequence), future, client_id, enqueued_at))
+
+        if state.dispatcher is None or state.dispatcher.done():
+            state.dispatcher = asyncio.create_task(self._dispatch(state))
+
+        await future
+
+        wait_ms = (time.monotonic() - enqueued_at) * 1000
+        stats["waited_requests"] += 1
+        stats["total_wait_ms"] += wait_ms
+        stats["max_wait_ms"] = max(stats["max_wait_ms"], wait_ms)
+
+    async def _dispatch(self, state: KeyRateState):
+        """Hand out request slots to queued callers in priority order"""
+        while state.waiters:
+            delay = state.seconds_until_available()
+            if delay > 0:
+                await asyncio.sleep(min(delay, 1.0))
+                continue
+
+            _, _, future, _, _ = heapq.heappop(state.waiters)
+            if future.done():
+                continue  # Caller gave up while queued
+            state.take()
+            future.set_result(None)
+
+    async def call(
+        self,
+        api_key: str,
+        client_id: str,
+        request: Callable[[], Awaitable],
+        priority: int = PRIORITY_NORMAL
+    ):
+        """
+        Send a request through the key's bucket. `request` must return a raw
+        response (`.with_raw_response`) so rate-limit headers can be read.
+        """
+        state = self._state(api_key)
+
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(api_key, client_id, priority)
+            try:
+                raw_response = await request()
+                state.sync_from_headers(raw_response.headers)
+                return raw_response.parse()
+
+            except openai.RateLimitError as e:
+                if is_quota_exhausted(e):
+                    # Fail fast and leave the key's bucket alone for its other callers
+                    logger.error(f"OpenAI quota exhausted for client {client_id}")
+                    raise
+                self._client_stats(client_id)["rate_limited"] += 1
+                headers = e.response.headers if e.response is not None else {}
+                state.sync_from_headers(headers)
+
+                retry_after = (
+                    parse_reset_duration(headers.get('retry-after'))
+                    or parse_reset_duration(headers.get('x-ratelimit-reset-requests'))
+                    or min(2 ** attempt, 20)
+                )
+                state.block_for(retry_after)
+
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"429 for client {client_id}, retrying in {retry_after:.1f}s (attempt {attempt + 1})")
+
+    def get_stats(self) -> dict:
+        """Get queue depth and wait times per client"""
+        queue_depth: Dict[str, int] = {}
+        for state in self.keys.values():
+            for _, _, future, client_id, _ in state.waiters:
+                if not future.done():
+                    queue_depth[client_id] = queue_depth.get(client_id, 0) + 1
+
+        clients = {}
+        for client_id, stats in self.client_stats.items():
+            clients[client_id] = {
+                "queue_depth": queue_depth.get(client_id, 0),
+                "requests": stats["requests"],
+                "waited_requests": stats["waited_requests"],
+                "average_wait_ms": round(stats["total_wait_ms"] / stats["waited_requests"], 1) if stats["waited_requests"] else 0,
+                "max_wait_ms": round(stats["max_wait_ms"], 1),
+                "rate_limited": stats["rate_limited"]
+            }
+
+        return {
+            "tracked_keys": len(self.keys),
+            "total_queue_depth": sum(queue_depth.values()),
+            "clients": clients
+        }
+
+
+# Global OpenAI scheduler instance
+openai_scheduler = OpenAIScheduler()
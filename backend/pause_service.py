@@ -1,5 +1,5 @@
 from datetime import datetime
-from database import get_database_direct
+from storage import storage
 from models import PausedConversation
 import logging
 
@@ -36,23 +36,8 @@ class ConversationPauseService:
     async def is_conversation_paused(self, client_id: str, phone_number: str) -> bool:
         """Check if a specific conversation is paused"""
         try:
-            db = await get_database_direct()
-            paused_conversations = db.paused_conversations
-            
-            # Check if this specific conversation is paused
-            paused = await paused_conversations.find_one({
-                "client_id": client_id,
-                "phone_number": phone_number
-            })
-            
-            # Check if all conversations are paused for this client
-            global_pause = await paused_conversations.find_one({
-                "client_id": client_id,
-                "phone_number": "ALL",
-                "paused_by": "global"
-            })
-            
-            return bool(paused or global_pause)
+            # This specific conversation or all conversations of the client
+            return await storage.pauses.is_paused(client_id, phone_number)
             
         except Exception as e:
             logger.error(f"Error checking if conversation is paused: {str(e)}")
@@ -61,14 +46,8 @@ class ConversationPauseService:
     async def pause_conversation(self, client_id: str, phone_number: str) -> str:
         """Pause specific conversation"""
         try:
-            db = await get_database_direct()
-            paused_conversations = db.paused_conversations
-            
             # Check if already paused
-            existing = await paused_conversations.find_one({
-                "client_id": client_id,
-                "phone_number": phone_number
-            })
+            existing = await storage.pauses.get(client_id, phone_number)
             
             if existing:
                 return "✅ Esta conversacion ya estaba pausada. Puedes responder directamente."
@@ -80,7 +59,7 @@ class ConversationPauseService:
                 paused_by="client"
             )
             
-            await paused_conversations.insert_one(pause_data.dict())
+            await storage.pauses.add(pause_data.dict())
             
             logger.info(f"Conversation paused for client {client_id}, phone {phone_number}")
             return "✅ Conversacion pausada. Ahora puedes responder directamente a este usuario."
@@ -92,16 +71,10 @@ class ConversationPauseService:
     async def reactivate_conversation(self, client_id: str, phone_number: str) -> str:
         """Reactivate specific conversation"""
         try:
-            db = await get_database_direct()
-            paused_conversations = db.paused_conversations
-            
             # Remove pause for this specific conversation
-            result = await paused_conversations.delete_one({
-                "client_id": client_id,
-                "phone_number": phone_number
-            })
+            removed = await storage.pauses.remove(client_id, phone_number)
             
-            if result.deleted_count > 0:
+            if removed > 0:
                 logger.info(f"Conversation reactivated for client {client_id}, phone {phone_number}")
                 return "✅ Conversacion reactivada. El bot volvera a responder automaticamente."
             else:
@@ -114,17 +87,10 @@ class ConversationPauseService:
     async def pause_all_conversations(self, client_id: str, phone_number: str) -> str:
         """Pause all conversations for this client"""
         try:
-            db = await get_database_direct()
-            paused_conversations = db.paused_conversations
-            
             # Check if already globally paused
-            existing = await paused_conversations.find_one({
-                "client_id": client_id,
-                "phone_number": "ALL",
-                "paused_by": "global"
-            })
+            existing = await storage.pauses.get(client_id, "ALL")
             
-            if existing:
+            if existing and existing.get("paused_by") == "global":
                 return "✅ El bot ya estaba completamente pausado."
             
             # Pause all conversations
@@ -134,7 +100,7 @@ class ConversationPauseService:
                 paused_by="global"
             )
             
-            await paused_conversations.insert_one(pause_data.dict())
+            await storage.pauses.add(pause_data.dict())
             
             logger.info(f"All conversations paused for client {client_id}")
             return "✅ Bot completamente pausado. No respondera a ningun usuario automaticamente."
@@ -146,17 +112,12 @@ class ConversationPauseService:
     async def activate_all_conversations(self, client_id: str, phone_number: str) -> str:
         """Activate all conversations for this client"""
         try:
-            db = await get_database_direct()
-            paused_conversations = db.paused_conversations
-            
             # Remove all pauses for this client
-            result = await paused_conversations.delete_many({
-                "client_id": client_id
-            })
+            removed = await storage.pauses.remove_all(client_id)
             
-            if result.deleted_count > 0:
+            if removed > 0:
                 logger.info(f"All conversations activated for client {client_id}")
-                return f"✅ Bot completamente reactivado. Se eliminaron {result.deleted_count} pausas."
+                return f"✅ Bot completamente reactivado. Se eliminaron {removed} pausas."
             else:
                 return "ℹ️ El bot no tenia conversaciones pausadas."
                 
@@ -167,27 +128,16 @@ class ConversationPauseService:
     async def get_conversation_status(self, client_id: str, phone_number: str) -> str:
         """Get status of current conversation and bot"""
         try:
-            db = await get_database_direct()
-            paused_conversations = db.paused_conversations
-            
             # Check specific conversation status
-            specific_pause = await paused_conversations.find_one({
-                "client_id": client_id,
-                "phone_number": phone_number
-            })
+            specific_pause = await storage.pauses.get(client_id, phone_number)
             
             # Check global pause status
-            global_pause = await paused_conversations.find_one({
-                "client_id": client_id,
-                "phone_number": "ALL",
-                "paused_by": "global"
-            })
+            global_pause = await storage.pauses.get(client_id, "ALL")
+            if global_pause and global_pause.get("paused_by") != "global":
+                global_pause = None
             
             # Count total paused conversations
-            total_paused = await paused_conversations.count_documents({
-                "client_id": client_id,
-                "phone_number": {"$ne": "ALL"}
-            })
+            total_paused = await storage.pauses.count_conversations(client_id)
             
             status_msg = "📊 Estado del Bot:\n"
             
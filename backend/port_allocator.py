@@ -0,0 +1,106 @@
+"""
+WhatsApp service port allocation
+Ports come from a free list of released ports or from an atomic counter, both
+kept in storage (storage.ports) and taken atomically, so concurrent client
+creations - from any backend replica sharing the database - never get the same
+port and no creation scans the clients. Candidates still bound on this host are
+skipped
+"""
+import os
+import socket
+import logging
+from datetime import datetime, timedelta
+from storage import storage
+
+logger = logging.getLogger(__name__)
+
+BASE_PORT = int(os.environ.get('WHATSAPP_BASE_PORT', '3002'))  # 3001 is reserved for legacy
+MAX_PORT = int(os.environ.get('WHATSAPP_MAX_PORT', '65000'))
+# A released port may still be held by a service that is shutting down
+PORT_REUSE_DELAY_SECONDS = int(os.environ.get('PORT_REUSE_DELAY_SECONDS', '60'))
+MAX_ATTEMPTS = 50
+
+
+def port_bound_on_host(port: int) -> bool:
+    """True if something on this host is listening on the port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(("0.0.0.0", port))
+            return False
+        except OSError:
+            return True
+
+
+class PortAllocator:
+    def __init__(self):
+        self.seeded = False
+        self.allocated = 0
+        self.reused = 0
+        self.skipped_bound = 0
+
+    async def _seed_counter(self):
+        """Start the counter after the highest port already assigned (idempotent across replicas)"""
+        if self.seeded:
+            return
+        highest = await storage.clients.highest_port()
+        await storage.ports.seed(max(BASE_PORT, (highest or 0) + 1))
+        self.seeded = True
+
+    async def allocate(self) -> int:
+        """Reserve a port for a new client service"""
+        await self._seed_counter()
+
+        for _ in range(MAX_ATTEMPTS):
+            port = await storage.ports.take_free(datetime.utcnow() - timedelta(seconds=PORT_REUSE_DELAY_SECONDS))
+            reused = port is not None
+            if not reused:
+                port = await storage.ports.take_next() or BASE_PORT
+                if port > MAX_PORT:
+                    raise RuntimeError(f"No WhatsApp ports left (max {MAX_PORT})")
+
+            # Clients created before the allocator may hold released or counted ports
+            if await storage.clients.port_in_use(port):
+                continue
+
+            if port_bound_on_host(port):
+                self.skipped_bound += 1
+                logger.warning(f"Port {port} is bound by another process on this host, skipping")
+                if reused:
+                    # Try it again later rather than losing it
+                    await self.release(port)
+                continue
+
+            self.allocated += 1
+            self.reused += 1 if reused else 0
+            return port
+
+        raise RuntimeError(f"Could not allocate a WhatsApp port after {MAX_ATTEMPTS} attempts")
+
+    async def release(self, port: int):
+        """Return a deleted client's port to the free list"""
+        if not port:
+            return
+        await storage.ports.release(port)
+
+    async def get_stats(self) -> dict:
+        """Get counter position, free list size and allocation counts"""
+        ports = await storage.ports.stats()
+        return {
+            "next_port": ports["next_port"] or BASE_PORT,
+            "free_ports": ports["free_ports"],
+            "base_port": BASE_PORT,
+            "max_port": MAX_PORT,
+            "allocated": self.allocated,
+            "reused": self.reused,
+            "skipped_bound_on_host": self.skipped_bound
+        }
+
+
+async def ensure_port_indexes(db):
+    await db.free_ports.create_index([("port", 1)], unique=True)
+    await db.free_ports.create_index([("released_at", 1), ("port", 1)])
+    await db.clients.create_index([("whatsapp_port", 1)])
+
+
+# Global port allocator instance
+port_allocator = PortAllocator()
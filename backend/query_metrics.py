@@ -0,0 +1,252 @@
+"""
+Per-request database query metrics
+The shared database handle is wrapped so every awaited operation is counted and
+timed against the HTTP request that issued it (a context variable set by the
+middleware in server.py). Requests over the query count or time threshold are
+logged with the operations they repeat - the usual N+1 signature - and query
+counts are kept per route as histograms. With QUERY_SHAPE_LOG set, the shape
+of each query is also recorded for explain_audit.py
+"""
+import os
+import time
+import inspect
+import logging
+from contextvars import ContextVar
+from typing import Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorCollection
+from query_shapes import query_shape_recorder, call_shape, sort_spec
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_WARN_THRESHOLD = int(os.environ.get('QUERY_COUNT_WARN_THRESHOLD', '15'))
+QUERY_TIME_WARN_MS = float(os.environ.get('QUERY_TIME_WARN_MS', '250'))
+# The same operation on the same collection this many times in one request
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', '5'))
+
+# Upper bounds of the per-route query count histogram
+QUERY_COUNT_BUCKETS = [0, 1, 2, 3, 5, 8, 13, 21, 34]
+
+
+class RequestQueries:
+    """Operations issued while serving one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.time_ms = 0.0
+        self.operations: Dict[str, int] = {}
+        self.finished = False
+
+    def add(self, operation: str, elapsed_ms: float):
+        self.count += 1
+        self.time_ms += elapsed_ms
+        self.operations[operation] = self.operations.get(operation, 0) + 1
+
+    def repeated(self) -> Dict[str, int]:
+        return {operation: count for operation, count in self.operations.items() if count >= N_PLUS_ONE_THRESHOLD}
+
+
+current_queries: ContextVar[Optional[RequestQueries]] = ContextVar("current_queries", default=None)
+
+
+class QueryMetrics:
+    def __init__(self):
+        self.routes: Dict[str, dict] = {}
+        self.background_operations = 0
+        self.background_time_ms = 0.0
+
+    @staticmethod
+    def _bucket_label(upper: Optional[int]) -> str:
+        return f"le_{upper}" if upper is not None else f"gt_{QUERY_COUNT_BUCKETS[-1]}"
+
+    def record(self, operation: str, elapsed_ms: float):
+        """Attribute one database operation to the current request"""
+        queries = current_queries.get()
+        if queries is not None and not queries.finished:
+            queries.add(operation, elapsed_ms)
+        else:
+            # Flushers, schedulers and work that outlived its request
+            self.background_operations += 1
+            self.background_time_ms += elapsed_ms
+
+    def begin(self):
+        """Start counting for a request; returns its counter and the context token"""
+        queries = RequestQueries()
+        return queries, current_queries.set(queries)
+
+    def finish(self, route: str, queries: RequestQueries, token):
+        """Stop counting for a request and fold it into its route's metrics"""
+        current_queries.reset(token)
+        queries.finished = True
+
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = {
+                "requests": 0,
+                "queries": 0,
+                "max_queries": 0,
+                "query_time_ms": 0.0,
+                "slow_requests": 0,
+                "n_plus_one_requests": 0,
+                "histogram": {self._bucket_label(b): 0 for b in QUERY_COUNT_BUCKETS + [None]}
+            }
+
+        stats["requests"] += 1
+        stats["queries"] += queries.count
+        stats["max_queries"] = max(stats["max_queries"], queries.count)
+        stats["query_time_ms"] += queries.time_ms
+        for upper in QUERY_COUNT_BUCKETS:
+            if queries.count <= upper:
+                stats["histogram"][self._bucket_label(upper)] += 1
+                break
+        else:
+            stats["histogram"][self._bucket_label(None)] += 1
+
+        repeated = queries.repeated()
+        if repeated:
+            stats["n_plus_one_requests"] += 1
+        slow = queries.count > QUERY_COUNT_WARN_THRESHOLD or queries.time_ms > QUERY_TIME_WARN_MS
+        if slow:
+            stats["slow_requests"] += 1
+
+        if slow or repeated:
+            top = sorted(queries.operations.items(), key=lambda item: item[1], reverse=True)[:5]
+            logger.warning(
+                f"🐢 {route}: {queries.count} DB queries in {queries.time_ms:.1f} ms"
+                f"{' - possible N+1' if repeated else ''} ({', '.join(f'{op} x{n}' for op, n in top)})"
+            )
+
+    def get_stats(self) -> dict:
+        """Query counts per route, most queries per request first"""
+        routes = {
+            route: {
+                **stats,
+                "average_queries": round(stats["queries"] / stats["requests"], 2),
+                "query_time_ms": round(stats["query_time_ms"], 1),
+                "histogram": dict(stats["histogram"])
+            }
+            for route, stats in self.routes.items()
+        }
+        return {
+            "routes": dict(sorted(routes.items(), key=lambda item: item[1]["average_queries"], reverse=True)),
+            "background_operations": self.background_operations,
+            "background_time_ms": round(self.background_time_ms, 1),
+            "query_count_warn_threshold": QUERY_COUNT_WARN_THRESHOLD,
+            "query_time_warn_ms": QUERY_TIME_WARN_MS,
+            "n_plus_one_threshold": N_PLUS_ONE_THRESHOLD
+        }
+
+
+# Global query metrics instance
+query_metrics = QueryMetrics()
+
+
+async def _timed(operation: str, awaitable, started: float):
+    try:
+        return await awaitable
+    finally:
+        query_metrics.record(operation, (time.perf_counter() - started) * 1000)
+
+
+def _instrument(attr, operation: str, collection: Optional[str] = None, method: Optional[str] = None):
+    """Wrap a Motor method so its result is timed (awaitables) or instrumented (cursors, collections)"""
+    if isinstance(attr, AsyncIOMotorCollection):
+        return InstrumentedCollection(attr)
+    if not callable(attr):
+        return attr
+
+    def call(*args, **kwargs):
+        shape = call_shape(collection, method, args, kwargs) if query_shape_recorder and collection else None
+        started = time.perf_counter()
+        result = attr(*args, **kwargs)
+        if isinstance(result, AsyncIOMotorCollection):
+            return InstrumentedCollection(result)
+        if hasattr(result, "to_list") and not inspect.isawaitable(result):
+            # Recorded when it runs, once sort() and limit() are known
+            return InstrumentedCursor(result, operation, shape)
+        if shape:
+            query_shape_recorder.record(shape)
+        if inspect.isawaitable(result):
+            # Motor already started the operation, only the wait is wrapped
+            return _timed(operation, result, started)
+        return result
+
+    return call
+
+
+class InstrumentedCursor:
+    """A find/aggregate cursor counted as one operation, however many batches it reads"""
+
+    def __init__(self, cursor, operation: str, shape: Optional[dict] = None):
+        self._cursor = cursor
+        self._operation = operation
+        self._shape = shape
+
+    def _record_shape(self):
+        if self._shape:
+            query_shape_recorder.record(self._shape)
+            self._shape = None
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if self._shape and name == "sort":
+                self._shape["sort"] = sort_spec(*args, **kwargs)
+            elif self._shape and name == "limit":
+                self._shape["limit"] = args[0] if args else kwargs.get("limit")
+            started = time.perf_counter()
+            result = attr(*args, **kwargs)
+            if result is self._cursor:
+                return self  # sort(), limit(), batch_size()...
+            if inspect.isawaitable(result):
+                self._record_shape()
+                return _timed(self._operation, result, started)
+            return result
+
+        return call
+
+    def __aiter__(self):
+        self._record_shape()
+        return self._iterate()
+
+    async def _iterate(self):
+        documents = self._cursor.__aiter__()
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    document = await documents.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield document
+        finally:
+            query_metrics.record(self._operation, elapsed * 1000)
+
+
+class InstrumentedCollection:
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return _instrument(getattr(self._collection, name), f"{self._collection.name}.{name}", self._collection.name, name)
+
+    def __getitem__(self, name):
+        return InstrumentedCollection(self._collection[name])
+
+
+class InstrumentedDatabase:
+    """The Motor database with every operation reported to query_metrics"""
+
+    def __init__(self, database):
+        self._database = database
+
+    def __getattr__(self, name):
+        return _instrument(getattr(self._database, name), f"db.{name}")
+
+    def __getitem__(self, name):
+        return InstrumentedCollection(self._database[name])
@@ -0,0 +1,140 @@
+"""
+Query shape recorder for the explain audit (explain_audit.py)
+With QUERY_SHAPE_LOG set, every distinct query sent through the database layer
+- collection, operation, filter, sort, projection or pipeline - is appended to
+that file once. Values are replaced by type placeholders ("?str", "?int"...), so
+no tenant data is written and the audit can replay the shape with its own data
+"""
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Optional
+
+QUERY_SHAPE_LOG = os.environ.get('QUERY_SHAPE_LOG')
+
+# Operations taking a filter first
+FILTER_OPERATIONS = {
+    "find", "find_one", "count_documents", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "find_one_and_update", "find_one_and_delete", "find_one_and_replace"
+}
+# Operators whose value is part of the shape, not data
+LITERAL_OPERATORS = {"$exists", "$type", "$size"}
+LOGICAL_OPERATORS = {"$and", "$or", "$nor"}
+
+
+def placeholder(value) -> str:
+    if value is None:
+        return "?null"
+    if isinstance(value, bool):
+        return "?bool"
+    if isinstance(value, int):
+        return "?int"
+    if isinstance(value, float):
+        return "?float"
+    if isinstance(value, datetime):
+        return "?date"
+    if isinstance(value, str):
+        return "?str"
+    return f"?{type(value).__name__}"
+
+
+def normalize(value, key: Optional[str] = None):
+    """A filter with its values replaced by placeholders"""
+    if isinstance(value, dict):
+        return {k: normalize(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if key in LOGICAL_OPERATORS:
+            return [normalize(item) for item in value]
+        # $in/$nin lists: one placeholder per distinct type
+        items = {}
+        for item in value:
+            normalized = normalize(item, key)
+            items[json.dumps(normalized, sort_keys=True)] = normalized
+        return list(items.values())
+    if key == "$regex" and isinstance(value, str):
+        # Only anchored prefixes can bound an index scan
+        return "?regex^" if value.startswith("^") else "?regex"
+    if key in LITERAL_OPERATORS:
+        return value
+    return placeholder(value)
+
+
+def sort_spec(key_or_list, direction=None) -> Optional[list]:
+    """Motor sort arguments as [[field, direction], ...]"""
+    if key_or_list is None:
+        return None
+    if isinstance(key_or_list, str):
+        return [[key_or_list, direction or 1]]
+    if isinstance(key_or_list, dict):
+        return [[field, order] for field, order in key_or_list.items()]
+    return [[field, order] for field, order in key_or_list]
+
+
+def projection_spec(projection) -> Optional[dict]:
+    if projection is None or isinstance(projection, dict):
+        return projection
+    return {field: 1 for field in projection}
+
+
+def normalize_pipeline(pipeline: list) -> list:
+    """$match stages normalized, including those of $lookup sub-pipelines; other stages kept"""
+    stages = []
+    for stage in pipeline:
+        if "$match" in stage:
+            stage = {"$match": normalize(stage["$match"])}
+        elif "$lookup" in stage and "pipeline" in stage["$lookup"]:
+            stage = {"$lookup": {**stage["$lookup"], "pipeline": normalize_pipeline(stage["$lookup"]["pipeline"])}}
+        stages.append(stage)
+    return stages
+
+
+def call_shape(collection: str, operation: str, args: tuple, kwargs: dict) -> Optional[dict]:
+    """The shape of a Motor collection call, None for operations without a query"""
+    def arg(position: int, name: str):
+        return args[position] if len(args) > position else kwargs.get(name)
+
+    if operation in FILTER_OPERATIONS:
+        shape = {"filter": normalize(arg(0, "filter") or {})}
+        if operation in ("find", "find_one", "find_one_and_delete"):
+            projection = arg(1, "projection")
+        else:
+            projection = kwargs.get("projection")
+        if projection is not None:
+            shape["projection"] = projection_spec(projection)
+        if kwargs.get("sort") is not None:
+            shape["sort"] = sort_spec(kwargs["sort"])
+        if kwargs.get("limit"):
+            shape["limit"] = kwargs["limit"]
+    elif operation == "distinct":
+        shape = {"key": arg(0, "key"), "filter": normalize(arg(1, "filter") or {})}
+    elif operation == "aggregate":
+        shape = {"pipeline": normalize_pipeline(arg(0, "pipeline") or [])}
+    else:
+        return None
+
+    return {"collection": collection, "operation": operation, **shape}
+
+
+class QueryShapeRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.seen = set()
+        # Shapes from earlier runs are not appended again
+        if os.path.exists(path):
+            with open(path) as shapes_file:
+                self.seen.update(line.strip() for line in shapes_file if line.strip())
+
+    def record(self, shape: dict):
+        line = json.dumps(shape, sort_keys=True, default=str)
+        with self.lock:
+            if line in self.seen:
+                return
+            self.seen.add(line)
+            with open(self.path, "a") as shapes_file:
+                shapes_file.write(line + "\n")
+
+
+# Global recorder, only when QUERY_SHAPE_LOG is set
+query_shape_recorder = QueryShapeRecorder(QUERY_SHAPE_LOG) if QUERY_SHAPE_LOG else None
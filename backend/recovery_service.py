@@ -7,20 +7,16 @@ import time
 import requests
 import subprocess
 import json
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from database import close_database
+from storage import storage
 
 class WhatsAppRecoveryService:
     def __init__(self):
-        self.mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-        self.client = AsyncIOMotorClient(self.mongo_url)
-        self.db = self.client.whatsapp_assistant
         self.running = True
         
     async def get_active_clients(self):
         """Obtener clientes activos de la base de datos"""
-        clients = await self.db.clients.find({"status": "active"}).to_list(length=None)
-        return clients
+        return await storage.clients.find_by_status("active")
     
     def check_service_health(self, port):
         """Verificar si un servicio está respondiendo"""
@@ -111,11 +107,15 @@ class WhatsAppRecoveryService:
 # Función para iniciar el servicio
 async def start_recovery_service():
     recovery = WhatsAppRecoveryService()
+    await storage.open()
     try:
         await recovery.monitor_loop()
     except KeyboardInterrupt:
         recovery.stop()
         print("👋 Recovery service terminado")
+    finally:
+        await storage.close()
+        await close_database()
 
 if __name__ == "__main__":
     asyncio.run(start_recovery_service())
\ No newline at end of file
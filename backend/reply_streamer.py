@@ -0,0 +1,218 @@
+"""
+Sentence-level streaming delivery of assistant replies
+Cuts streamed text deltas at paragraph and sentence boundaries and sends each
+chunk to the WhatsApp chat in order, paced per chat, while generation continues
+"""
+import asyncio
+import os
+import re
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+from models import Client
+from whatsapp_manager import service_manager
+from interim_ack import interim_acks
+
+logger = logging.getLogger(__name__)
+
+MIN_CHUNK_CHARS = int(os.environ.get('STREAM_MIN_CHUNK_CHARS', '60'))
+MAX_CHUNK_CHARS = int(os.environ.get('STREAM_MAX_CHUNK_CHARS', '1000'))
+MIN_SEND_INTERVAL_SECONDS = float(os.environ.get('STREAM_MIN_SEND_INTERVAL_SECONDS', '1.0'))
+
+_PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n\s*')
+# Sentence end followed by the start of a new sentence, list item or line
+_SENTENCE_BREAK = re.compile(r'[.!?…:][\"\'»”)\]]*(?:[ \t]+(?=[A-ZÁÉÍÓÚÑ¿¡*•\-])|[ \t]*\n\s*)')
+_LAST_WORD = re.compile(r'(\w+)\.[\"\'»”)\]]*\s*$')
+# Numbered list item at the start of a line ("1. Demanda")
+_LIST_NUMBER = re.compile(r'(?:^|\n)[ \t]*\d{1,3}\.$')
+# Abbreviations after which a period does not end the sentence
+ABBREVIATIONS = {
+    'sr', 'sra', 'srta', 'sres', 'dr', 'dra', 'lic', 'ing', 'abg', 'art', 'arts', 'inc', 'fracc',
+    'núm', 'num', 'nro', 'pág', 'págs', 'cap', 'ej', 'vs', 'ud', 'uds', 'av', 'dpto', 'cía', 'exp'
+}
+
+
+class StreamedReply(str):
+    """Reply text that already reached the user through the chat"""
+
+
+def find_chunk_end(text: str, final: bool = False) -> Optional[int]:
+    """
+    Offset where the next chunk of `text` should be cut, or None to keep buffering.
+    Paragraph breaks always cut; sentence breaks only once the chunk is long enough.
+    """
+    for paragraph in _PARAGRAPH_BREAK.finditer(text):
+        # Blank lines before any text are not a paragraph end
+        if text[:paragraph.start()].strip():
+            return paragraph.end()
+
+    for match in _SENTENCE_BREAK.finditer(text):
+        if match.start() < MIN_CHUNK_CHARS:
+            continue
+        if match.end() > MAX_CHUNK_CHARS:
+            break
+        # Abbreviations and list numbers ("Art. 5", "Sr. Pérez", "1. Demanda") do not end a sentence
+        if text[match.start()] == '.':
+            last_word = _LAST_WORD.search(text[:match.end()])
+            if last_word and last_word.group(1).lower() in ABBREVIATIONS:
+                continue
+            if _LIST_NUMBER.search(text[:match.start() + 1]):
+                continue
+        return match.end()
+
+    if len(text) > MAX_CHUNK_CHARS:
+        # No boundary in sight - cut at the last space so words stay whole
+        space = text.rfind(' ', 0, MAX_CHUNK_CHARS)
+        return space + 1 if space > 0 else MAX_CHUNK_CHARS
+
+    return len(text) if final and text.strip() else None
+
+
+class ChatSendPacer:
+    """Minimum interval between messages sent to the same chat"""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self.next_send_at: Dict[Tuple[str, str], float] = {}
+
+    async def wait_turn(self, client_id: str, phone_number: str):
+        key = (client_id, phone_number)
+        now = time.monotonic()
+        send_at = max(now, self.next_send_at.get(key, 0))
+        self.next_send_at[key] = send_at + self.min_interval
+
+        if len(self.next_send_at) > 10000:
+            self.next_send_at = {k: t for k, t in self.next_send_at.items() if t > now}
+
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+
+
+class ReplyStream:
+    """Chunks and delivers one streamed reply, in order, through the client's WhatsApp service"""
+
+    def __init__(self, streamer: "ReplyStreamer", client: Client, phone_number: str):
+        self.streamer = streamer
+        self.client = client
+        self.phone_number = phone_number
+        self.text = ""            # Everything fed so far
+        self.chunked_upto = 0     # Offset up to which text was cut into chunks
+        self.delivered_upto = 0   # Offset up to which text reached the chat
+        self.boundaries: List[int] = []  # Chunk ends waiting to be sent
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.failed = False
+        self.started_at = time.monotonic()
+        self.sender: Optional[asyncio.Task] = None
+
+    def feed(self, delta: str):
+        """Add a text delta and queue every chunk that is complete"""
+        self.text += delta
+        self._queue_chunks(final=False)
+
+    def _queue_chunks(self, final: bool):
+        while not self.failed:
+            end = find_chunk_end(self.text[self.chunked_upto:], final=final)
+            if end is None:
+                return
+            self.chunked_upto += end
+            self.boundaries.append(self.chunked_upto)
+            self.ready.set()
+
+            if self.sender is None:
+                self.sender = asyncio.create_task(self._send_chunks())
+
+    async def _send_chunks(self):
+        """Send queued chunks in order, one message per turn of the chat's pacer"""
+        while True:
+            if not self.boundaries:
+                if self.closed:
+                    return
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+
+            await self.streamer.pacer.wait_turn(self.client.id, self.phone_number)
+
+            # Merge chunks that piled up while waiting, within the message size limit
+            end = self.boundaries.pop(0)
+            while self.boundaries and self.boundaries[0] - self.delivered_upto <= MAX_CHUNK_CHARS:
+                end = self.boundaries.pop(0)
+
+            chunk = self.text[self.delivered_upto:end].strip()
+            if chunk:
+                sent = await service_manager.send_message_to_chat(self.client, self.phone_number, chunk)
+                if not sent:
+                    # Leave the rest for the regular reply
+                    self.failed = True
+                    return
+
+                if self.delivered_upto == 0:
+                    interim_acks.mark_answered(self.client.id, self.phone_number)
+                    self.streamer.record_first_chunk(time.monotonic() - self.started_at)
+                self.streamer.chunks_sent += 1
+            self.delivered_upto = end
+
+    async def finish(self, reply: str) -> str:
+        """
+        Flush the tail and wait for delivery. Returns a StreamedReply when the whole
+        reply reached the chat, otherwise the part that still has to be sent.
+        """
+        if reply.strip() != self.text.strip():
+            # Not what was streamed (error message, cached or fallback reply)
+            self.failed = True
+            if self.sender is not None:
+                self.sender.cancel()
+            return reply
+
+        self._queue_chunks(final=True)
+        if self.sender is None:
+            return reply
+
+        self.closed = True
+        self.ready.set()
+        await self.sender
+
+        remainder = self.text[self.delivered_upto:].strip()
+        if remainder:
+            self.streamer.partial_streams += 1
+            logger.warning(f"Streaming to {self.phone_number} for client {self.client.id} stopped, sending the rest as one reply")
+            return remainder
+
+        self.streamer.streamed_replies += 1
+        return StreamedReply(reply)
+
+
+class ReplyStreamer:
+    def __init__(self):
+        self.pacer = ChatSendPacer(MIN_SEND_INTERVAL_SECONDS)
+        self.streamed_replies = 0
+        self.partial_streams = 0
+        self.chunks_sent = 0
+        self.first_chunk_seconds: List[float] = []  # Recent time-to-first-message samples
+
+    def open(self, client: Client, phone_number: str) -> ReplyStream:
+        """Start streaming delivery for one reply"""
+        return ReplyStream(self, client, phone_number)
+
+    def record_first_chunk(self, seconds: float):
+        self.first_chunk_seconds.append(seconds)
+        if len(self.first_chunk_seconds) > 1000:
+            self.first_chunk_seconds = self.first_chunk_seconds[-500:]
+
+    def get_stats(self) -> dict:
+        """Get streaming delivery statistics"""
+        samples = sorted(self.first_chunk_seconds)
+        return {
+            "streamed_replies": self.streamed_replies,
+            "partial_streams": self.partial_streams,
+            "chunks_sent": self.chunks_sent,
+            "average_chunks_per_reply": round(self.chunks_sent / self.streamed_replies, 1) if self.streamed_replies else 0,
+            "time_to_first_message_p50_seconds": round(samples[len(samples) // 2], 2) if samples else None,
+            "time_to_first_message_p95_seconds": round(samples[int(len(samples) * 0.95)], 2) if samples else None,
+            "min_send_interval_seconds": MIN_SEND_INTERVAL_SECONDS
+        }
+
+
+# Global reply streamer instance
+reply_streamer = ReplyStreamer()
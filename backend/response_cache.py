@@ -0,0 +1,204 @@
+"""
+Per-assistant response cache for repeated questions
+Keys on normalized message text, falls back to character n-gram similarity,
+and evicts by TTL and LRU. Opt-in per client.
+"""
+import asyncio
+import os
+import re
+import time
+import unicodedata
+import logging
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZE = 3
+# Shorter messages ("si", "ok", "no") are follow-ups whose answer depends on the conversation
+MIN_CACHEABLE_LENGTH = 12
+# ...unless they are a question of their own ("¿horario?")
+MIN_QUESTION_LENGTH = 6
+# Below this length only exact matches are served ("si" must never match "no")
+MIN_FUZZY_LENGTH = 12
+# Long messages are too specific to be worth caching
+MAX_CACHEABLE_LENGTH = 300
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    text = unicodedata.normalize('NFKD', message.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+def is_cacheable(message: str, normalized: str) -> bool:
+    """Whether a message is a standalone question worth caching"""
+    if not normalized or len(normalized) > MAX_CACHEABLE_LENGTH:
+        return False
+    if len(normalized) >= MIN_CACHEABLE_LENGTH:
+        return True
+    return '?' in message and len(normalized) >= MIN_QUESTION_LENGTH
+
+
+def message_ngrams(normalized: str) -> FrozenSet[str]:
+    """Character n-grams of a normalized message, padded per word"""
+    grams = set()
+    for word in normalized.split():
+        padded = f" {word} "
+        for i in range(max(len(padded) - NGRAM_SIZE + 1, 1)):
+            grams.add(padded[i:i + NGRAM_SIZE])
+    return frozenset(grams)
+
+
+class AssistantResponseCache:
+    """LRU of normalized question -> answer for one assistant, with an n-gram index"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.index: Dict[str, Set[str]] = {}  # n-gram -> normalized keys
+
+    def get(self, normalized: str, threshold: float) -> Tuple[Optional[str], Optional[str]]:
+        """Return (response, match type) for an exact or similar cached question"""
+        entry = self.entries.get(normalized)
+        if entry and not self._expired(entry):
+            self.entries.move_to_end(normalized)
+            return entry['response'], 'exact'
+        if entry:
+            self._remove(normalized)
+
+        if len(normalized) < MIN_FUZZY_LENGTH:
+            return None, None
+
+        grams = message_ngrams(normalized)
+        if not grams:
+            return None, None
+
+        # Count shared n-grams per candidate through the inverted index
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for key in self.index.get(gram, ()):
+                shared[key] = shared.get(key, 0) + 1
+
+        best_key, best_score = None, 0.0
+        for key, common in shared.items():
+            candidate_grams = self.entries[key]['grams']
+            score = common / (len(grams) + len(candidate_grams) - common)
+            if score > best_score:
+                best_key, best_score = key, score
+
+        if best_key is None or best_score < threshold:
+            return None, None
+
+        entry = self.entries[best_key]
+        if self._expired(entry):
+            self._remove(best_key)
+            return None, None
+
+        self.entries.move_to_end(best_key)
+        return entry['response'], 'fuzzy'
+
+    def put(self, normalized: str, response: str):
+        """Store an answer, evicting the least recently used entry when full"""
+        if normalized in self.entries:
+            self._remove(normalized)
+
+        grams = message_ngrams(normalized)
+        self.entries[normalized] = {'response': response, 'grams': grams, 'stored_at': time.monotonic()}
+        for gram in grams:
+            self.index.setdefault(gram, set()).add(normalized)
+
+        while len(self.entries) > self.max_entries:
+            oldest_key = next(iter(self.entries))
+            self._remove(oldest_key)
+
+    def _expired(self, entry: dict) -> bool:
+        return time.monotonic() - entry['stored_at'] > self.ttl_seconds
+
+    def _remove(self, normalized: str):
+        entry = self.entries.pop(normalized, None)
+        if not entry:
+            return
+        for gram in entry['grams']:
+            keys = self.index.get(gram)
+            if keys:
+                keys.discard(normalized)
+                if not keys:
+                    del self.index[gram]
+
+
+class ResponseCache:
+    def __init__(self):
+        self.ttl_seconds = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', str(6 * 60 * 60)))
+        self.max_entries = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '500'))
+        self.similarity_threshold = float(os.environ.get('RESPONSE_CACHE_SIMILARITY', '0.85'))
+        self.caches: Dict[str, AssistantResponseCache] = {}  # assistant_id -> cache
+        self.stats: Dict[str, Dict[str, int]] = {}  # assistant_id -> counters
+        self.pending_appends: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def _count(self, assistant_id: str, counter: str):
+        counters = self.stats.setdefault(assistant_id, {"exact_hits": 0, "fuzzy_hits": 0, "misses": 0})
+        counters[counter] += 1
+
+    def lookup(self, assistant_id: str, message: str) -> Optional[str]:
+        """Get a cached answer for a message sent to an assistant"""
+        normalized = normalize_message(message)
+        if not is_cacheable(message, normalized):
+            return None
+
+        cache = self.caches.get(assistant_id)
+        response, match_type = cache.get(normalized, self.similarity_threshold) if cache else (None, None)
+
+        self._count(assistant_id, f"{match_type}_hits" if match_type else "misses")
+        return response
+
+    def store(self, assistant_id: str, message: str, response: str, used_tools: bool = False):
+        """Remember the assistant's answer to a message; answers built from tool calls are never shared"""
+        normalized = normalize_message(message)
+        if used_tools or not response or not is_cacheable(message, normalized):
+            return
+
+        cache = self.caches.get(assistant_id)
+        if cache is None:
+            cache = AssistantResponseCache(self.max_entries, self.ttl_seconds)
+            self.caches[assistant_id] = cache
+        cache.put(normalized, response)
+
+    def invalidate_assistant(self, assistant_id: Optional[str]):
+        """Forget every answer of an assistant (its instructions or files changed)"""
+        if assistant_id and self.caches.pop(assistant_id, None) is not None:
+            logger.info(f"Response cache invalidated for assistant {assistant_id}")
+
+    def track_append(self, client_id: str, phone_number: str, task: asyncio.Task):
+        """Remember the background task that appends a cached exchange to the thread"""
+        key = (client_id, phone_number)
+        self.pending_appends[key] = task
+        task.add_done_callback(lambda done: self.pending_appends.pop(key, None) if self.pending_appends.get(key) is done else None)
+
+    async def wait_for_pending_append(self, client_id: str, phone_number: str):
+        """Wait until a cached exchange is on the thread before starting a new run"""
+        task = self.pending_appends.get((client_id, phone_number))
+        if task:
+            await asyncio.gather(task, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        """Get cache statistics per assistant"""
+        return {
+            "assistants": {
+                assistant_id: {
+                    "entries": len(self.caches[assistant_id].entries) if assistant_id in self.caches else 0,
+                    **counters
+                }
+                for assistant_id, counters in self.stats.items()
+            },
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries_per_assistant": self.max_entries,
+            "similarity_threshold": self.similarity_threshold
+        }
+
+
+# Global response cache instance
+response_cache = ResponseCache()
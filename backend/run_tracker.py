@@ -0,0 +1,250 @@
+"""
+In-flight assistant run tracker
+Keeps every OpenAI run per tenant and thread with a deadline, cancels runs that
+outlive it so threads never stay locked, and exposes run age metrics
+"""
+import asyncio
+import os
+import time
+import logging
+from typing import Dict, List, Optional
+from llm_backend import get_llm_backend
+from openai_scheduler import PRIORITY_OWNER
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_RUN_STATUSES = {'completed', 'failed', 'cancelled', 'expired', 'incomplete'}
+
+# Upper bounds (seconds) of the run duration histogram
+RUN_AGE_BUCKETS = [1, 2, 5, 10, 20, 30, 60]
+
+# Failed cancellations of a run before the tracker stops retrying it
+MAX_CANCEL_ATTEMPTS = 5
+
+
+class RunTracker:
+    def __init__(self):
+        self.runs: Dict[str, dict] = {}  # run_id -> run info
+        self.deadline_seconds = float(os.environ.get('ASSISTANT_RUN_DEADLINE_SECONDS', '30'))
+        self.reaper_interval = float(os.environ.get('ASSISTANT_RUN_REAPER_INTERVAL', '10'))
+        self.running = False
+        self.finished_by_status: Dict[str, int] = {}
+        self.duration_histogram: Dict[str, int] = {self._bucket_label(b): 0 for b in RUN_AGE_BUCKETS + [None]}
+
+    @staticmethod
+    def _bucket_label(upper: Optional[float]) -> str:
+        return f"le_{upper}s" if upper is not None else "gt_60s"
+
+    def register(
+        self,
+        client_id: str,
+        thread_id: str,
+        run_id: str,
+        api_key: str,
+        status: str = 'queued',
+        deadline_seconds: Optional[float] = None
+    ) -> dict:
+        """Start tracking a run that was just created"""
+        now = time.monotonic()
+        run_info = {
+            'run_id': run_id,
+            'client_id': client_id,
+            'thread_id': thread_id,
+            'api_key': api_key,
+            'status': status,
+            'started_at': now,
+            'deadline': now + (deadline_seconds or self.deadline_seconds),
+            'cancel_attempts': 0
+        }
+        self.runs[run_id] = run_info
+        return run_info
+
+    def update_status(self, run_id: str, status: str):
+        """Record the latest polled status of a run"""
+        run_info = self.runs.get(run_id)
+        if run_info:
+            run_info['status'] = status
+
+    def is_overdue(self, run_id: str) -> bool:
+        """Check if a run is past its deadline; a run no longer tracked is"""
+        run_info = self.runs.get(run_id)
+        if not run_info:
+            return True
+        return time.monotonic() >= run_info['deadline']
+
+    def time_remaining(self, run_id: str) -> float:
+        """Seconds left before a run's deadline; none for a run no longer tracked"""
+        run_info = self.runs.get(run_id)
+        if not run_info:
+            return 0
+        return max(run_info['deadline'] - time.monotonic(), 0)
+
+    def finish(self, run_id: str, status: str):
+        """Stop tracking a run and record its final status and duration"""
+        run_info = self.runs.pop(run_id, None)
+        if not run_info:
+            return
+
+        self.finished_by_status[status] = self.finished_by_status.get(status, 0) + 1
+
+        duration = time.monotonic() - run_info['started_at']
+        for upper in RUN_AGE_BUCKETS:
+            if duration <= upper:
+                self.duration_histogram[self._bucket_label(upper)] += 1
+                break
+        else:
+            self.duration_histogram[self._bucket_label(None)] += 1
+
+    def get_active_run_for_thread(self, thread_id: str) -> Optional[dict]:
+        """Get the tracked run currently holding a thread"""
+        for run_info in self.runs.values():
+            if run_info['thread_id'] == thread_id:
+                return run_info
+        return None
+
+    def list_runs(self, client_id: Optional[str] = None, min_age_seconds: float = 0, stuck_only: bool = False) -> List[dict]:
+        """List in-flight runs without exposing API keys, oldest first"""
+        now = time.monotonic()
+        result = []
+
+        for run_info in self.runs.values():
+            if client_id and run_info['client_id'] != client_id:
+                continue
+
+            age = now - run_info['started_at']
+            overdue = now >= run_info['deadline']
+            if age < min_age_seconds or (stuck_only and not overdue):
+                continue
+
+            result.append({
+                'run_id': run_info['run_id'],
+                'client_id': run_info['client_id'],
+                'thread_id': run_info['thread_id'],
+                'status': run_info['status'],
+                'age_seconds': round(age, 1),
+                'overdue': overdue
+            })
+
+        result.sort(key=lambda run: run['age_seconds'], reverse=True)
+        return result
+
+    async def cancel_run(self, run_id: str, reason: str = "manual", wait: bool = False) -> bool:
+        """
+        Cancel a tracked run on OpenAI; optionally wait until it releases the thread.
+        The run stays tracked (and the reaper retries) unless the cancellation was
+        accepted or the run already ended.
+        """
+        run_info = self.runs.get(run_id)
+        if not run_info:
+            return False
+
+        # Releasing a thread unblocks a user, so it goes ahead of normal traffic
+        backend = get_llm_backend(run_info['api_key'], run_info['client_id'], PRIORITY_OWNER)
+
+        try:
+            run = await backend.cancel_run(run_info['thread_id'], run_id)
+            status = run.status
+
+            # 'cancelling' still holds the thread lock, give it a few seconds
+            attempts = 0
+            while wait and status not in TERMINAL_RUN_STATUSES and attempts < 10:
+                await asyncio.sleep(0.5)
+                run = await backend.retrieve_run(run_info['thread_id'], run_id)
+                status = run.status
+                attempts += 1
+
+            logger.info(f"Cancelled run {run_id} for client {run_info['client_id']} ({reason}) - status {status}")
+            self.finish(run_id, status if status in TERMINAL_RUN_STATUSES else 'cancelled')
+            return True
+
+        except Exception as e:
+            logger.warning(f"Could not cancel run {run_id} for client {run_info['client_id']}: {str(e)}")
+
+        # Runs that already finished on OpenAI's side reject cancellation
+        try:
+            run = await backend.retrieve_run(run_info['thread_id'], run_id)
+            if run.status in TERMINAL_RUN_STATUSES:
+                self.finish(run_id, run.status)
+                return True
+        except Exception as e:
+            logger.warning(f"Could not check run {run_id} for client {run_info['client_id']}: {str(e)}")
+
+        run_info['cancel_attempts'] += 1
+        if run_info['cancel_attempts'] >= MAX_CANCEL_ATTEMPTS:
+            logger.error(f"Giving up on run {run_id} for client {run_info['client_id']} after {MAX_CANCEL_ATTEMPTS} failed cancellations")
+            self.finish(run_id, 'cancel_failed')
+        return False
+
+    async def release_thread(self, thread_id: str):
+        """Cancel any tracked run still holding a thread before starting a new one"""
+        run_info = self.get_active_run_for_thread(thread_id)
+        if run_info:
+            await self.cancel_run(run_info['run_id'], reason="thread reuse", wait=True)
+
+    async def cancel_runs(
+        self,
+        client_id: Optional[str] = None,
+        min_age_seconds: float = 0,
+        stuck_only: bool = True,
+        run_ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """Cancel matching runs concurrently and return their ids"""
+        if run_ids:
+            targets = [run_id for run_id in run_ids if run_id in self.runs]
+        else:
+            targets = [run['run_id'] for run in self.list_runs(client_id, min_age_seconds, stuck_only)]
+
+        results = await asyncio.gather(
+            *(self.cancel_run(run_id, reason="bulk") for run_id in targets),
+            return_exceptions=True
+        )
+        return [run_id for run_id, result in zip(targets, results) if result is True]
+
+    async def cancel_overdue_runs(self) -> int:
+        """Cancel every run past its deadline (runs orphaned by failed requests)"""
+        cancelled = await self.cancel_runs(stuck_only=True)
+        if cancelled:
+            logger.info(f"Run reaper cancelled {len(cancelled)} overdue runs")
+        return len(cancelled)
+
+    async def start_reaper(self):
+        """Periodically cancel overdue runs"""
+        self.running = True
+        logger.info("⏱️ Run tracker reaper started")
+
+        while self.running:
+            try:
+                await asyncio.sleep(self.reaper_interval)
+                await self.cancel_overdue_runs()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in run reaper: {str(e)}")
+
+    def stop_reaper(self):
+        """Stop the reaper loop"""
+        self.running = False
+
+    def get_metrics(self) -> dict:
+        """Get in-flight run age and completed run duration metrics"""
+        now = time.monotonic()
+        ages = [now - run_info['started_at'] for run_info in self.runs.values()]
+
+        per_client: Dict[str, int] = {}
+        for run_info in self.runs.values():
+            per_client[run_info['client_id']] = per_client.get(run_info['client_id'], 0) + 1
+
+        return {
+            "in_flight": len(ages),
+            "overdue": sum(1 for run_info in self.runs.values() if now >= run_info['deadline']),
+            "oldest_age_seconds": round(max(ages), 1) if ages else 0,
+            "average_age_seconds": round(sum(ages) / len(ages), 1) if ages else 0,
+            "in_flight_by_client": per_client,
+            "finished_by_status": dict(self.finished_by_status),
+            "duration_histogram": dict(self.duration_histogram),
+            "deadline_seconds": self.deadline_seconds
+        }
+
+
+# Global run tracker instance
+run_tracker = RunTracker()
@@ -1,8 +1,6 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Request
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
@@ -10,6 +8,7 @@ from typing import List
 import uuid
 from datetime import datetime
 import asyncio
+from contextlib import asynccontextmanager
 
 # Import all routes
 from whatsapp_routes import router as whatsapp_router
@@ -19,20 +18,78 @@ from client_routes import router as client_router
 
 # Import cleanup service
 from cleanup_service import start_cleanup_service
+from run_tracker import run_tracker
+from intent_router import intent_router
+from circuit_breaker import circuit_breakers
+from usage_metering import usage_meter
+from message_store import message_store
+from database import ensure_indexes, connect_database, close_database, get_database, get_analytics_database
+from storage import storage
+from query_metrics import query_metrics
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize services on startup, drain them and close MongoDB on shutdown"""
+    logger.info("🚀 Starting WhatsApp Assistant Multi-Tenant Platform")
+    
+    # One shared MongoDB client for the whole process
+    connect_database()
+    
+    # Clients, pauses, threads and messages (MongoDB or embedded SQLite)
+    await storage.open()
+    
+    # Start cleanup service in background
+    asyncio.create_task(start_cleanup_service())
+    
+    # Cancel assistant runs that outlive their deadline
+    asyncio.create_task(run_tracker.start_reaper())
+    
+    # Persist intent rule hit counts in batches
+    asyncio.create_task(intent_router.start_hit_flusher())
+    
+    # Persist token and latency usage in batches
+    asyncio.create_task(usage_meter.start_flusher())
+    
+    # Write conversation messages behind the replies, in batches
+    asyncio.create_task(message_store.start_flusher())
+    
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.error(f"Error creating indexes: {str(e)}")
+    
+    # Circuit breakers start closed
+    await circuit_breakers.clear_persisted_states()
+    
+    logger.info("✅ All services initialized successfully")
+    
+    yield
+    
+    logger.info("🛑 Shutting down platform...")
+    run_tracker.stop_reaper()
+    await intent_router.stop_hit_flusher()
+    await usage_meter.stop_flusher()
+    await message_store.stop_flusher()
+    await storage.close()
+    await close_database()
+    logger.info("✅ Shutdown complete")
 
 # Create the main app without a prefix
 app = FastAPI(
     title="WhatsApp Assistant Multi-Tenant Platform",
     description="Platform for managing multiple WhatsApp AI assistants",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Create a router with the /api prefix
@@ -54,6 +111,7 @@ async def root():
 
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
+    db = await get_database()
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
     _ = await db.status_checks.insert_one(status_obj.dict())
@@ -61,6 +119,7 @@ async def create_status_check(input: StatusCheckCreate):
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
+    db = await get_analytics_database()
     status_checks = await db.status_checks.find().to_list(1000)
     return [StatusCheck(**status_check) for status_check in status_checks]
 
@@ -71,6 +130,20 @@ app.include_router(admin_router)         # Admin panel routes
 app.include_router(client_router)        # Client landing routes
 
 
+@app.middleware("http")
+async def count_database_queries(request: Request, call_next):
+    """Count and time the database operations of each request"""
+    queries, token = query_metrics.begin()
+    try:
+        response = await call_next(request)
+    finally:
+        # Route templates, not raw paths, so ids do not split the metrics
+        route = request.scope.get("route")
+        query_metrics.finish(f"{request.method} {route.path if route else 'unmatched'}", queries, token)
+    response.headers["X-DB-Queries"] = str(queries.count)
+    response.headers["X-DB-Time-Ms"] = f"{queries.time_ms:.1f}"
+    return response
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -79,27 +152,3 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-@app.on_event("startup")
-async def startup_event():
-    """Initialize services on startup"""
-    logger.info("🚀 Starting WhatsApp Assistant Multi-Tenant Platform")
-    
-    # Start cleanup service in background
-    asyncio.create_task(start_cleanup_service())
-    
-    logger.info("✅ All services initialized successfully")
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    """Cleanup on shutdown"""
-    logger.info("🛑 Shutting down platform...")
-    client.close()
-    logger.info("✅ Shutdown complete")
\ No newline at end of file
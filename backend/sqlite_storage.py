@@ -0,0 +1,681 @@
+"""
+Embedded SQLite storage for single-host installs (STORAGE_BACKEND=sqlite)
+Same repositories as storage.py, backed by one SQLite file in WAL mode. Each
+document is kept as JSON next to the columns it is looked up by, so client,
+pause and thread lookups are local indexed reads. sqlite3 is blocking, so every
+call runs on a small thread pool; readers run concurrently and writes are
+serialized
+"""
+import asyncio
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from client_listing import CLIENT_LIST_FIELDS, mask_api_key, encode_cursor as encode_client_cursor, decode_cursor as decode_client_cursor
+from message_history import DEFAULT_HISTORY_FIELDS, STREAM_BATCH_SIZE, InvalidCursor
+from fastapi.encoders import jsonable_encoder
+from query_metrics import query_metrics
+
+logger = logging.getLogger(__name__)
+
+SQLITE_PATH = os.environ.get('SQLITE_PATH', os.path.join(os.path.dirname(__file__), 'data', 'assistant.db'))
+SQLITE_WORKERS = int(os.environ.get('SQLITE_WORKERS', '4'))
+
+PORT_COUNTER_ID = "whatsapp_ports"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clients (
+    id TEXT PRIMARY KEY,
+    unique_url TEXT,
+    name TEXT NOT NULL DEFAULT '',
+    status TEXT,
+    connected_phone TEXT,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS clients_unique_url ON clients (unique_url);
+CREATE INDEX IF NOT EXISTS clients_name ON clients (name, id);
+CREATE INDEX IF NOT EXISTS clients_status_name ON clients (status, name, id);
+CREATE INDEX IF NOT EXISTS clients_port ON clients (json_extract(data, '$.whatsapp_port'));
+
+CREATE TABLE IF NOT EXISTS paused_conversations (
+    client_id TEXT NOT NULL,
+    phone_number TEXT NOT NULL,
+    paused_by TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (client_id, phone_number)
+);
+
+CREATE TABLE IF NOT EXISTS openai_threads (
+    client_id TEXT NOT NULL,
+    phone_number TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    approx_tokens INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL,
+    PRIMARY KEY (client_id, phone_number)
+);
+CREATE INDEX IF NOT EXISTS openai_threads_tokens ON openai_threads (approx_tokens);
+
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    id TEXT,
+    client_id TEXT,
+    phone_number TEXT,
+    timestamp INTEGER,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS messages_id ON messages (collection, id);
+CREATE INDEX IF NOT EXISTS messages_client_history ON messages (collection, client_id, phone_number, timestamp, seq);
+CREATE INDEX IF NOT EXISTS messages_phone_history ON messages (collection, phone_number, timestamp, seq);
+CREATE INDEX IF NOT EXISTS messages_created ON messages (collection, created_at);
+
+CREATE TABLE IF NOT EXISTS client_tools (
+    client_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (client_id, name)
+);
+
+CREATE TABLE IF NOT EXISTS intent_rules (
+    id TEXT PRIMARY KEY,
+    client_id TEXT NOT NULL,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS intent_rules_client ON intent_rules (client_id);
+
+CREATE TABLE IF NOT EXISTS port_counter (
+    id TEXT PRIMARY KEY,
+    next_port INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS free_ports (
+    port INTEGER PRIMARY KEY,
+    released_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS free_ports_released ON free_ports (released_at, port);
+"""
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return str(value)
+
+
+def _object_hook(value: dict):
+    if len(value) == 1 and "$date" in value:
+        return datetime.fromisoformat(value["$date"])
+    return value
+
+
+def dumps(document: dict) -> str:
+    return json.dumps({key: value for key, value in document.items() if key != "_id"}, default=_default)
+
+
+def loads(data: str) -> dict:
+    return json.loads(data, object_hook=_object_hook)
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class SQLiteDatabase:
+    """sqlite3 connections per worker thread, WAL journal, one writer at a time"""
+
+    def __init__(self, path: str = SQLITE_PATH, workers: int = SQLITE_WORKERS):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sqlite")
+        self.local = threading.local()
+        self.write_lock = threading.Lock()
+        self.connections: List[sqlite3.Connection] = []
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=5000")
+            self.local.connection = connection
+            self.connections.append(connection)
+        return connection
+
+    def _read(self, fn, args):
+        return fn(self._connection(), *args)
+
+    def _write(self, fn, args):
+        connection = self._connection()
+        with self.write_lock, connection:
+            return fn(connection, *args)
+
+    async def _run(self, call, fn):
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+        finally:
+            # Named after the repository method, e.g. sqlite:SQLiteClientRepository.get
+            query_metrics.record(f"sqlite:{fn.__qualname__.split('.<locals>')[0]}", (time.perf_counter() - started) * 1000)
+
+    async def read(self, fn, *args):
+        return await self._run(partial(self._read, fn, args), fn)
+
+    async def write(self, fn, *args):
+        """Run `fn` in a transaction"""
+        return await self._run(partial(self._write, fn, args), fn)
+
+    async def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        await self.write(lambda connection: connection.executescript(SCHEMA))
+        logger.info(f"SQLite storage ready at {self.path}")
+
+    async def close(self):
+        def close_all():
+            for connection in self.connections:
+                connection.close()
+            self.connections.clear()
+        await asyncio.get_running_loop().run_in_executor(self.executor, close_all)
+        self.executor.shutdown(wait=False)
+
+
+class SQLiteClientRepository:
+    def __init__(self, sqlite: SQLiteDatabase):
+        self.sqlite = sqlite
+
+    @staticmethod
+    def _row_values(client: dict) -> tuple:
+        return (client["id"], client.get("unique_url"), client.get("name", ""), client.get("status"), client.get("connected_phone"), dumps(client))
+
+    async def get(self, client_id: str) -> Optional[dict]:
+        row = await self.sqlite.read(lambda c: c.execute("SELECT data FROM clients WHERE id = ?", (client_id,)).fetchone())
+        return loads(row[0]) if row else None
+
+    async def get_by_url(self, unique_url: str) -> Optional[dict]:
+        row = await self.sqlite.read(lambda c: c.execute("SELECT data FROM clients WHERE unique_url = ?", (unique_url,)).fetchone())
+        return loads(row[0]) if row else None
+
+    async def insert(self, client: dict):
+        await self.sqlite.write(lambda c: c.execute(
+            "INSERT INTO clients (id, unique_url, name, status, connected_phone, data) VALUES (?, ?, ?, ?, ?, ?)",
+            self._row_values(client)
+        ))
+
+    async def update(self, client_id: str, fields: dict) -> bool:
+        def update(c):
+            row = c.execute("SELECT data FROM clients WHERE id = ?", (client_id,)).fetchone()
+            if not row:
+                return False
+            client = {**loads(row[0]), **fields}
+            c.execute(
+                "UPDATE clients SET unique_url = ?, name = ?, status = ?, connected_phone = ?, data = ? WHERE id = ?",
+                self._row_values(client)[1:] + (client_id,)
+            )
+            return True
+        return await self.sqlite.write(update)
+
+    async def update_where(self, field: str, values: list, fields: dict) -> int:
+        def update(c):
+            updated = 0
+            for client_id, data in c.execute("SELECT id, data FROM clients").fetchall():
+                client = loads(data)
+                if client.get(field) in values:
+                    client.update(fields)
+                    c.execute(
+                        "UPDATE clients SET unique_url = ?, name = ?, status = ?, connected_phone = ?, data = ? WHERE id = ?",
+                        self._row_values(client)[1:] + (client_id,)
+                    )
+                    updated += 1
+            return updated
+        return await self.sqlite.write(update)
+
+    async def delete(self, client_id: str) -> bool:
+        cursor = await self.sqlite.write(lambda c: c.execute("DELETE FROM clients WHERE id = ?", (client_id,)))
+        return cursor.rowcount > 0
+
+    async def find_by_status(self, status: str) -> List[dict]:
+        rows = await self.sqlite.read(lambda c: c.execute("SELECT data FROM clients WHERE status = ?", (status,)).fetchall())
+        return [loads(row[0]) for row in rows]
+
+    async def highest_port(self) -> Optional[int]:
+        row = await self.sqlite.read(lambda c: c.execute("SELECT MAX(json_extract(data, '$.whatsapp_port')) FROM clients").fetchone())
+        return row[0]
+
+    async def port_in_use(self, port: int) -> bool:
+        row = await self.sqlite.read(lambda c: c.execute(
+            "SELECT 1 FROM clients WHERE json_extract(data, '$.whatsapp_port') = ? LIMIT 1", (port,)
+        ).fetchone())
+        return row is not None
+
+    async def names(self, client_ids: List[str]) -> dict:
+        if not client_ids:
+            return {}
+        placeholders = ", ".join("?" * len(client_ids))
+        rows = await self.sqlite.read(lambda c: c.execute(f"SELECT id, name FROM clients WHERE id IN ({placeholders})", list(client_ids)).fetchall())
+        return dict(rows)
+
+    async def list_page(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        connected: Optional[bool] = None,
+        name_prefix: Optional[str] = None,
+        fields: Tuple[str, ...] = CLIENT_LIST_FIELDS,
+        include_message_counts: bool = False
+    ) -> dict:
+        conditions, params = [], []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if connected is not None:
+            conditions.append("COALESCE(connected_phone, '') != ''" if connected else "COALESCE(connected_phone, '') = ''")
+        if name_prefix:
+            # Prefix as an index range, case-sensitive like the Mongo listing
+            conditions.append("name >= ? AND name < ?")
+            params += [name_prefix, name_prefix + "\U0010ffff"]
+        if cursor:
+            name, client_id = decode_client_cursor(cursor)
+            conditions.append("(name > ? OR (name = ? AND id > ?))")
+            params += [name, name, client_id]
+
+        count = "(SELECT COUNT(*) FROM messages WHERE collection = 'client_messages' AND client_id = clients.id)" if include_message_counts else "NULL"
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT data, {count} FROM clients {where} ORDER BY name, id LIMIT ?"
+
+        rows = await self.sqlite.read(lambda c: c.execute(query, params + [limit + 1]).fetchall())
+        has_more = len(rows) > limit
+
+        clients = []
+        for data, message_count in rows[:limit]:
+            document = loads(data)
+            client = {field: document[field] for field in fields if field in document}
+            if "openai_api_key" in client:
+                client["openai_api_key"] = mask_api_key(client["openai_api_key"])
+            if include_message_counts:
+                client["message_count"] = message_count
+            clients.append(client)
+
+        return {
+            "clients": clients,
+            "next_cursor": encode_client_cursor(clients[-1]) if has_more else None
+        }
+
+    async def totals(self) -> dict:
+        rows = await self.sqlite.read(lambda c: c.execute(
+            "SELECT status, COUNT(*), SUM(COALESCE(connected_phone, '') != '') FROM clients GROUP BY status"
+        ).fetchall())
+        return {
+            "total": sum(row[1] for row in rows),
+            "by_status": {row[0]: row[1] for row in rows},
+            "connected": sum(row[2] or 0 for row in rows)
+        }
+
+
+class SQLitePauseRepository:
+    def __init__(self, sqlite: SQLiteDatabase):
+        self.sqlite = sqlite
+
+    async def is_paused(self, client_id: str, phone_number: str) -> bool:
+        row = await self.sqlite.read(lambda c: c.execute(
+            "SELECT 1 FROM paused_conversations WHERE client_id = ? AND "
+            "(phone_number = ? OR (phone_number = 'ALL' AND paused_by = 'global')) LIMIT 1",
+            (client_id, phone_number)
+        ).fetchone())
+        return row is not None
+
+    async def get(self, client_id: str, phone_number: str) -> Optional[dict]:
+        row = await self.sqlite.read(lambda c: c.execute(
+            "SELECT data FROM paused_conversations WHERE client_id = ? AND phone_number = ?", (client_id, phone_number)
+        ).fetchone())
+        return loads(row[0]) if row else None
+
+    async def add(self, pause: dict):
+        await self.sqlite.write(lambda c: c.execute(
+            "INSERT OR IGNORE INTO paused_conversations (client_id, phone_number, paused_by, data) VALUES (?, ?, ?, ?)",
+            (pause["client_id"], pause["phone_number"], pause.get("paused_by"), dumps(pause))
+        ))
+
+    async def remove(self, client_id: str, phone_number: str) -> int:
+        cursor = await self.sqlite.write(lambda c: c.execute(
+            "DELETE FROM paused_conversations WHERE client_id = ? AND phone_number = ?", (client_id, phone_number)
+        ))
+        return cursor.rowcount
+
+    async def remove_all(self, client_id: str) -> int:
+        cursor = await self.sqlite.write(lambda c: c.execute("DELETE FROM paused_conversations WHERE client_id = ?", (client_id,)))
+        return cursor.rowcount
+
+    async def count_conversations(self, client_id: str) -> int:
+        row = await self.sqlite.read(lambda c: c.execute(
+            "SELECT COUNT(*) FROM paused_conversations WHERE client_id = ? AND phone_number != 'ALL'", (client_id,)
+        ).fetchone())
+        return row[0]
+
+    async def list(self, client_id: str) -> List[dict]:
+        rows = await self.sqlite.read(lambda c: c.execute(
+            "SELECT data FROM paused_conversations WHERE client_id = ?", (client_id,)
+        ).fetchall())
+        return [loads(row[0]) for row in rows]
+
+
+class SQLiteThreadRepository:
+    def __init__(self, sqlite: SQLiteDatabase):
+        self.sqlite = sqlite
+
+    async def get(self, client_id: str, phone_number: str) -> Optional[dict]:
+        row = await self.sqlite.read(lambda c: c.execute(
+            "SELECT data FROM openai_threads WHERE client_id = ? AND phone_number = ?", (client_id, phone_number)
+        ).fetchone())
+        return loads(row[0]) if row else None
+
+    async def create(self, client_id: str, phone_number: str, thread_id: str):
+        now = datetime.utcnow()
+        thread = {
+            "client_id": client_id,
+            "phone_number": phone_number,
+            "thread_id": thread_id,
+            "approx_tokens": 0,
+            "created_at": now,
+            "last_used": now
+        }
+        await self.sqlite.write(lambda c: c.execute(
+            "INSERT OR REPLACE INTO openai_threads (client_id, phone_number, thread_id, approx_tokens, data) VALUES (?, ?, ?, 0, ?)",
+            (client_id, phone_number, thread_id, dumps(thread))
+        ))
+
+    async def _modify(self, client_id: str, phone_number: str, thread_id: str, change) -> Optional[dict]:
+        """Apply `change` to the stored thread if it is still `thread_id`"""
+        def modify(c):
+            row = c.execute(
+                "SELECT data FROM openai_threads WHERE client_id = ? AND phone_number = ? AND thread_id = ?",
+                (client_id, phone_number, thread_id)
+            ).fetchone()
+            if not row:
+                return None
+            thread = loads(row[0])
+            change(thread)
+            c.execute(
+                "UPDATE openai_threads SET thread_id = ?, approx_tokens = ?, data = ? WHERE client_id = ? AND phone_number = ?",
+                (thread["thread_id"], thread.get("approx_tokens", 0), dumps(thread), client_id, phone_number)
+            )
+            return thread
+        return await self.sqlite.write(modify)
+
+    async def record_usage(self, client_id: str, phone_number: str, thread_id: str, set_tokens: Optional[int] = None, add_tokens: int = 0) -> int:
+        def change(thread):
+            thread["approx_tokens"] = set_tokens if set_tokens is not None else thread.get("approx_tokens", 0) + add_tokens
+            thread["last_used"] = datetime.utcnow()
+        thread = await self._modify(client_id, phone_number, thread_id, change)
+        return (thread or {}).get("approx_tokens", 0)
+
+    async def swap(self, client_id: str, phone_number: str, old_thread_id: str, new_thread_id: str, approx_tokens: int) -> bool:
+        def change(thread):
+            thread["thread_id"] = new_thread_id
+            thread["approx_tokens"] = approx_tokens
+            thread["rotated_at"] = datetime.utcnow()
+            thread["previous_thread_ids"] = thread.get("previous_thread_ids", []) + [old_thread_id]
+            thread["rotations"] = thread.get("rotations", 0) + 1
+        return await self._modify(client_id, phone_number, old_thread_id, change) is not None
+
+    async def delete(self, client_id: str, phone_number: str):
+        await self.sqlite.write(lambda c: c.execute(
+            "DELETE FROM openai_threads WHERE client_id = ? AND phone_number = ?", (client_id, phone_number)
+        ))
+
+    async def delete_unused_before(self, cutoff: datetime) -> int:
+        def delete(c):
+            stale = [
+                (thread["client_id"], thread["phone_number"])
+                for thread in (loads(row[0]) for row in c.execute("SELECT data FROM openai_threads").fetchall())
+                if (thread.get("last_used") or thread.get("created_at") or cutoff) < cutoff
+            ]
+            c.executemany("DELETE FROM openai_threads WHERE client_id = ? AND phone_number = ?", stale)
+            return len(stale)
+        return await self.sqlite.write(delete)
+
+    async def largest(self, limit: int = 10) -> List[dict]:
+        rows = await self.sqlite.read(lambda c: c.execute(
+            "SELECT data FROM openai_threads ORDER BY approx_tokens DESC LIMIT ?", (limit,)
+        ).fetchall())
+        fields = ("client_id", "phone_number", "thread_id", "approx_tokens", "rotations")
+        return [{key: value for key, value in loads(row[0]).items() if key in fields} for row in rows]
+
+
+class SQLiteMessageRepository:
+    def __init__(self, sqlite: SQLiteDatabase):
+        self.sqlite = sqlite
+
+    async def insert_many(self, collection: str, documents: List[dict], skip_existing: bool = False):
+        """Duplicates of already stored messages (same id) are always ignored, so retries are safe"""
+        rows = [
+            (collection, document.get("id"), document.get("client_id"), document.get("phone_number"),
+             document.get("timestamp"), _iso(document.get("created_at")), dumps(document))
+            for document in documents
+        ]
+        await self.sqlite.write(lambda c: c.executemany(
+            "INSERT OR IGNORE INTO messages (collection, id, client_id, phone_number, timestamp, created_at, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        ))
+
+    async def recent(self, client_id: str, phone_number: str, limit: int) -> List[dict]:
+        rows = await self.sqlite.read(lambda c: c.execute(
+            "SELECT data FROM messages WHERE collection = 'client_messages' AND client_id = ? AND phone_number = ? "
+            "ORDER BY timestamp DESC, seq DESC LIMIT ?",
+            (client_id, phone_number, limit)
+        ).fetchall())
+        fields = ("id", "message", "is_from_ai", "created_at")
+        return [{key: value for key, value in loads(row[0]).items() if key in fields} for row in rows]
+
+    @staticmethod
+    def _scope_sql(collection: str, scope: dict) -> Tuple[List[str], list]:
+        conditions, params = ["collection = ?"], [collection]
+        for field in ("client_id", "phone_number"):
+            if field in scope:
+                conditions.append(f"{field} = ?")
+                params.append(scope[field])
+        return conditions, params
+
+    @staticmethod
+    def _encode_cursor(timestamp, seq: int) -> str:
+        return base64.urlsafe_b64encode(json.dumps([timestamp, seq]).encode()).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[int, int]:
+        try:
+            timestamp, seq = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            return timestamp, int(seq)
+        except Exception:
+            raise InvalidCursor("Invalid cursor")
+
+    async def _page_rows(self, collection: str, scope: dict, limit: int, cursor: Optional[str], descending: bool) -> list:
+        conditions, params = self._scope_sql(collection, scope)
+        if cursor:
+            timestamp, seq = self._decode_cursor(cursor)
+            op = "<" if descending else ">"
+            conditions.append(f"(timestamp {op} ? OR (timestamp = ? AND seq {op} ?))")
+            params += [timestamp, timestamp, seq]
+        direction = "DESC" if descending else "ASC"
+        query = f"SELECT seq, timestamp, data FROM messages WHERE {' AND '.join(conditions)} ORDER BY timestamp {direction}, seq {direction} LIMIT ?"
+        return await self.sqlite.read(lambda c: c.execute(query, params + [limit]).fetchall())
+
+    @staticmethod
+    def _output(seq: int, data: str, fields: Tuple[str, ...]) -> dict:
+        document = loads(data)
+        document["_id"] = str(seq)
+        return {field: document[field] for field in fields if field in document}
+
+    async def history_page(self, collection: str, scope: dict, limit: int, cursor: Optional[str], descending: bool = True, fields: Tuple[str, ...] = DEFAULT_HISTORY_FIELDS) -> dict:
+        rows = await self._page_rows(collection, scope, limit + 1, cursor, descending)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "messages": [self._output(seq, data, fields) for seq, _, data in rows],
+            "next_cursor": self._encode_cursor(rows[-1][1], rows[-1][0]) if has_more else None
+        }
+
+    async def stream_history(self, collection: str, scope: dict, limit: Optional[int], cursor: Optional[str], descending: bool = True, fields: Tuple[str, ...] = DEFAULT_HISTORY_FIELDS) -> AsyncIterator[str]:
+        if cursor:
+            self._decode_cursor(cursor)  # Fail before the response starts
+
+        async def lines():
+            position, remaining = cursor, limit
+            while remaining is None or remaining > 0:
+                batch = STREAM_BATCH_SIZE if remaining is None else min(STREAM_BATCH_SIZE, remaining)
+                rows = await self._page_rows(collection, scope, batch, position, descending)
+                for seq, _, data in rows:
+                    yield json.dumps(jsonable_encoder(self._output(seq, data, fields)), ensure_ascii=False) + "\n"
+                if len(rows) < batch:
+                    return
+                position = self._encode_cursor(rows[-1][1], rows[-1][0])
+                if remaining is not None:
+                    remaining -= len(rows)
+
+        return lines()
+
+    async def count(self, collection: str, scope: dict, since: Optional[datetime] = None) -> int:
+        conditions, params = self._scope_sql(collection, scope)
+        if since:
+            conditions.append("created_at >= ?")
+            params.append(since.isoformat())
+        row = await self.sqlite.read(lambda c: c.execute(f"SELECT COUNT(*) FROM messages WHERE {' AND '.join(conditions)}", params).fetchone())
+        return row[0]
+
+    async def unique_phones(self, collection: str, scope: dict) -> int:
+        conditions, params = self._scope_sql(collection, scope)
+        row = await self.sqlite.read(lambda c: c.execute(
+            f"SELECT COUNT(DISTINCT phone_number) FROM messages WHERE {' AND '.join(conditions)}", params
+        ).fetchone())
+        return row[0]
+
+    async def delete_for_client(self, client_id: str):
+        await self.sqlite.write(lambda c: c.execute(
+            "DELETE FROM messages WHERE collection = 'client_messages' AND client_id = ?", (client_id,)
+        ))
+
+    async def delete_before(self, collection: str, cutoff: datetime) -> int:
+        cursor = await self.sqlite.write(lambda c: c.execute(
+            "DELETE FROM messages WHERE collection = ? AND created_at < ?", (collection, cutoff.isoformat())
+        ))
+        return cursor.rowcount
+
+
+class SQLiteToolRepository:
+    def __init__(self, sqlite: SQLiteDatabase):
+        self.sqlite = sqlite
+
+    async def list(self, client_id: str) -> List[dict]:
+        rows = await self.sqlite.read(lambda c: c.execute("SELECT data FROM client_tools WHERE client_id = ?", (client_id,)).fetchall())
+        return [loads(row[0]) for row in rows]
+
+    async def upsert(self, tool: dict):
+        await self.sqlite.write(lambda c: c.execute(
+            "INSERT OR REPLACE INTO client_tools (client_id, name, data) VALUES (?, ?, ?)",
+            (tool["client_id"], tool["name"], dumps(tool))
+        ))
+
+    async def delete(self, client_id: str, name: str) -> int:
+        cursor = await self.sqlite.write(lambda c: c.execute("DELETE FROM client_tools WHERE client_id = ? AND name = ?", (client_id, name)))
+        return cursor.rowcount
+
+    async def delete_for_client(self, client_id: str):
+        await self.sqlite.write(lambda c: c.execute("DELETE FROM client_tools WHERE client_id = ?", (client_id,)))
+
+
+class SQLiteIntentRuleRepository:
+    def __init__(self, sqlite: SQLiteDatabase):
+        self.sqlite = sqlite
+
+    async def list(self, client_id: str) -> List[dict]:
+        rows = await self.sqlite.read(lambda c: c.execute(
+            "SELECT data, hit_count FROM intent_rules WHERE client_id = ? ORDER BY rowid", (client_id,)
+        ).fetchall())
+        return [{**loads(data), "hit_count": hit_count} for data, hit_count in rows]
+
+    async def replace(self, client_id: str, rules: List[dict]):
+        def replace(c):
+            c.execute("DELETE FROM intent_rules WHERE client_id = ?", (client_id,))
+            c.executemany(
+                "INSERT INTO intent_rules (id, client_id, hit_count, data) VALUES (?, ?, ?, ?)",
+                [(rule["id"], client_id, rule.get("hit_count", 0), dumps(rule)) for rule in rules]
+            )
+        await self.sqlite.write(replace)
+
+    async def add_hits(self, hits: Dict[str, int]):
+        await self.sqlite.write(lambda c: c.executemany(
+            "UPDATE intent_rules SET hit_count = hit_count + ? WHERE id = ?",
+            [(count, rule_id) for rule_id, count in hits.items()]
+        ))
+
+    async def delete_for_client(self, client_id: str):
+        await self.sqlite.write(lambda c: c.execute("DELETE FROM intent_rules WHERE client_id = ?", (client_id,)))
+
+
+class SQLitePortRepository:
+    """Single-statement updates with RETURNING, so concurrent allocations never share a port"""
+
+    def __init__(self, sqlite: SQLiteDatabase):
+        self.sqlite = sqlite
+
+    async def seed(self, start: int):
+        await self.sqlite.write(lambda c: c.execute(
+            "INSERT INTO port_counter (id, next_port) VALUES (?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET next_port = MAX(next_port, excluded.next_port)",
+            (PORT_COUNTER_ID, start)
+        ))
+
+    async def take_next(self) -> Optional[int]:
+        rows = await self.sqlite.write(lambda c: c.execute(
+            "UPDATE port_counter SET next_port = next_port + 1 WHERE id = ? RETURNING next_port - 1", (PORT_COUNTER_ID,)
+        ).fetchall())
+        return rows[0][0] if rows else None
+
+    async def take_free(self, released_before: datetime) -> Optional[int]:
+        rows = await self.sqlite.write(lambda c: c.execute(
+            "DELETE FROM free_ports WHERE port = "
+            "(SELECT port FROM free_ports WHERE released_at <= ? ORDER BY port LIMIT 1) RETURNING port",
+            (released_before.isoformat(),)
+        ).fetchall())
+        return rows[0][0] if rows else None
+
+    async def release(self, port: int):
+        await self.sqlite.write(lambda c: c.execute(
+            "INSERT OR IGNORE INTO free_ports (port, released_at) VALUES (?, ?)", (port, datetime.utcnow().isoformat())
+        ))
+
+    async def stats(self) -> dict:
+        def stats(c):
+            counter = c.execute("SELECT next_port FROM port_counter WHERE id = ?", (PORT_COUNTER_ID,)).fetchone()
+            free = c.execute("SELECT COUNT(*) FROM free_ports").fetchone()
+            return {"next_port": counter[0] if counter else None, "free_ports": free[0]}
+        return await self.sqlite.read(stats)
+
+
+class SQLiteStorage:
+    name = "sqlite"
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.sqlite = SQLiteDatabase(path)
+        self.clients = SQLiteClientRepository(self.sqlite)
+        self.pauses = SQLitePauseRepository(self.sqlite)
+        self.threads = SQLiteThreadRepository(self.sqlite)
+        self.messages = SQLiteMessageRepository(self.sqlite)
+        self.tools = SQLiteToolRepository(self.sqlite)
+        self.intent_rules = SQLiteIntentRuleRepository(self.sqlite)
+        self.ports = SQLitePortRepository(self.sqlite)
+
+    async def open(self):
+        await self.sqlite.open()
+
+    async def close(self):
+        await self.sqlite.close()
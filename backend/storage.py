@@ -0,0 +1,386 @@
+"""
+Storage repositories for clients, pauses, threads and conversation messages
+The message path, the pause commands and client administration read and write
+these entities through `storage`. STORAGE_BACKEND=mongo (default) keeps them
+in MongoDB; STORAGE_BACKEND=sqlite keeps them in an embedded SQLite database
+(sqlite_storage.py) for single-host installs, along with client tools, intent
+rules and WhatsApp port allocation. Usage and the other collections stay in MongoDB. In MongoDB, stats, listings and history
+pages read through the analytics database (MONGO_ANALYTICS_READ_PREFERENCE);
+client, pause and thread lookups on the reply path always read the primary
+"""
+import os
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from database import get_database_direct, get_analytics_database
+from message_collections import TIME_FIELD, is_timeseries, message_filter, meta_field, to_storage
+from message_history import history_page, stream_history, DEFAULT_HISTORY_FIELDS
+from client_listing import list_clients, client_totals, client_filter, CLIENT_LIST_FIELDS
+
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo').lower()
+
+PORT_COUNTER_ID = "whatsapp_ports"
+
+
+class MongoClientRepository:
+    async def get(self, client_id: str) -> Optional[dict]:
+        db = await get_database_direct()
+        return await db.clients.find_one({"id": client_id}, {"_id": 0})
+
+    async def get_by_url(self, unique_url: str) -> Optional[dict]:
+        db = await get_database_direct()
+        return await db.clients.find_one({"unique_url": unique_url}, {"_id": 0})
+
+    async def insert(self, client: dict):
+        db = await get_database_direct()
+        await db.clients.insert_one(dict(client))
+
+    async def update(self, client_id: str, fields: dict) -> bool:
+        """Set fields of a client; False if it does not exist"""
+        db = await get_database_direct()
+        result = await db.clients.update_one({"id": client_id}, {"$set": fields})
+        return result.matched_count > 0
+
+    async def update_where(self, field: str, values: list, fields: dict) -> int:
+        """Set fields of every client whose `field` is one of `values`"""
+        db = await get_database_direct()
+        result = await db.clients.update_many({field: {"$in": values}}, {"$set": fields})
+        return result.modified_count
+
+    async def delete(self, client_id: str) -> bool:
+        db = await get_database_direct()
+        result = await db.clients.delete_one({"id": client_id})
+        return result.deleted_count > 0
+
+    async def find_by_status(self, status: str) -> List[dict]:
+        db = await get_database_direct()
+        return await db.clients.find({"status": status}, {"_id": 0}).to_list(length=None)
+
+    async def highest_port(self) -> Optional[int]:
+        db = await get_database_direct()
+        highest = await db.clients.find_one(
+            {"whatsapp_port": {"$exists": True}},
+            {"_id": 0, "whatsapp_port": 1},
+            sort=[("whatsapp_port", -1)]
+        )
+        return highest["whatsapp_port"] if highest else None
+
+    async def port_in_use(self, port: int) -> bool:
+        db = await get_database_direct()
+        return await db.clients.find_one({"whatsapp_port": port}, {"_id": 1}) is not None
+
+    async def names(self, client_ids: List[str]) -> dict:
+        """Client names by id, in one query"""
+        db = await get_analytics_database()
+        clients = await db.clients.find({"id": {"$in": client_ids}}, {"_id": 0, "id": 1, "name": 1}).to_list(length=None)
+        return {client["id"]: client["name"] for client in clients}
+
+    async def list_page(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        connected: Optional[bool] = None,
+        name_prefix: Optional[str] = None,
+        fields: Tuple[str, ...] = CLIENT_LIST_FIELDS,
+        include_message_counts: bool = False
+    ) -> dict:
+        db = await get_analytics_database()
+        return await list_clients(db, limit, cursor, client_filter(status, connected, name_prefix), fields, include_message_counts)
+
+    async def totals(self) -> dict:
+        db = await get_analytics_database()
+        return await client_totals(db)
+
+
+class MongoPauseRepository:
+    async def is_paused(self, client_id: str, phone_number: str) -> bool:
+        """Paused conversation or whole client paused, in one query"""
+        db = await get_database_direct()
+        pause = await db.paused_conversations.find_one(
+            {"client_id": client_id, "$or": [
+                {"phone_number": phone_number},
+                {"phone_number": "ALL", "paused_by": "global"}
+            ]},
+            {"_id": 1}
+        )
+        return pause is not None
+
+    async def get(self, client_id: str, phone_number: str) -> Optional[dict]:
+        db = await get_database_direct()
+        return await db.paused_conversations.find_one({"client_id": client_id, "phone_number": phone_number}, {"_id": 0})
+
+    async def add(self, pause: dict):
+        db = await get_database_direct()
+        await db.paused_conversations.insert_one(dict(pause))
+
+    async def remove(self, client_id: str, phone_number: str) -> int:
+        db = await get_database_direct()
+        result = await db.paused_conversations.delete_one({"client_id": client_id, "phone_number": phone_number})
+        return result.deleted_count
+
+    async def remove_all(self, client_id: str) -> int:
+        db = await get_database_direct()
+        result = await db.paused_conversations.delete_many({"client_id": client_id})
+        return result.deleted_count
+
+    async def count_conversations(self, client_id: str) -> int:
+        """Paused single conversations, not counting a global pause"""
+        db = await get_database_direct()
+        return await db.paused_conversations.count_documents({"client_id": client_id, "phone_number": {"$ne": "ALL"}})
+
+    async def list(self, client_id: str) -> List[dict]:
+        db = await get_database_direct()
+        return await db.paused_conversations.find({"client_id": client_id}, {"_id": 0}).to_list(length=None)
+
+
+class MongoThreadRepository:
+    async def get(self, client_id: str, phone_number: str) -> Optional[dict]:
+        db = await get_database_direct()
+        return await db.openai_threads.find_one({"client_id": client_id, "phone_number": phone_number}, {"_id": 0})
+
+    async def create(self, client_id: str, phone_number: str, thread_id: str):
+        db = await get_database_direct()
+        now = datetime.utcnow()
+        await db.openai_threads.insert_one({
+            "client_id": client_id,
+            "phone_number": phone_number,
+            "thread_id": thread_id,
+            "approx_tokens": 0,
+            "created_at": now,
+            "last_used": now
+        })
+
+    async def record_usage(self, client_id: str, phone_number: str, thread_id: str, set_tokens: Optional[int] = None, add_tokens: int = 0) -> int:
+        """Set or grow a thread's approximate size and return it"""
+        db = await get_database_direct()
+        if set_tokens is not None:
+            update = {"$set": {"approx_tokens": set_tokens, "last_used": datetime.utcnow()}}
+        else:
+            update = {"$inc": {"approx_tokens": add_tokens}, "$set": {"last_used": datetime.utcnow()}}
+        thread = await db.openai_threads.find_one_and_update(
+            {"client_id": client_id, "phone_number": phone_number, "thread_id": thread_id},
+            update,
+            projection={"_id": 0, "approx_tokens": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return (thread or {}).get("approx_tokens", 0)
+
+    async def swap(self, client_id: str, phone_number: str, old_thread_id: str, new_thread_id: str, approx_tokens: int) -> bool:
+        """Replace the conversation's thread only if it is still `old_thread_id`"""
+        db = await get_database_direct()
+        result = await db.openai_threads.update_one(
+            {"client_id": client_id, "phone_number": phone_number, "thread_id": old_thread_id},
+            {
+                "$set": {"thread_id": new_thread_id, "approx_tokens": approx_tokens, "rotated_at": datetime.utcnow()},
+                "$push": {"previous_thread_ids": old_thread_id},
+                "$inc": {"rotations": 1}
+            }
+        )
+        return result.modified_count > 0
+
+    async def delete(self, client_id: str, phone_number: str):
+        db = await get_database_direct()
+        await db.openai_threads.delete_one({"client_id": client_id, "phone_number": phone_number})
+
+    async def delete_unused_before(self, cutoff: datetime) -> int:
+        """Forget threads not used since `cutoff` (threads from before last_used was tracked use created_at)"""
+        db = await get_database_direct()
+        result = await db.openai_threads.delete_many({
+            "$or": [
+                {"last_used": {"$lt": cutoff}},
+                {"last_used": {"$exists": False}, "created_at": {"$lt": cutoff}}
+            ]
+        })
+        return result.deleted_count
+
+    async def largest(self, limit: int = 10) -> List[dict]:
+        db = await get_analytics_database()
+        return await db.openai_threads.find(
+            {},
+            {"_id": 0, "client_id": 1, "phone_number": 1, "thread_id": 1, "approx_tokens": 1, "rotations": 1}
+        ).sort("approx_tokens", -1).limit(limit).to_list(length=limit)
+
+
+class MongoMessageRepository:
+    async def insert_many(self, collection: str, documents: List[dict], skip_existing: bool = False):
+        """Unordered bulk insert; pymongo's BulkWriteError reports partial failures
+
+        skip_existing re-sends a batch whose earlier write may have landed. Regular
+        collections reject the copies by their unique _id; time-series collections
+        have no unique index, so the message ids already stored are looked up first
+        """
+        db = await get_database_direct()
+        if not (skip_existing and is_timeseries()):
+            await db[collection].insert_many([to_storage(document) for document in documents], ordered=False)
+            return
+
+        ids = [document["id"] for document in documents]
+        oldest = min(document[TIME_FIELD] for document in documents)
+        existing = set(await db[collection].distinct("id", {"id": {"$in": ids}, TIME_FIELD: {"$gte": oldest}}))
+        kept = [index for index, document in enumerate(documents) if document["id"] not in existing]
+        if not kept:
+            return
+        try:
+            await db[collection].insert_many([to_storage(documents[index]) for index in kept], ordered=False)
+        except BulkWriteError as e:
+            # Report failures by position in the batch the caller passed
+            for error in e.details.get("writeErrors", []):
+                error["index"] = kept[error["index"]]
+            raise
+
+    async def recent(self, client_id: str, phone_number: str, limit: int) -> List[dict]:
+        """Latest messages of a client conversation, newest first"""
+        db = await get_database_direct()
+        return await db.client_messages.find(
+            message_filter(client_id=client_id, phone_number=phone_number),
+            {"_id": 0, "id": 1, "message": 1, "is_from_ai": 1, "created_at": 1}
+        ).sort([("timestamp", -1), ("_id", -1)]).limit(limit).to_list(length=limit)
+
+    async def history_page(self, collection: str, scope: dict, limit: int, cursor: Optional[str], descending: bool = True, fields: Tuple[str, ...] = DEFAULT_HISTORY_FIELDS) -> dict:
+        db = await get_analytics_database()
+        return await history_page(db[collection], scope, limit, cursor, descending, fields)
+
+    async def stream_history(self, collection: str, scope: dict, limit: Optional[int], cursor: Optional[str], descending: bool = True, fields: Tuple[str, ...] = DEFAULT_HISTORY_FIELDS) -> AsyncIterator[str]:
+        db = await get_analytics_database()
+        return stream_history(db[collection], scope, limit, cursor, descending, fields)
+
+    async def count(self, collection: str, scope: dict, since: Optional[datetime] = None) -> int:
+        db = await get_analytics_database()
+        query = message_filter(**scope)
+        if since:
+            query["created_at"] = {"$gte": since}
+        return await db[collection].count_documents(query)
+
+    async def unique_phones(self, collection: str, scope: dict) -> int:
+        db = await get_analytics_database()
+        return len(await db[collection].distinct(meta_field("phone_number"), message_filter(**scope)))
+
+    async def delete_for_client(self, client_id: str):
+        db = await get_database_direct()
+        await db.client_messages.delete_many(message_filter(client_id=client_id))
+
+    async def delete_before(self, collection: str, cutoff: datetime) -> int:
+        db = await get_database_direct()
+        result = await db[collection].delete_many({"created_at": {"$lt": cutoff}})
+        return result.deleted_count
+
+
+class MongoToolRepository:
+    async def list(self, client_id: str) -> List[dict]:
+        db = await get_database_direct()
+        return await db.client_tools.find({"client_id": client_id}, {"_id": 0}).to_list(length=None)
+
+    async def upsert(self, tool: dict):
+        """Register a tool, replacing the client's tool of the same name"""
+        db = await get_database_direct()
+        await db.client_tools.replace_one({"client_id": tool["client_id"], "name": tool["name"]}, dict(tool), upsert=True)
+
+    async def delete(self, client_id: str, name: str) -> int:
+        db = await get_database_direct()
+        result = await db.client_tools.delete_one({"client_id": client_id, "name": name})
+        return result.deleted_count
+
+    async def delete_for_client(self, client_id: str):
+        db = await get_database_direct()
+        await db.client_tools.delete_many({"client_id": client_id})
+
+
+class MongoIntentRuleRepository:
+    async def list(self, client_id: str) -> List[dict]:
+        """A client's rules in the order they were saved (the first matching keyword wins)"""
+        db = await get_database_direct()
+        return await db.intent_rules.find({"client_id": client_id}, {"_id": 0}).to_list(length=None)
+
+    async def replace(self, client_id: str, rules: List[dict]):
+        db = await get_database_direct()
+        await db.intent_rules.delete_many({"client_id": client_id})
+        if rules:
+            await db.intent_rules.insert_many([dict(rule) for rule in rules])
+
+    async def add_hits(self, hits: Dict[str, int]):
+        """Add hit counts per rule id, in one bulk write"""
+        db = await get_database_direct()
+        await db.intent_rules.bulk_write(
+            [UpdateOne({"id": rule_id}, {"$inc": {"hit_count": count}}) for rule_id, count in hits.items()],
+            ordered=False
+        )
+
+    async def delete_for_client(self, client_id: str):
+        db = await get_database_direct()
+        await db.intent_rules.delete_many({"client_id": client_id})
+
+
+class MongoPortRepository:
+    """Port counter and free list, both taken with findAndModify so replicas never share a port"""
+
+    async def seed(self, start: int):
+        """Move the counter up to `start` if it is behind (idempotent across replicas)"""
+        db = await get_database_direct()
+        await db.port_allocator.update_one({"_id": PORT_COUNTER_ID}, {"$max": {"next_port": start}}, upsert=True)
+
+    async def take_next(self) -> Optional[int]:
+        """Counter value before incrementing it"""
+        db = await get_database_direct()
+        counter = await db.port_allocator.find_one_and_update(
+            {"_id": PORT_COUNTER_ID},
+            {"$inc": {"next_port": 1}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        return counter.get("next_port") if counter else None
+
+    async def take_free(self, released_before: datetime) -> Optional[int]:
+        """Lowest port released before the given time, removed from the free list"""
+        db = await get_database_direct()
+        released = await db.free_ports.find_one_and_delete(
+            {"released_at": {"$lte": released_before}},
+            sort=[("port", 1)]
+        )
+        return released["port"] if released else None
+
+    async def release(self, port: int):
+        db = await get_database_direct()
+        try:
+            await db.free_ports.insert_one({"port": port, "released_at": datetime.utcnow()})
+        except DuplicateKeyError:
+            pass
+
+    async def stats(self) -> dict:
+        db = await get_database_direct()
+        counter = await db.port_allocator.find_one({"_id": PORT_COUNTER_ID})
+        return {
+            "next_port": (counter or {}).get("next_port"),
+            "free_ports": await db.free_ports.count_documents({})
+        }
+
+
+class MongoStorage:
+    name = "mongo"
+
+    def __init__(self):
+        self.clients = MongoClientRepository()
+        self.pauses = MongoPauseRepository()
+        self.threads = MongoThreadRepository()
+        self.messages = MongoMessageRepository()
+        self.tools = MongoToolRepository()
+        self.intent_rules = MongoIntentRuleRepository()
+        self.ports = MongoPortRepository()
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+def create_storage():
+    if STORAGE_BACKEND == "sqlite":
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage()
+    return MongoStorage()
+
+
+# Global storage instance
+storage = create_storage()
@@ -0,0 +1,154 @@
+"""
+Thread lifecycle manager for OpenAI Assistants conversations
+Tracks approximate context size per thread and, past a threshold, rotates the
+conversation to a new thread seeded with a compact summary of the old one
+"""
+import asyncio
+import os
+import logging
+from typing import Optional, Set
+from context_window import estimate_tokens
+from models import Client
+from llm_backend import get_llm_backend, AssistantsBackend
+from openai_scheduler import PRIORITY_BACKGROUND
+from usage_metering import usage_meter
+from storage import storage
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Resume la siguiente conversación entre un usuario y un asistente en un máximo de 10 viñetas. "
+    "Conserva nombres, datos de contacto, fechas, montos, compromisos y preguntas pendientes. "
+    "Responde solo con el resumen."
+)
+
+
+class ThreadLifecycleManager:
+    def __init__(self):
+        self.rotation_threshold = int(os.environ.get('THREAD_ROTATION_TOKENS', '12000'))
+        self.summary_model = os.environ.get('THREAD_SUMMARY_MODEL', 'gpt-4o-mini')
+        self.summary_source_messages = int(os.environ.get('THREAD_SUMMARY_SOURCE_MESSAGES', '30'))
+        self.rotating: Set[str] = set()  # thread ids being rotated
+        self.rotations = 0
+        self.failed_rotations = 0
+
+    async def record_usage(
+        self,
+        client: Client,
+        phone_number: str,
+        thread_id: str,
+        message: str,
+        reply: str,
+        prompt_tokens: Optional[int] = None
+    ):
+        """Update a thread's approximate size after a run and rotate it when too large"""
+        try:
+            reply_tokens = estimate_tokens(reply)
+
+            if prompt_tokens:
+                # The run's prompt already contains the whole thread
+                approx_tokens = await storage.threads.record_usage(
+                    client.id, phone_number, thread_id, set_tokens=prompt_tokens + reply_tokens
+                )
+            else:
+                approx_tokens = await storage.threads.record_usage(
+                    client.id, phone_number, thread_id, add_tokens=estimate_tokens(message) + reply_tokens
+                )
+
+            if approx_tokens >= self.rotation_threshold and thread_id not in self.rotating:
+                # Rotate in the background so this reply is not delayed
+                asyncio.create_task(self.rotate_thread(client, phone_number, thread_id))
+
+        except Exception as e:
+            logger.error(f"Error recording thread usage for {thread_id}: {str(e)}")
+
+    async def rotate_thread(self, client: Client, phone_number: str, thread_id: str) -> Optional[str]:
+        """Replace a thread with a new one seeded with a summary of the old conversation"""
+        if thread_id in self.rotating:
+            return None
+        self.rotating.add(thread_id)
+
+        try:
+            # Housekeeping never competes with live replies
+            backend = get_llm_backend(client.openai_api_key, client.id, PRIORITY_BACKGROUND)
+
+            summary = await self._summarize_thread(backend, thread_id)
+
+            new_thread = await backend.create_thread(messages=[{
+                "role": "user",
+                "content": f"Contexto de la conversación anterior (no responder a este mensaje):\n{summary}"
+            }])
+
+            # Swap only if nobody replaced the thread meanwhile
+            swapped = await storage.threads.swap(
+                client.id, phone_number, thread_id, new_thread.id, estimate_tokens(summary)
+            )
+
+            if not swapped:
+                await backend.delete_thread(new_thread.id)
+                return None
+
+            self.rotations += 1
+            logger.info(f"🔄 Rotated thread {thread_id} -> {new_thread.id} for client {client.id}, phone {phone_number}")
+            return new_thread.id
+
+        except Exception as e:
+            self.failed_rotations += 1
+            logger.error(f"Error rotating thread {thread_id}: {str(e)}")
+            return None
+        finally:
+            self.rotating.discard(thread_id)
+
+    async def _summarize_thread(self, backend: AssistantsBackend, thread_id: str) -> str:
+        """Summarize the thread's opening message and latest messages, falling back to an excerpt"""
+        latest = await backend.list_messages(thread_id, limit=self.summary_source_messages)
+        thread_messages = list(reversed(latest.data))
+
+        # A rotated thread opens with the previous summary, which is older than the latest messages
+        first = await backend.list_messages(thread_id, limit=1, order="asc")
+        if first.data and all(thread_message.id != first.data[0].id for thread_message in thread_messages):
+            thread_messages.insert(0, first.data[0])
+
+        lines = []
+        for thread_message in thread_messages:
+            text = " ".join(part.text.value for part in thread_message.content if getattr(part, "text", None))
+            if text:
+                speaker = "Asistente" if thread_message.role == "assistant" else "Usuario"
+                lines.append(f"{speaker}: {text}")
+        transcript = "\n".join(lines)
+
+        try:
+            completion = await backend.chat_completion(
+                self.summary_model,
+                [
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": transcript}
+                ],
+                max_tokens=400
+            )
+            if completion.usage:
+                usage_meter.record(backend.client_id, completion.model, completion.usage.prompt_tokens, completion.usage.completion_tokens)
+            summary = (completion.choices[0].message.content or "").strip()
+            if summary:
+                return summary
+        except Exception as e:
+            logger.warning(f"Summary model unavailable for thread {thread_id}, using excerpt: {str(e)}")
+
+        # Keep the tail of the transcript within roughly 400 tokens
+        return transcript[-1600:]
+
+    async def get_stats(self) -> dict:
+        """Get rotation statistics and the largest tracked threads"""
+        largest = await storage.threads.largest(10)
+
+        return {
+            "rotation_threshold_tokens": self.rotation_threshold,
+            "rotations": self.rotations,
+            "failed_rotations": self.failed_rotations,
+            "rotating_now": len(self.rotating),
+            "largest_threads": largest
+        }
+
+
+# Global thread lifecycle manager instance
+thread_lifecycle = ThreadLifecycleManager()
@@ -0,0 +1,162 @@
+"""
+Tool-call executor for assistant runs in requires_action
+Tenants register handlers per function name (HTTP webhooks or built-in lookups);
+all tool calls of a run execute concurrently with per-call timeouts
+"""
+import asyncio
+import json
+import os
+import time
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo
+import httpx
+from models import Client
+from storage import storage
+
+logger = logging.getLogger(__name__)
+
+# Built-in handlers receive (arguments, context) and return something JSON serializable
+BuiltinHandler = Callable[[dict, dict], Awaitable[object]]
+
+
+class ToolExecutor:
+    def __init__(self):
+        self.builtin_handlers: Dict[str, BuiltinHandler] = {}
+        self.default_timeout = float(os.environ.get('TOOL_CALL_TIMEOUT_SECONDS', '10'))
+        self.calls_by_status: Dict[str, int] = {}
+        self._http_client: Optional[httpx.AsyncClient] = None
+
+    def register_builtin(self, name: str):
+        """Decorator registering a built-in tool handler"""
+        def decorator(handler: BuiltinHandler) -> BuiltinHandler:
+            self.builtin_handlers[name] = handler
+            return handler
+        return decorator
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient()
+        return self._http_client
+
+    async def get_client_tools(self, client_id: str) -> Dict[str, dict]:
+        """Get tools registered by a client, keyed by function name"""
+        tools = await storage.tools.list(client_id)
+        return {tool['name']: tool for tool in tools}
+
+    async def execute_tool_calls(
+        self,
+        client: Client,
+        tool_calls: list,
+        db,
+        phone_number: str,
+        time_budget: Optional[float] = None
+    ) -> List[dict]:
+        """Execute all tool calls of a run concurrently, in the shape submit_tool_outputs expects"""
+        tools = await self.get_client_tools(client.id)
+        context = {"client": client, "phone_number": phone_number, "db": db}
+
+        outputs = await asyncio.gather(*(
+            self._execute_tool_call(tool_call, tools, context, time_budget)
+            for tool_call in tool_calls
+        ))
+
+        return [
+            {"tool_call_id": tool_call.id, "output": output}
+            for tool_call, output in zip(tool_calls, outputs)
+        ]
+
+    async def _execute_tool_call(self, tool_call, tools: Dict[str, dict], context: dict, time_budget: Optional[float]) -> str:
+        """Run one tool call, never raising - failures are reported to the assistant as output"""
+        name = tool_call.function.name
+        client = context["client"]
+        started = time.monotonic()
+
+        try:
+            arguments = json.loads(tool_call.function.arguments or "{}")
+        except json.JSONDecodeError:
+            return self._record("invalid_arguments", json.dumps({"error": "Invalid JSON arguments"}))
+
+        tool = tools.get(name) or ({"name": name, "type": "builtin"} if name in self.builtin_handlers else None)
+        if not tool:
+            logger.warning(f"Client {client.id} has no handler for tool {name}")
+            return self._record("unknown_tool", json.dumps({"error": f"Tool '{name}' is not available"}))
+
+        timeout = tool.get('timeout_seconds') or self.default_timeout
+        if time_budget is not None:
+            timeout = max(min(timeout, time_budget), 0.1)
+
+        try:
+            if tool['type'] == 'webhook':
+                result = await asyncio.wait_for(self._call_webhook(tool, arguments, context), timeout=timeout)
+            else:
+                handler = self.builtin_handlers.get(tool.get('builtin') or name)
+                if not handler:
+                    return self._record("unknown_tool", json.dumps({"error": f"Tool '{name}' is not available"}))
+                result = await asyncio.wait_for(handler(arguments, context), timeout=timeout)
+
+            output = result if isinstance(result, str) else json.dumps(result, default=str, ensure_ascii=False)
+            logger.info(f"Tool {name} for client {client.id} completed in {time.monotonic() - started:.2f}s")
+            return self._record("success", output)
+
+        except asyncio.TimeoutError:
+            logger.warning(f"Tool {name} for client {client.id} timed out after {timeout}s")
+            return self._record("timeout", json.dumps({"error": f"Tool '{name}' timed out"}))
+        except Exception as e:
+            logger.error(f"Tool {name} for client {client.id} failed: {str(e)}")
+            return self._record("error", json.dumps({"error": f"Tool '{name}' failed"}))
+
+    async def _call_webhook(self, tool: dict, arguments: dict, context: dict):
+        """POST the call to the tenant's webhook and return its response body"""
+        response = await self._get_http_client().post(
+            tool['url'],
+            json={
+                "tool": tool['name'],
+                "arguments": arguments,
+                "client_id": context["client"].id,
+                "phone_number": context["phone_number"]
+            },
+            headers=tool.get('headers') or {}
+        )
+        response.raise_for_status()
+
+        try:
+            return response.json()
+        except ValueError:
+            return response.text
+
+    def _record(self, status: str, output: str) -> str:
+        self.calls_by_status[status] = self.calls_by_status.get(status, 0) + 1
+        return output
+
+    def get_stats(self) -> dict:
+        """Get tool execution statistics"""
+        return {
+            "builtin_tools": sorted(self.builtin_handlers),
+            "calls_by_status": dict(self.calls_by_status),
+            "default_timeout_seconds": self.default_timeout
+        }
+
+
+# Global tool executor instance
+tool_executor = ToolExecutor()
+
+
+@tool_executor.register_builtin("get_current_datetime")
+async def get_current_datetime(arguments: dict, context: dict):
+    """Current date and time, Chile by default"""
+    timezone = arguments.get("timezone") or "America/Santiago"
+    try:
+        now = datetime.now(ZoneInfo(timezone))
+    except Exception:
+        timezone = "UTC"
+        now = datetime.now(ZoneInfo(timezone))
+    return {"datetime": now.isoformat(), "timezone": timezone, "weekday": now.strftime("%A")}
+
+
+@tool_executor.register_builtin("get_client_info")
+async def get_client_info(arguments: dict, context: dict):
+    """Public contact information of the business behind the assistant"""
+    client = context["client"]
+    return {"name": client.name, "email": client.email, "whatsapp": client.connected_phone}
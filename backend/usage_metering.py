@@ -0,0 +1,216 @@
+"""
+Token, cost and latency metering per tenant
+Accumulates usage in memory and flushes it in batches into one document per
+client and hour (usage_buckets), so per-tenant and per-day reports read a
+handful of buckets instead of every run
+"""
+import asyncio
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from pymongo import UpdateOne
+from database import get_database_direct
+
+logger = logging.getLogger(__name__)
+
+# USD per million (prompt, completion) tokens; unknown models use the default price
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+DEFAULT_PRICE = (
+    float(os.environ.get('USAGE_DEFAULT_PROMPT_PRICE', '0.15')),
+    float(os.environ.get('USAGE_DEFAULT_COMPLETION_PRICE', '0.60'))
+)
+
+# Reply latency histogram, upper bounds in seconds
+LATENCY_BUCKETS = [(2, "lt_2s"), (5, "lt_5s"), (10, "lt_10s"), (30, "lt_30s")]
+LATENCY_OVERFLOW = "gte_30s"
+
+
+def model_price(model: Optional[str]) -> Tuple[float, float]:
+    """Price for a model, matching dated snapshots (gpt-4o-2024-08-06) to their family"""
+    if not model:
+        return DEFAULT_PRICE
+    # Longest prefix first so gpt-4o-mini does not match gpt-4o
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_PRICES[name]
+    return DEFAULT_PRICE
+
+
+def latency_bucket(seconds: float) -> str:
+    for upper, label in LATENCY_BUCKETS:
+        if seconds < upper:
+            return label
+    return LATENCY_OVERFLOW
+
+
+def hour_start(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class UsageMeter:
+    def __init__(self):
+        self.flush_interval = float(os.environ.get('USAGE_FLUSH_INTERVAL', '15'))
+        self.pending: Dict[Tuple[str, datetime], dict] = {}  # (client_id, hour) -> counters
+        self.running = False
+
+    def record(
+        self,
+        client_id: str,
+        model: Optional[str],
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency_seconds: Optional[float] = None,
+        failed: bool = False
+    ):
+        """Record one OpenAI call; calls with a latency are user replies"""
+        key = (client_id, hour_start(datetime.utcnow()))
+        bucket = self.pending.get(key)
+        if bucket is None:
+            bucket = {"inc": {}, "latency_ms_max": 0}
+            self.pending[key] = bucket
+
+        prompt_price, completion_price = model_price(model)
+        counters = {
+            "requests": 1,
+            "failed": 1 if failed else 0,
+            "prompt_tokens": prompt_tokens or 0,
+            "completion_tokens": completion_tokens or 0,
+            "cost_usd": ((prompt_tokens or 0) * prompt_price + (completion_tokens or 0) * completion_price) / 1_000_000
+        }
+        if latency_seconds is not None:
+            latency_ms = int(latency_seconds * 1000)
+            counters["replies"] = 1
+            counters["latency_ms_total"] = latency_ms
+            counters[f"latency.{latency_bucket(latency_seconds)}"] = 1
+            bucket["latency_ms_max"] = max(bucket["latency_ms_max"], latency_ms)
+
+        inc = bucket["inc"]
+        for field, value in counters.items():
+            if value:
+                inc[field] = inc.get(field, 0) + value
+
+    async def flush(self):
+        """Upsert accumulated counters with a single bulk write"""
+        if not self.pending:
+            return
+
+        pending, self.pending = self.pending, {}
+        operations = [
+            UpdateOne(
+                {"client_id": client_id, "hour": hour},
+                {
+                    "$inc": bucket["inc"],
+                    "$max": {"latency_ms_max": bucket["latency_ms_max"]},
+                    "$setOnInsert": {"day": hour.strftime("%Y-%m-%d")}
+                },
+                upsert=True
+            )
+            for (client_id, hour), bucket in pending.items()
+        ]
+
+        try:
+            db = await get_database_direct()
+            await db.usage_buckets.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Error flushing usage buckets: {str(e)}")
+            # Keep the counters for the next flush
+            for key, bucket in pending.items():
+                current = self.pending.setdefault(key, {"inc": {}, "latency_ms_max": 0})
+                for field, value in bucket["inc"].items():
+                    current["inc"][field] = current["inc"].get(field, 0) + value
+                current["latency_ms_max"] = max(current["latency_ms_max"], bucket["latency_ms_max"])
+
+    async def start_flusher(self):
+        """Periodically persist usage"""
+        self.running = True
+        while self.running:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in usage flusher: {str(e)}")
+
+    async def stop_flusher(self):
+        """Stop the flusher and persist what is left"""
+        self.running = False
+        await self.flush()
+
+    @staticmethod
+    def _totals_group(group_id) -> dict:
+        group = {
+            "_id": group_id,
+            "requests": {"$sum": "$requests"},
+            "replies": {"$sum": "$replies"},
+            "failed": {"$sum": "$failed"},
+            "prompt_tokens": {"$sum": "$prompt_tokens"},
+            "completion_tokens": {"$sum": "$completion_tokens"},
+            "cost_usd": {"$sum": "$cost_usd"},
+            "latency_ms_total": {"$sum": "$latency_ms_total"},
+            "latency_ms_max": {"$max": "$latency_ms_max"}
+        }
+        for _, label in LATENCY_BUCKETS + [(None, LATENCY_OVERFLOW)]:
+            group[f"latency_{label}"] = {"$sum": f"$latency.{label}"}
+        return group
+
+    @staticmethod
+    def _format(row: dict) -> dict:
+        replies = row.get("replies", 0)
+        return {
+            "requests": row.get("requests", 0),
+            "replies": replies,
+            "failed": row.get("failed", 0),
+            "prompt_tokens": row.get("prompt_tokens", 0),
+            "completion_tokens": row.get("completion_tokens", 0),
+            "estimated_cost_usd": round(row.get("cost_usd", 0), 4),
+            "average_latency_ms": round(row.get("latency_ms_total", 0) / replies) if replies else None,
+            "max_latency_ms": row.get("latency_ms_max") or None,
+            "latency_histogram": {
+                label: row.get(f"latency_{label}", 0)
+                for _, label in LATENCY_BUCKETS + [(None, LATENCY_OVERFLOW)]
+            }
+        }
+
+    async def usage_by_client(self, db, days: int = 7) -> list:
+        """Totals per tenant over the last `days`, heaviest first"""
+        since = hour_start(datetime.utcnow() - timedelta(days=days))
+        rows = await db.usage_buckets.aggregate([
+            {"$match": {"hour": {"$gte": since}}},
+            {"$group": self._totals_group("$client_id")},
+            {"$sort": {"cost_usd": -1}}
+        ]).to_list(length=None)
+
+        return [{"client_id": row["_id"], **self._format(row)} for row in rows]
+
+    async def usage_by_day(self, db, client_id: str, days: int = 30) -> list:
+        """Daily totals for one tenant over the last `days`"""
+        since = hour_start(datetime.utcnow() - timedelta(days=days))
+        rows = await db.usage_buckets.aggregate([
+            {"$match": {"client_id": client_id, "hour": {"$gte": since}}},
+            {"$group": self._totals_group("$day")},
+            {"$sort": {"_id": 1}}
+        ]).to_list(length=None)
+
+        return [{"day": row["_id"], **self._format(row)} for row in rows]
+
+    def get_stats(self) -> dict:
+        """Get usage that has not been written yet"""
+        return {
+            "unflushed_buckets": len(self.pending),
+            "unflushed_requests": sum(bucket["inc"].get("requests", 0) for bucket in self.pending.values()),
+            "flush_interval_seconds": self.flush_interval
+        }
+
+
+# Global usage meter instance
+usage_meter = UsageMeter()
@@ -7,6 +7,7 @@ import shutil
 from typing import Dict, List
 from models import Client, ClientStatus
 from url_detection import get_backend_base_url
+from port_allocator import port_allocator
 
 class WhatsAppServiceManager:
     """
@@ -15,24 +16,10 @@ class WhatsAppServiceManager:
     
     def __init__(self):
         self.services: Dict[str, dict] = {}  # client_id -> service info
-        self.base_port = 3002  # Start from 3002 (3001 is reserved for legacy)
         
-    async def get_next_available_port(self, db) -> int:
-        """Get next available port starting from base_port, checking database"""
-        port = self.base_port
-        
-        # Get all ports currently assigned in database
-        clients_collection = db.clients
-        existing_clients = await clients_collection.find().to_list(length=None)
-        used_ports = [client.get('whatsapp_port') for client in existing_clients if client.get('whatsapp_port')]
-        
-        # Also check ports from running services
-        service_ports = [service['port'] for service in self.services.values()]
-        all_used_ports = set(used_ports + service_ports)
-        
-        while port in all_used_ports:
-            port += 1
-        return port
+    async def get_next_available_port(self) -> int:
+        """Reserve a port for a new client from the shared allocator"""
+        return await port_allocator.allocate()
     
     async def create_service_for_client(self, client: Client) -> bool:
         """Create and start independent WhatsApp service for a specific client"""
@@ -215,6 +202,41 @@ class WhatsAppServiceManager:
             print(f"❌ Error disconnecting client {client_id}: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    def _service_port(self, client: Client) -> int:
+        """Port of a client's service, also for services started by another backend process"""
+        service = self.services.get(client.id)
+        return service['port'] if service else client.whatsapp_port
+    
+    async def send_message_to_chat(self, client: Client, phone_number: str, message: str) -> bool:
+        """Send a message to a WhatsApp chat through the client's service"""
+        try:
+            import httpx
+            async with httpx.AsyncClient(timeout=10.0) as http_client:
+                response = await http_client.post(
+                    f"http://localhost:{self._service_port(client)}/send-message",
+                    json={"phoneNumber": phone_number, "message": message}
+                )
+                return response.status_code == 200
+                
+        except Exception as e:
+            print(f"❌ Error sending message for client {client.id}: {str(e)}")
+            return False
+    
+    async def send_typing_state(self, client: Client, phone_number: str, typing: bool = True) -> bool:
+        """Show or clear the typing indicator in a WhatsApp chat"""
+        try:
+            import httpx
+            async with httpx.AsyncClient(timeout=5.0) as http_client:
+                response = await http_client.post(
+                    f"http://localhost:{self._service_port(client)}/typing",
+                    json={"phoneNumber": phone_number, "state": "typing" if typing else "clear"}
+                )
+                return response.status_code == 200
+                
+        except Exception as e:
+            print(f"❌ Error updating typing state for client {client.id}: {str(e)}")
+            return False
+    
     def _generate_client_config(self, client: Client, port: int) -> str:
         """Generate client-specific configuration"""
         return f"""
@@ -601,6 +623,41 @@ app.get('/health', (req, res) => {{
     }});
 }});
 
+// Outbound messages from the backend (interim acknowledgements, streamed replies)
+app.post('/send-message', async (req, res) => {{
+    try {{
+        const {{ phoneNumber, message }} = req.body;
+        if (!client || !isConnected) {{
+            return res.status(503).json({{ success: false, error: 'WhatsApp not connected' }});
+        }}
+        await client.sendMessage(`${{phoneNumber}}@c.us`, message);
+        res.json({{ success: true }});
+    }} catch (error) {{
+        console.error(`Error sending message for {client.name}:`, error);
+        res.status(500).json({{ success: false, error: error.message }});
+    }}
+}});
+
+// Typing indicator: state 'typing' shows it, 'clear' removes it
+app.post('/typing', async (req, res) => {{
+    try {{
+        const {{ phoneNumber, state }} = req.body;
+        if (!client || !isConnected) {{
+            return res.status(503).json({{ success: false, error: 'WhatsApp not connected' }});
+        }}
+        const chat = await client.getChatById(`${{phoneNumber}}@c.us`);
+        if (state === 'clear') {{
+            await chat.clearState();
+        }} else {{
+            await chat.sendStateTyping();
+        }}
+        res.json({{ success: true }});
+    }} catch (error) {{
+        console.error(`Error updating typing state for {client.name}:`, error);
+        res.status(500).json({{ success: false, error: error.message }});
+    }}
+}});
+
 app.get('/logout', (req, res) => {{
     res.json({{
         success: true,
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Tuple
 import httpx
 import os
 import asyncio
 from datetime import datetime
 import openai
 from database import get_database
+from message_store import message_store
+from message_history import parse_fields, InvalidCursor, DEFAULT_HISTORY_FIELDS
+from storage import storage
 
 router = APIRouter(prefix="/api/whatsapp", tags=["whatsapp"])
 
@@ -286,38 +290,23 @@ async def get_or_create_thread(db, phone_number: str) -> str:
             raise Exception("Could not create conversation thread")
 
 async def store_message(db, phone_number: str, message: str, timestamp: int, is_from_ai: bool = False):
-    """Store message in database"""
+    """Store message in database (write-behind, batched with other messages)"""
     try:
-        messages_collection = db.whatsapp_messages
-        message_data = {
+        message_store.enqueue("whatsapp_messages", {
             "phone_number": phone_number,
             "message": message,
             "timestamp": timestamp,
             "is_from_ai": is_from_ai,
             "created_at": datetime.utcnow()
-        }
-        await messages_collection.insert_one(message_data)
+        })
     except Exception as e:
         print(f"Error storing message: {str(e)}")
 
-async def get_conversation_history(db, phone_number: str, limit: int = 20):
-    """Get conversation history for context"""
-    try:
-        messages_collection = db.whatsapp_messages
-        messages = await messages_collection.find({
-            "phone_number": phone_number
-        }).sort("timestamp", -1).limit(limit).to_list(length=limit)
-        
-        # Convert ObjectId to string for JSON serialization
-        for message in messages:
-            if '_id' in message:
-                message['_id'] = str(message['_id'])
-        
-        # Reverse to get chronological order
-        return list(reversed(messages))
-    except Exception as e:
-        print(f"Error getting conversation history: {str(e)}")
-        return []
+async def get_conversation_history(phone_number: str, limit: int = 20, cursor: Optional[str] = None, fields: Tuple[str, ...] = DEFAULT_HISTORY_FIELDS + ("_id",)):
+    """Get conversation history for context, newest page first, in chronological order"""
+    page = await storage.messages.history_page("whatsapp_messages", {"phone_number": phone_number}, limit, cursor, True, fields)
+    page["messages"].reverse()
+    return page
 
 @router.get("/logout")
 async def logout_whatsapp():
@@ -374,31 +363,41 @@ async def send_whatsapp_message(message: OutgoingMessage):
         raise HTTPException(status_code=500, detail=f"WhatsApp service error: {str(e)}")
 
 @router.get("/messages/{phone_number}")
-async def get_messages(phone_number: str, db = Depends(get_database)):
-    """Get conversation history for a phone number"""
+async def get_messages(
+    phone_number: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """Get conversation history for a phone number (older pages through next_cursor, or all as NDJSON)"""
     try:
-        messages = await get_conversation_history(db, phone_number, limit=50)
-        return {"messages": messages}
+        try:
+            selected = parse_fields(fields) if fields else DEFAULT_HISTORY_FIELDS + ("_id",)
+            if format == "ndjson":
+                lines = await storage.messages.stream_history("whatsapp_messages", {"phone_number": phone_number}, limit, cursor, True, selected)
+                return StreamingResponse(lines, media_type="application/x-ndjson")
+            return await get_conversation_history(phone_number, limit or 50, cursor, selected)
+        except (ValueError, InvalidCursor) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/stats")
-async def get_stats(db = Depends(get_database)):
+async def get_stats():
     """Get WhatsApp statistics"""
     try:
-        messages_collection = db.whatsapp_messages
-        
         # Count total messages
-        total_messages = await messages_collection.count_documents({})
+        total_messages = await storage.messages.count("whatsapp_messages", {})
         
         # Count messages today
         today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        messages_today = await messages_collection.count_documents({
-            "created_at": {"$gte": today_start}
-        })
+        messages_today = await storage.messages.count("whatsapp_messages", {}, since=today_start)
         
         # Count unique users
-        unique_users = len(await messages_collection.distinct("phone_number"))
+        unique_users = await storage.messages.unique_phones("whatsapp_messages", {})
         
         return {
             "total_messages": total_messages,
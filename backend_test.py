@@ -513,9 +513,9 @@ class BackendTester:
     async def test_admin_routes(self):
         """Test admin panel routes"""
         try:
-            async with self.session.get(f"{self.backend_url}/api/admin/clients", timeout=10) as response:
+            async with self.session.get(f"{self.backend_url}/api/admin/clients?limit=500", timeout=10) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = (await response.json())["clients"]
                     self.log_test(
                         "Admin - Get All Clients", 
                         True, 
@@ -727,9 +727,9 @@ class BackendTester:
         """Test consolidated manual phone association endpoint"""
         try:
             # First get a client ID from admin endpoint
-            async with self.session.get(f"{self.backend_url}/api/admin/clients", timeout=10) as response:
+            async with self.session.get(f"{self.backend_url}/api/admin/clients?limit=500", timeout=10) as response:
                 if response.status == 200:
-                    clients = await response.json()
+                    clients = (await response.json())["clients"]
                     if clients:
                         client_id = clients[0]['id']
                         
@@ -803,9 +803,9 @@ class BackendTester:
         """Test admin client toggle with consolidated system"""
         try:
             # Get first client
-            async with self.session.get(f"{self.backend_url}/api/admin/clients", timeout=10) as response:
+            async with self.session.get(f"{self.backend_url}/api/admin/clients?limit=500", timeout=10) as response:
                 if response.status == 200:
-                    clients = await response.json()
+                    clients = (await response.json())["clients"]
                     if clients:
                         client_id = clients[0]['id']
                         client_name = clients[0]['name']
@@ -933,9 +933,9 @@ class BackendTester:
         """Test OpenAI integration with multiple client credentials"""
         try:
             # Get clients to test different OpenAI configurations
-            async with self.session.get(f"{self.backend_url}/api/admin/clients", timeout=10) as response:
+            async with self.session.get(f"{self.backend_url}/api/admin/clients?limit=500", timeout=10) as response:
                 if response.status == 200:
-                    clients = await response.json()
+                    clients = (await response.json())["clients"]
                     if clients:
                         # Test with first client
                         client = clients[0]
@@ -1321,9 +1321,9 @@ class BackendTester:
         
         # First, let's check if there are any clients in the database
         try:
-            async with self.session.get(f"{self.backend_url}/api/admin/clients", timeout=10) as response:
+            async with self.session.get(f"{self.backend_url}/api/admin/clients?limit=500", timeout=10) as response:
                 if response.status == 200:
-                    clients = await response.json()
+                    clients = (await response.json())["clients"]
                     if not clients:
                         self.log_test(
                             "Mobile Landing - Database Check",
@@ -1445,9 +1445,9 @@ class BackendTester:
         # Test 3: Verify WhatsApp services are using dynamic URLs
         try:
             # Get all clients first
-            async with self.session.get(f"{self.backend_url}/api/admin/clients", timeout=10) as response:
+            async with self.session.get(f"{self.backend_url}/api/admin/clients?limit=500", timeout=10) as response:
                 if response.status == 200:
-                    clients = await response.json()
+                    clients = (await response.json())["clients"]
                     if clients:
                         # Test first client's service for URL configuration
                         client = clients[0]
@@ -1501,9 +1501,9 @@ class BackendTester:
         
         # Test 4: Test client status and QR endpoints with production URLs
         try:
-            async with self.session.get(f"{self.backend_url}/api/admin/clients", timeout=10) as response:
+            async with self.session.get(f"{self.backend_url}/api/admin/clients?limit=500", timeout=10) as response:
                 if response.status == 200:
-                    clients = await response.json()
+                    clients = (await response.json())["clients"]
                     if clients:
                         client = clients[0]
                         unique_url = client['unique_url']
@@ -1730,9 +1730,9 @@ class BackendTester:
         
         # First, check what clients actually exist in the database
         try:
-            async with self.session.get(f"{self.backend_url}/api/admin/clients", timeout=10) as response:
+            async with self.session.get(f"{self.backend_url}/api/admin/clients?limit=500", timeout=10) as response:
                 if response.status == 200:
-                    existing_clients = await response.json()
+                    existing_clients = (await response.json())["clients"]
                     self.log_test(
                         "QR Verification - Database Check",
                         True,
@@ -128,9 +128,9 @@ class IndividualArchitectureTester:
     async def test_admin_get_clients(self):
         """Test getting all clients from admin panel"""
         try:
-            async with self.session.get(f"{self.backend_url}/api/admin/clients", timeout=10) as response:
+            async with self.session.get(f"{self.backend_url}/api/admin/clients?limit=500", timeout=10) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = (await response.json())["clients"]
                     client_count = len(data)
                     
                     # Check if our test client exists
@@ -270,9 +270,9 @@ class IndividualArchitectureTester:
             
         try:
             # Get client data first to get unique URL
-            async with self.session.get(f"{self.backend_url}/api/admin/clients", timeout=10) as response:
+            async with self.session.get(f"{self.backend_url}/api/admin/clients?limit=500", timeout=10) as response:
                 if response.status == 200:
-                    clients = await response.json()
+                    clients = (await response.json())["clients"]
                     test_client = None
                     for client in clients:
                         if client.get('id') == self.test_client_id:
@@ -321,9 +321,9 @@ class IndividualArchitectureTester:
             
         try:
             # Get client data first to get unique URL
-            async with self.session.get(f"{self.backend_url}/api/admin/clients", timeout=10) as response:
+            async with self.session.get(f"{self.backend_url}/api/admin/clients?limit=500", timeout=10) as response:
                 if response.status == 200:
-                    clients = await response.json()
+                    clients = (await response.json())["clients"]
                     test_client = None
                     for client in clients:
                         if client.get('id') == self.test_client_id:
@@ -468,9 +468,9 @@ class IndividualArchitectureTester:
         """Test that each client gets a unique port"""
         try:
             # Get all clients and check port uniqueness
-            async with self.session.get(f"{self.backend_url}/api/admin/clients", timeout=10) as response:
+            async with self.session.get(f"{self.backend_url}/api/admin/clients?limit=500", timeout=10) as response:
                 if response.status == 200:
-                    clients = await response.json()
+                    clients = (await response.json())["clients"]
                     ports = [client.get('whatsapp_port') for client in clients if client.get('whatsapp_port')]
                     unique_ports = set(ports)
                     
@@ -498,9 +498,9 @@ class IndividualArchitectureTester:
         """Test that services are isolated per client"""
         try:
             # Get all clients
-            async with self.session.get(f"{self.backend_url}/api/admin/clients", timeout=10) as response:
+            async with self.session.get(f"{self.backend_url}/api/admin/clients?limit=500", timeout=10) as response:
                 if response.status == 200:
-                    clients = await response.json()
+                    clients = (await response.json())["clients"]
                     
                     isolated_services = 0
                     total_services = 0
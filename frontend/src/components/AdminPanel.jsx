@@ -4,6 +4,8 @@ import { AlertCircle, CheckCircle, User, Mail, Key, Bot, Trash2, Power, PowerOff
 
 const AdminPanel = () => {
   const [clients, setClients] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totals, setTotals] = useState(null);
   const [loading, setLoading] = useState(true);
   const [showAddForm, setShowAddForm] = useState(false);
   const [showEditEmailForm, setShowEditEmailForm] = useState(false);
@@ -20,8 +22,12 @@ const AdminPanel = () => {
 
   const fetchClients = useCallback(async () => {
     try {
-      const response = await axios.get(`${backendUrl}/api/admin/clients`);
-      setClients(response.data);
+      const response = await axios.get(`${backendUrl}/api/admin/clients`, {
+        params: { include_totals: true, include_message_counts: true }
+      });
+      setClients(response.data.clients);
+      setNextCursor(response.data.next_cursor);
+      setTotals(response.data.totals);
     } catch (error) {
       console.error('Error fetching clients:', error);
     } finally {
@@ -29,6 +35,18 @@ const AdminPanel = () => {
     }
   }, [backendUrl]);
 
+  const loadMoreClients = async () => {
+    try {
+      const response = await axios.get(`${backendUrl}/api/admin/clients`, {
+        params: { cursor: nextCursor, include_message_counts: true }
+      });
+      setClients((current) => [...current, ...response.data.clients]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      console.error('Error fetching clients:', error);
+    }
+  };
+
   useEffect(() => {
     fetchClients();
   }, [fetchClients]);
@@ -211,18 +229,18 @@ const AdminPanel = () => {
           {/* Stats */}
           <div className="px-6 py-4 grid grid-cols-1 md:grid-cols-3 gap-4">
             <div className="bg-blue-50 p-4 rounded-lg">
-              <div className="text-2xl font-bold text-blue-600">{clients.length}</div>
+              <div className="text-2xl font-bold text-blue-600">{totals ? totals.total : clients.length}</div>
               <div className="text-sm text-blue-600">Total Clientes</div>
             </div>
             <div className="bg-green-50 p-4 rounded-lg">
               <div className="text-2xl font-bold text-green-600">
-                {clients.filter(c => c.status === 'active').length}
+                {totals ? (totals.by_status.active || 0) : clients.filter(c => c.status === 'active').length}
               </div>
               <div className="text-sm text-green-600">Clientes Activos</div>
             </div>
             <div className="bg-yellow-50 p-4 rounded-lg">
               <div className="text-2xl font-bold text-yellow-600">
-                {clients.filter(c => c.connected_phone).length}
+                {totals ? totals.connected : clients.filter(c => c.connected_phone).length}
               </div>
               <div className="text-sm text-yellow-600">WhatsApp Conectados</div>
             </div>
@@ -412,6 +430,9 @@ const AdminPanel = () => {
                     <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
                       WhatsApp
                     </th>
+                    <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
+                      Mensajes
+                    </th>
                     <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
                       Puerto
                     </th>
@@ -437,6 +458,14 @@ const AdminPanel = () => {
                           {getStatusIcon(client.status)}
                           <span className="ml-1 capitalize">{client.status}</span>
                         </span>
+                        {client.circuit_state && client.circuit_state !== 'closed' && (
+                          <span
+                            className="ml-2 inline-flex items-center px-2.5 py-0.5 rounded-full text-xs font-medium bg-red-100 text-red-800"
+                            title={client.circuit_last_error || ''}
+                          >
+                            {client.circuit_state === 'open' ? 'OpenAI con fallas' : 'Verificando OpenAI'}
+                          </span>
+                        )}
                       </td>
                       <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">
                         {client.connected_phone ? (
@@ -445,6 +474,9 @@ const AdminPanel = () => {
                           <span className="text-gray-400">No conectado</span>
                         )}
                       </td>
+                      <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">
+                        {client.message_count ?? '-'}
+                      </td>
                       <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">
                         :{client.whatsapp_port}
                       </td>
@@ -509,6 +541,16 @@ const AdminPanel = () => {
                   ))}
                 </tbody>
               </table>
+              {nextCursor && (
+                <div className="px-6 py-4 text-center border-t border-gray-200">
+                  <button
+                    onClick={loadMoreClients}
+                    className="text-sm font-medium text-blue-600 hover:text-blue-800"
+                  >
+                    Cargar más clientes
+                  </button>
+                </div>
+              )}
             </div>
           )}
         </div>
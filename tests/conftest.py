@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Backend modules import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+# database.py reads these at import time; the tests below never connect
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
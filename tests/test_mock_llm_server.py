@@ -0,0 +1,34 @@
+import asyncio
+import time
+
+import pytest
+
+from mock_llm_server import state
+from openai_clients import forget_openai_client, get_openai_client
+
+
+@pytest.fixture
+def mock_backend(monkeypatch):
+    monkeypatch.setenv("LLM_BACKEND", "mock")
+    config = state.config.dict()
+    state.configure({"latency_distribution": "fixed", "latency_median_ms": 500, "server_error_rate": 0, "rate_limit_rate": 0})
+    yield
+    state.configure(config)
+
+
+def test_streamed_chunks_keep_their_spacing(mock_backend):
+    async def scenario():
+        client = get_openai_client("sk-test-streaming")
+        started_at = time.monotonic()
+        stream = await client.chat.completions.create(
+            model="mock-chat", messages=[{"role": "user", "content": "hola"}], stream=True
+        )
+        arrivals = [time.monotonic() - started_at async for chunk in stream if chunk.choices and chunk.choices[0].delta.content]
+        await forget_openai_client("sk-test-streaming")
+        return arrivals
+
+    arrivals = asyncio.run(scenario())
+
+    assert len(arrivals) > 2
+    # Buffered delivery would hand every chunk over at the end
+    assert arrivals[-1] - arrivals[0] > 0.2
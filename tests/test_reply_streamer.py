@@ -0,0 +1,83 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+import pytest
+
+import reply_streamer as streamer_module
+from reply_streamer import MAX_CHUNK_CHARS, MIN_CHUNK_CHARS, ReplyStreamer, StreamedReply, find_chunk_end
+
+# Long enough that the sentence breaks after it count
+PREFIX = "Revisamos su caso con el equipo del estudio y le contamos cómo seguimos, "
+assert len(PREFIX) >= MIN_CHUNK_CHARS
+
+
+def first_chunk(text):
+    end = find_chunk_end(text)
+    return None if end is None else text[:end]
+
+
+@pytest.mark.parametrize("text, chunk_ends_with", [
+    (PREFIX + "lo atenderá el Sr. Pérez. Luego le escribimos.", "el Sr. Pérez. "),
+    (PREFIX + "según el Art. 5 del código. Luego le escribimos.", "del código. "),
+    (PREFIX + "el monto es $1.500.000 más intereses. Luego le escribimos.", "$1.500.000 más intereses. "),
+    (PREFIX + "visite www.ejemplo.cl. Luego le escribimos.", "www.ejemplo.cl. "),
+])
+def test_abbreviations_and_numbers_do_not_end_a_sentence(text, chunk_ends_with):
+    assert first_chunk(text).endswith(chunk_ends_with)
+
+
+def test_numbered_list_item_does_not_end_a_sentence():
+    text = PREFIX + "estos son los pasos\n1. Demanda ante el tribunal"
+
+    assert find_chunk_end(text) is None
+    assert find_chunk_end(text, final=True) == len(text)
+
+
+def test_text_without_boundaries_is_cut_at_the_last_space():
+    text = "palabra " * 200
+    end = find_chunk_end(text)
+    assert end <= MAX_CHUNK_CHARS
+    assert end == text.rfind(" ", 0, MAX_CHUNK_CHARS) + 1
+
+    assert find_chunk_end("a" * (MAX_CHUNK_CHARS + 50)) == MAX_CHUNK_CHARS
+
+
+def test_leading_blank_lines_are_not_a_paragraph():
+    text = "\n\nHola, le saludamos.\n\nEn qué le podemos ayudar"
+
+    assert first_chunk(text).strip() == "Hola, le saludamos."
+    assert find_chunk_end("\n\n") is None
+    assert find_chunk_end("\n\n", final=True) is None
+
+
+def test_stream_chunks_add_up_to_the_whole_reply(monkeypatch):
+    sent = []
+
+    async def send_message_to_chat(client, phone_number, chunk):
+        sent.append(chunk)
+        return True
+
+    monkeypatch.setattr(streamer_module.service_manager, "send_message_to_chat", send_message_to_chat)
+    monkeypatch.setattr(streamer_module.interim_acks, "mark_answered", lambda client_id, phone_number: None)
+
+    reply = (
+        "\n" + PREFIX + "lo atenderá el Sr. Pérez. El monto es $1.500.000.\n\n"
+        "Los pasos son:\n1. Demanda\n2. Audiencia\n\n" + "Revise www.ejemplo.cl. " + "palabra " * 150 + "Saludos."
+    )
+
+    async def scenario():
+        streamer = ReplyStreamer()
+        streamer.pacer.min_interval = 0
+        stream = streamer.open(SimpleNamespace(id="c1"), "569")
+        for start in range(0, len(reply), 7):
+            stream.feed(reply[start:start + 7])
+            await asyncio.sleep(0)
+        return await stream.finish(reply)
+
+    result = asyncio.run(scenario())
+
+    assert isinstance(result, StreamedReply)
+    assert len(sent) > 1
+    assert all(len(chunk) <= MAX_CHUNK_CHARS for chunk in sent)
+    assert re.sub(r"\s+", " ", " ".join(sent)) == re.sub(r"\s+", " ", reply).strip()
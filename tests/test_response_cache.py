@@ -0,0 +1,33 @@
+from response_cache import ResponseCache
+
+ASSISTANT = "asst_test"
+
+
+def test_tool_backed_answer_is_not_replayed():
+    cache = ResponseCache()
+    question = "¿Tienen hora disponible para mañana?"
+
+    cache.store(ASSISTANT, question, "Sí, le reservé el martes a las 10:00.", used_tools=True)
+
+    assert cache.lookup(ASSISTANT, question) is None
+    assert cache.lookup(ASSISTANT, "tienen hora disponible para manana") is None
+
+
+def test_standalone_question_is_replayed_exactly_and_approximately():
+    cache = ResponseCache()
+    cache.store(ASSISTANT, "¿Cuál es el horario de atención?", "De lunes a viernes, de 9 a 18 horas.")
+
+    assert cache.lookup(ASSISTANT, "cual es el horario de atencion") == "De lunes a viernes, de 9 a 18 horas."
+    assert cache.lookup(ASSISTANT, "cual es el horario de atención??") == "De lunes a viernes, de 9 a 18 horas."
+    assert cache.lookup("asst_other", "¿Cuál es el horario de atención?") is None
+
+
+def test_short_follow_ups_are_never_cached():
+    cache = ResponseCache()
+    for message in ("si", "ok", "no", "si?"):
+        cache.store(ASSISTANT, message, "Perfecto, continuemos con su caso.")
+        assert cache.lookup(ASSISTANT, message) is None
+
+    # A short message that is a question on its own still is
+    cache.store(ASSISTANT, "¿Horario?", "De 9 a 18 horas.")
+    assert cache.lookup(ASSISTANT, "horario?") == "De 9 a 18 horas."
@@ -0,0 +1,134 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from sqlite_storage import SQLiteStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "assistant.db"))
+    asyncio.run(storage.open())
+    yield storage
+    asyncio.run(storage.close())
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_client_list_pages_by_name_without_gaps_or_repeats(storage):
+    names = ["Carla", "ana", "Bruno", "Ana", "Diego", "Ana"]
+    for index, name in enumerate(names):
+        run(storage.clients.insert({"id": f"client-{index}", "unique_url": f"url-{index}", "name": name, "status": "active"}))
+
+    seen, cursor = [], None
+    while True:
+        page = run(storage.clients.list_page(limit=2, cursor=cursor, fields=("id", "name")))
+        assert len(page["clients"]) <= 2
+        seen += [(client["name"], client["id"]) for client in page["clients"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == sorted((name, f"client-{index}") for index, name in enumerate(names))
+
+
+def test_message_history_pages_through_equal_timestamps(storage):
+    messages = [
+        {"id": f"m{index}", "client_id": "c1", "phone_number": "569", "message": str(index),
+         "timestamp": 1000 + index // 3, "created_at": datetime.utcnow()}
+        for index in range(10)
+    ]
+    run(storage.messages.insert_many("client_messages", messages))
+
+    seen, cursor = [], None
+    while True:
+        page = run(storage.messages.history_page("client_messages", {"client_id": "c1", "phone_number": "569"}, 4, cursor))
+        seen += [message["message"] for message in page["messages"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [str(index) for index in reversed(range(10))]
+
+
+def test_insert_many_ignores_messages_already_stored(storage):
+    messages = [
+        {"id": f"m{index}", "client_id": "c1", "phone_number": "569", "message": "hola",
+         "timestamp": 1000 + index, "created_at": datetime.utcnow()}
+        for index in range(3)
+    ]
+    run(storage.messages.insert_many("client_messages", messages))
+    # A retried batch with one new message
+    run(storage.messages.insert_many("client_messages", messages + [{**messages[0], "id": "m3"}]))
+
+    assert run(storage.messages.count("client_messages", {"client_id": "c1"})) == 4
+    # Same id in another collection is a different message
+    run(storage.messages.insert_many("whatsapp_messages", messages[:1]))
+    assert run(storage.messages.count("whatsapp_messages", {})) == 1
+
+
+def test_swap_only_replaces_the_expected_thread(storage):
+    run(storage.threads.create("c1", "569", "thread-1"))
+
+    assert run(storage.threads.swap("c1", "569", "thread-1", "thread-2", 120)) is True
+    # A concurrent rotation still holding the old id loses
+    assert run(storage.threads.swap("c1", "569", "thread-1", "thread-3", 0)) is False
+
+    thread = run(storage.threads.get("c1", "569"))
+    assert thread["thread_id"] == "thread-2"
+    assert thread["approx_tokens"] == 120
+    assert thread["previous_thread_ids"] == ["thread-1"]
+    assert thread["rotations"] == 1
+
+
+def test_global_pause_covers_every_conversation_of_its_client(storage):
+    run(storage.pauses.add({"client_id": "c1", "phone_number": "569", "paused_by": "owner", "paused_at": datetime.utcnow()}))
+    assert run(storage.pauses.is_paused("c1", "569")) is True
+    assert run(storage.pauses.is_paused("c1", "570")) is False
+
+    run(storage.pauses.add({"client_id": "c1", "phone_number": "ALL", "paused_by": "global", "paused_at": datetime.utcnow()}))
+    assert run(storage.pauses.is_paused("c1", "570")) is True
+    assert run(storage.pauses.is_paused("c2", "570")) is False
+    assert run(storage.pauses.count_conversations("c1")) == 1
+
+    assert run(storage.pauses.remove_all("c1")) == 2
+    assert run(storage.pauses.is_paused("c1", "569")) is False
+
+
+def test_delete_before_keeps_recent_messages(storage):
+    now = datetime.utcnow()
+    messages = [
+        {"id": "old", "phone_number": "569", "message": "a", "timestamp": 1, "created_at": now - timedelta(days=2)},
+        {"id": "new", "phone_number": "569", "message": "b", "timestamp": 2, "created_at": now}
+    ]
+    run(storage.messages.insert_many("whatsapp_messages", messages))
+
+    assert run(storage.messages.delete_before("whatsapp_messages", now - timedelta(days=1))) == 1
+    page = run(storage.messages.history_page("whatsapp_messages", {"phone_number": "569"}, 10, None))
+    assert [message["message"] for message in page["messages"]] == ["b"]
+
+
+def test_port_allocator_reuses_released_ports_without_mongo(storage, monkeypatch):
+    import port_allocator as allocator_module
+    monkeypatch.setattr(allocator_module, "storage", storage)
+    monkeypatch.setattr(allocator_module, "PORT_REUSE_DELAY_SECONDS", 0)
+    monkeypatch.setattr(allocator_module, "port_bound_on_host", lambda port: False)
+    allocator = allocator_module.PortAllocator()
+    run(storage.clients.insert({"id": "c1", "unique_url": "u1", "name": "Ana", "whatsapp_port": allocator_module.BASE_PORT + 4}))
+
+    first = run(allocator.allocate())
+    second = run(allocator.allocate())
+    assert (first, second) == (allocator_module.BASE_PORT + 5, allocator_module.BASE_PORT + 6)
+
+    run(allocator.release(first))
+    run(allocator.release(first))
+    assert run(allocator.allocate()) == first
+    assert run(allocator.allocate()) == allocator_module.BASE_PORT + 7
+
+    stats = run(allocator.get_stats())
+    assert stats["next_port"] == allocator_module.BASE_PORT + 8
+    assert stats["free_ports"] == 0
+    assert stats["reused"] == 1
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from llm_backend import get_llm_backend
+from mock_llm_server import state
+from openai_scheduler import PRIORITY_BACKGROUND
+from thread_lifecycle import ThreadLifecycleManager
+
+SEED = "Contexto de la conversación anterior (no responder a este mensaje):\n- Ana Pérez pidió hora para el martes"
+
+
+@pytest.fixture
+def mock_backend(monkeypatch):
+    monkeypatch.setenv("LLM_BACKEND", "mock")
+    config = state.config.dict()
+    state.configure({"latency_distribution": "fixed", "latency_median_ms": 0, "server_error_rate": 0, "rate_limit_rate": 0})
+    yield
+    state.configure(config)
+
+
+def summarize(lifecycle, message_count):
+    """Summarize a rotated thread with message_count newer messages; returns the transcript sent to the model"""
+    async def scenario():
+        backend = get_llm_backend(f"sk-test-lifecycle-{message_count}", "c1", PRIORITY_BACKGROUND)
+        thread = await backend.create_thread(messages=[{"role": "user", "content": SEED}])
+        for index in range(message_count):
+            await backend.add_message(thread.id, f"Mensaje {index}")
+
+        transcripts = []
+        chat_completion = backend.chat_completion
+
+        async def capture(model, messages, max_tokens, stream=False):
+            transcripts.append(messages[-1]["content"])
+            return await chat_completion(model, messages, max_tokens, stream)
+
+        backend.chat_completion = capture
+        await lifecycle._summarize_thread(backend, thread.id)
+        return transcripts[0]
+
+    return asyncio.run(scenario())
+
+
+def test_summary_keeps_the_previous_rotation_seed(mock_backend):
+    lifecycle = ThreadLifecycleManager()
+    lifecycle.summary_source_messages = 5
+
+    transcript = summarize(lifecycle, 12).split("\n")
+
+    assert transcript[0] == "Usuario: Contexto de la conversación anterior (no responder a este mensaje):"
+    assert transcript[1] == "- Ana Pérez pidió hora para el martes"
+    assert transcript[2:] == [f"Usuario: Mensaje {index}" for index in range(7, 12)]
+
+
+def test_short_thread_lists_the_seed_once(mock_backend):
+    lifecycle = ThreadLifecycleManager()
+    lifecycle.summary_source_messages = 5
+
+    transcript = summarize(lifecycle, 2)
+
+    assert transcript.count("Ana Pérez") == 1
+    assert transcript.endswith("Usuario: Mensaje 0\nUsuario: Mensaje 1")